@@ -1,5 +1,5 @@
 #!/bin/bash
-# ./deploy/deploy.sh
+# ./deploy/deploy.sh [sync.py options, e.g. --device /dev/ttyACM0 --stats]
 set -e
 
 # Get the project root directory (parent of deploy dir)
@@ -18,33 +18,6 @@ if [ $? -ne 0 ]; then
     exit 1
 fi
 
-# Change to project root for relative paths in requirements.txt
-cd "$PROJECT_ROOT" || exit 1
-
-# Install dependencies from requirements.txt
-echo "Installing dependencies..."
-while IFS= read -r lib || [ -n "$lib" ]; do
-    # Skip empty lines and comments
-    [[ $lib =~ ^[[:space:]]*$ || $lib =~ ^#.*$ ]] && continue
-    echo "Installing $lib..."
-    mpremote mip install "$lib"
-done <mp_requirements.txt
-
-# Copy the lcd1602 library
-echo "Copying lcd1602 library..."
-mpremote cp -r lib/lcd1602.py :
-
-# Copy source files
-echo "Copying source files..."
-mpremote cp -r src/server/* :
-
-# Copy converted config
-echo "Copying config..."
-mpremote cp "$CONFIG_DIR/config.json" :
+# Compile, copy changed files and reset the device
+python "$DEPLOY_DIR/sync.py" "$CONFIG_DIR/config.json" "$@" || { rm "$CONFIG_DIR/config.json"; exit 1; }
 rm "$CONFIG_DIR/config.json"
-
-# Reset device
-echo "Resetting device..."
-mpremote reset
-
-echo "Deployment complete!"
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Bulk post-processing of exported raw sensor logs.
+
+A log directory holds one file per sensor, named ``<sensor_id>.bin``. Each file
+is a packed little-endian array of records:
+
+    uint32  t    seconds since the epoch
+    uint16  raw  raw ADC reading (``read_u16()``)
+
+Files are memory-mapped and viewed as NumPy arrays without copying, so even
+months of 1 Hz data for many houses are processed at memory bandwidth.
+"""
+import argparse
+import csv
+import sys
+import tomllib
+from pathlib import Path
+
+import numpy as np
+
+RECORD_DTYPE = np.dtype([('t', '<u4'), ('raw', '<u2')])
+
+AGGREGATES = ('count', 'mean', 'min', 'max')
+
+
+def load_log(path):
+    """Memory-map a raw sensor log as a structured array (zero copy)"""
+    path = Path(path)
+    size = path.stat().st_size
+    if size % RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path}: size {size} is not a multiple of "
+                         f"{RECORD_DTYPE.itemsize}-byte records")
+    if size == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r')
+
+
+def _exact_power(raw, power):
+    """``raw ** power`` rounded once to float64, like Python's int power.
+
+    16-bit readings raised to the 4th power still fit in uint64, so the
+    integer result is exact and only the final conversion rounds.
+    """
+    if power <= 4:
+        return (raw.astype(np.uint64) ** power).astype(np.float64)
+    return raw.astype(np.float64) ** power
+
+
+def apply_calibration(raw, config):
+    """Vectorized counterpart of ``utils.apply_calibration``.
+
+    Evaluates the same expression in the same order as the device code, so
+    results agree with the scalar version to floating-point tolerance (exactly
+    for linear and up to 4th-power polynomial calibrations). Uncalibrated
+    sensors return the raw values unchanged.
+    """
+    if not config or "type" not in config:
+        return raw
+
+    if config["type"] == "linear":
+        m = config["params"]["m"]
+        b = config["params"]["b"]
+        return m * raw.astype(np.float64) + b
+    elif config["type"] == "polynomial":
+        coeffs = config["params"]["coefficients"]
+        result = np.zeros(len(raw), dtype=np.float64)
+        for power, coeff in enumerate(coeffs):
+            result += coeff * _exact_power(raw, power)
+        return result
+    return raw
+
+
+def resample(t, values, interval):
+    """Aggregate samples into fixed buckets of ``interval`` seconds.
+
+    ``t`` must be sorted, which holds for append-only logs. Returns the bucket
+    start times and a dict of aggregate arrays.
+    """
+    if len(t) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return np.empty(0, dtype=np.int64), {name: empty for name in AGGREGATES}
+
+    buckets = t.astype(np.int64) // interval
+    starts = np.flatnonzero(np.diff(buckets)) + 1
+    starts = np.concatenate(([0], starts))
+    counts = np.diff(np.append(starts, len(t)))
+
+    values = np.asarray(values, dtype=np.float64)
+    aggregates = {
+        "count": counts,
+        "mean": np.add.reduceat(values, starts) / counts,
+        "min": np.minimum.reduceat(values, starts),
+        "max": np.maximum.reduceat(values, starts),
+    }
+    return buckets[starts] * interval, aggregates
+
+
+def load_sensor_configs(toml_path):
+    """Return the sensors section of a house TOML configuration"""
+    with open(toml_path, 'rb') as f:
+        config = tomllib.load(f)
+    return config.get('sensors', {})
+
+
+def analyze(log_dir, sensors, interval):
+    """Calibrate and resample every sensor log found in ``log_dir``"""
+    results = {}
+    for sensor_id, sensor_config in sensors.items():
+        log_path = Path(log_dir) / f"{sensor_id}.bin"
+        if not log_path.exists():
+            continue
+        records = load_log(log_path)
+        if len(records) and np.any(np.diff(records['t'].astype(np.int64)) < 0):
+            raise ValueError(f"{log_path}: timestamps are not sorted")
+        calibrated = apply_calibration(records['raw'], sensor_config.get('config', {}))
+        results[sensor_id] = resample(records['t'], calibrated, interval)
+    return results
+
+
+def write_csv(results, sensors, out):
+    writer = csv.writer(out)
+    writer.writerow(['sensor', 'type', 'location', 'unit', 'bucket_start', *AGGREGATES])
+    for sensor_id, (bucket_starts, aggregates) in results.items():
+        info = sensors[sensor_id]
+        columns = [aggregates[name] for name in AGGREGATES]
+        for row in zip(bucket_starts.tolist(), *(c.tolist() for c in columns)):
+            writer.writerow([sensor_id, info['type'], info['location'], info['unit'], *row])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate and resample exported sensor logs')
+    parser.add_argument('config', type=Path, help='House TOML configuration file')
+    parser.add_argument('log_dir', type=Path, help='Directory with <sensor_id>.bin logs')
+    parser.add_argument('--interval', '-i', type=int, default=3600,
+                        help='Resampling interval in seconds (default: 3600)')
+    parser.add_argument('--output', '-o', type=Path, help='Output CSV file (default: stdout)')
+    args = parser.parse_args()
+
+    if args.interval <= 0:
+        parser.error('--interval must be positive')
+    if not args.log_dir.is_dir():
+        raise FileNotFoundError(f"Log directory not found: {args.log_dir}")
+
+    sensors = load_sensor_configs(args.config)
+    results = analyze(args.log_dir, sensors, args.interval)
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_csv(results, sensors, f)
+    else:
+        write_csv(results, sensors, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
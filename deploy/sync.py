@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Incremental deployment of precompiled modules to a board.
+
+Sources are cross-compiled to ``.mpy`` with mpy-cross, so the board does not
+compile them at every boot. ``main.py`` stays a ``.py`` file because MicroPython
+only runs it under that name. Single-file ``github:`` requirements such as
+Microdot are downloaded and compiled the same way; other requirements are
+installed with ``mip`` only when ``mp_requirements.txt`` changed.
+
+A manifest of content hashes is kept on the board (``deploy_manifest.json``),
+so every board of a fleet only receives the files that differ from what it
+runs, and files that are no longer deployed are removed.
+
+``config.json`` is not part of the manifest: the board changes it at runtime
+(schedules, rules, devices), so its hash says nothing about what the board
+runs. It is copied on every deployment, replacing the board's copy, unless
+``--keep-config`` is given.
+
+With ``--stats`` a flag file is left on the board; on the next boot it records
+``boot_stats.json`` (see ``src/server/main.py``), which is read back before
+the board is reset again. Boots without the flag do not write to flash.
+"""
+import argparse
+import hashlib
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+BUILD_DIR = PROJECT_ROOT / 'build' / 'device'
+MANIFEST = 'deploy_manifest.json'
+CONFIG = 'config.json'
+BOOT_STATS = 'boot_stats.json'
+BOOT_STATS_FLAG = 'boot_stats.flag'
+# Files that must stay source on the board
+KEEP_SOURCE = {'main.py'}
+
+
+class Board:
+    """mpremote commands against one board"""
+    def __init__(self, device=None):
+        self.prefix = ['mpremote'] + (['connect', device] if device else [])
+
+    def run(self, *args, capture=False):
+        result = subprocess.run(self.prefix + list(args), capture_output=capture, text=True)
+        if result.returncode != 0 and not capture:
+            raise RuntimeError(f"mpremote {' '.join(args[:2])} failed")
+        return result
+
+    def read_json(self, remote):
+        """Return a JSON file from the board, or None if it is missing"""
+        result = self.run('fs', 'cat', f':{remote}', capture=True)
+        if result.returncode != 0:
+            return None
+        try:
+            return json.loads(result.stdout)
+        except ValueError:
+            return None
+
+    def copy(self, files):
+        """Copy [(local, remote)] in one mpremote session"""
+        args = []
+        for local, remote in files:
+            args += ['+', 'fs', 'cp', str(local), f':{remote}']
+        if args:
+            self.run(*args[1:])
+
+    def exec(self, code):
+        self.run('exec', code)
+
+
+def mpy_cross(source, target, march=None):
+    """Compile one source file to .mpy"""
+    command = [shutil.which('mpy-cross') or 'mpy-cross', '-o', str(target), str(source)]
+    if march:
+        command.insert(1, f'-march={march}')
+    subprocess.run(command, check=True)
+
+
+def github_url(spec):
+    """Raw URL of a 'github:org/repo/path[@ref]' requirement"""
+    spec, _, ref = spec[len('github:'):].partition('@')
+    org, repo, path = spec.split('/', 2)
+    return f"https://raw.githubusercontent.com/{org}/{repo}/{ref or 'HEAD'}/{path}"
+
+
+def read_requirements(path):
+    """Split requirements into single .py files to vendor and mip packages"""
+    vendored, packages = [], []
+    for line in Path(path).read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('github:') and line.split('@')[0].endswith('.py'):
+            vendored.append(line)
+        else:
+            packages.append(line)
+    return vendored, packages
+
+
+def fetch(spec, force=False):
+    """Download a vendored requirement once into the build directory"""
+    name = Path(spec.split('@')[0]).name
+    target = BUILD_DIR / 'vendor' / name
+    if force or not target.exists():
+        response = requests.get(github_url(spec), timeout=30)
+        response.raise_for_status()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(response.content)
+    return target
+
+
+def build(requirements, compile=True, march=None, force=False):
+    """Build all artifacts; returns {remote path: local file}"""
+    out_dir = BUILD_DIR / 'out'
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+
+    sources = [(source, source.name) for source in sorted((PROJECT_ROOT / 'src' / 'server').glob('*.py'))]
+    sources.append((PROJECT_ROOT / 'lib' / 'lcd1602.py', 'lcd1602.py'))
+    for spec in requirements:
+        sources.append((fetch(spec, force), f"lib/{Path(spec.split('@')[0]).name}"))
+
+    artifacts = {}
+    for source, remote in sources:
+        if compile and remote not in KEEP_SOURCE:
+            remote = remote[:-3] + '.mpy'
+            target = out_dir / remote
+            target.parent.mkdir(parents=True, exist_ok=True)
+            mpy_cross(source, target, march)
+        else:
+            target = source
+        artifacts[remote] = target
+    return artifacts
+
+
+def file_hash(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def plan(artifacts, manifest):
+    """Return (changed {remote: local}, removed [remote], new manifest files)"""
+    old = manifest.get('files', {})
+    files = {remote: file_hash(local) for remote, local in artifacts.items()}
+    changed = {remote: artifacts[remote] for remote, digest in files.items() if old.get(remote) != digest}
+    # Older manifests listed the config; it is not removed when it leaves the manifest
+    removed = sorted(set(old) - set(files) - {CONFIG})
+    return changed, removed, files
+
+
+def sync(board, config_path, requirements_path, compile=True, march=None, force=False, keep_config=False):
+    """Push what changed since the last deployment; returns the new manifest"""
+    vendored, packages = read_requirements(requirements_path)
+    artifacts = build(vendored, compile, march, force)
+
+    if keep_config:
+        print(f"Keeping the board's {CONFIG}")
+    else:
+        print(f"Copying {CONFIG}")
+        board.copy([(config_path, CONFIG)])
+
+    manifest = {} if force else (board.read_json(MANIFEST) or {})
+    changed, removed, files = plan(artifacts, manifest)
+
+    requirements_hash = hashlib.sha256('\n'.join(packages).encode()).hexdigest()
+    if manifest.get('requirements') != requirements_hash:
+        for package in packages:
+            print(f"Installing {package}...")
+            board.run('mip', 'install', package)
+    else:
+        print("Requirements unchanged, skipping mip")
+        if not changed and not removed:
+            print(f"All {len(artifacts)} files up to date")
+            return manifest
+
+    # A .py next to an .mpy would be imported instead, so drop both the
+    # removed files and the sources replaced by compiled modules
+    stale = removed + [remote[:-4] + '.py' for remote in changed if remote.endswith('.mpy')]
+    board.exec(
+        "import os\n"
+        "try:\n os.mkdir('lib')\nexcept OSError:\n pass\n"
+        f"for f in {stale!r}:\n"
+        " try:\n  os.remove(f)\n except OSError:\n  pass\n")
+
+    print(f"Copying {len(changed)} of {len(artifacts)} files"
+          + (f", removing {len(removed)}" if removed else ""))
+    for remote in sorted(changed):
+        print(f"  {remote}")
+    board.copy(sorted((local, remote) for remote, local in changed.items()))
+
+    manifest = {'files': files, 'requirements': requirements_hash, 'deployed_at': int(time.time())}
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(manifest, f)
+    board.copy([(f.name, MANIFEST)])
+    Path(f.name).unlink()
+    return manifest
+
+
+def boot_stats(board, wait_s):
+    """Reset with the stats flag set, let the board boot, then read its boot_stats.json"""
+    board.exec(
+        "import os\n"
+        f"try:\n os.remove({BOOT_STATS!r})\nexcept OSError:\n pass\n"
+        f"open({BOOT_STATS_FLAG!r}, 'w').close()\n")
+    board.run('reset')
+    time.sleep(wait_s)
+    stats = board.read_json(BOOT_STATS)
+    # Reading stopped main.py, start it again
+    board.run('reset')
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deploy compiled modules to a board, copying only what changed')
+    parser.add_argument('config', type=Path, help='Device JSON configuration file')
+    parser.add_argument('--device', '-d', help='mpremote device, e.g. /dev/ttyACM0 (default: auto)')
+    parser.add_argument('--requirements', type=Path, default=PROJECT_ROOT / 'mp_requirements.txt',
+                        help='MicroPython requirements file')
+    parser.add_argument('--no-compile', action='store_true', help='Copy .py sources instead of .mpy')
+    parser.add_argument('--march', help='mpy-cross architecture for native code, e.g. armv6m')
+    parser.add_argument('--force', action='store_true', help='Ignore the manifest and copy everything')
+    parser.add_argument('--keep-config', action='store_true',
+                        help="Leave the board's config.json, e.g. schedules and rules changed at runtime")
+    parser.add_argument('--stats', action='store_true', help='Read boot time and free heap after reset')
+    parser.add_argument('--boot-wait', type=float, default=8.0, help='Seconds to wait for boot (default: 8)')
+    args = parser.parse_args()
+
+    if not args.no_compile and not shutil.which('mpy-cross'):
+        sys.exit("mpy-cross not found: install it (pip install mpy-cross) or use --no-compile")
+
+    board = Board(args.device)
+    sync(board, args.config, args.requirements, not args.no_compile, args.march, args.force, args.keep_config)
+
+    if args.stats:
+        stats = boot_stats(board, args.boot_wait)
+        if stats:
+            print(f"Boot: {stats['boot_ms']} ms, free heap: {stats['mem_free']} bytes, "
+                  f"allocated: {stats['mem_alloc']} bytes")
+        else:
+            print("No boot stats recorded; try a longer --boot-wait")
+    else:
+        board.run('reset')
+    print("Deployment complete!")
+
+
+if __name__ == '__main__':
+    main()
@@ -35,6 +35,21 @@ def validate_config(config):
     if 'ssid' not in config['wifi'] or 'password' not in config['wifi']:
         raise ValueError("WiFi configuration must include 'ssid' and 'password'")
 
+    # Validate routing settings if present
+    hot_routes = config['server'].get('hot_routes', [])
+    if not isinstance(hot_routes, list) or not all(isinstance(route, str) for route in hot_routes):
+        raise ValueError("Server hot_routes must be a list of route patterns")
+
+    # Validate admission control settings if present
+    for field, value in config['server'].get('admission', {}).items():
+        if field == 'enabled':
+            continue
+        if field not in ['max_active', 'max_queue', 'queue_timeout_ms', 'min_free_heap', 'retry_after_s']:
+            raise ValueError(f"Unknown admission setting: {field}")
+        minimum = 0 if field in ['max_queue', 'min_free_heap'] else 1
+        if not isinstance(value, int) or value < minimum:
+            raise ValueError(f"Admission {field} must be an integer of at least {minimum}")
+
     # Validate LED configs
     for led_id, led_config in config.get('leds', {}).items():
         required_led_fields = ['pin', 'color', 'location', 'type']
@@ -57,6 +72,17 @@ def validate_config(config):
         if not isinstance(sensor_config['pin'], int):
             raise ValueError(f"Sensor '{sensor_id}' pin must be an integer")
 
+        # Validate debounce time of digital (IRQ-captured) sensors
+        if 'debounce_ms' in sensor_config:
+            if sensor_config['adc']:
+                raise ValueError(f"Sensor '{sensor_id}' debounce_ms only applies to digital sensors")
+            if not isinstance(sensor_config['debounce_ms'], int) or sensor_config['debounce_ms'] < 0:
+                raise ValueError(f"Sensor '{sensor_id}' debounce_ms must be a non-negative integer")
+
+        # Validate acquisition settings if present
+        if 'acquisition' in sensor_config:
+            validate_acquisition(sensor_id, sensor_config)
+
         # Validate config section if present
         if 'config' in sensor_config:
             if 'type' not in sensor_config['config']:
@@ -69,6 +95,157 @@ def validate_config(config):
             if 'params' not in sensor_config['config']:
                 raise ValueError(f"Sensor '{sensor_id}' config missing 'params'")
 
+    # Validate that no GPIO is used twice
+    validate_pins(config)
+
+    # Validate rules
+    for rule_id, rule in config.get('rules', {}).items():
+        validate_rule(rule_id, rule, config)
+
+    # Validate schedules
+    for schedule_id, schedule in config.get('schedules', {}).items():
+        validate_schedule(schedule_id, schedule, config)
+
+    # Validate MQTT telemetry if present
+    if 'mqtt' in config:
+        validate_mqtt(config['mqtt'], config)
+
+def validate_pins(config):
+    """Raise ValueError if two LED, motor or sensor pins share a GPIO.
+
+    ADC sensors give a channel (0-3 are GPIO 26-29, 4 is the internal
+    temperature sensor) and may share an input with each other.
+    """
+    pins = {}
+    for kind, name, fields in [('leds', 'LED', ['pin']), ('motors', 'Motor', ['pin_on', 'pin_dir']),
+                               ('sensors', 'Sensor', ['pin'])]:
+        for device_id, device_config in config.get(kind, {}).items():
+            analog = kind == 'sensors' and device_config.get('adc', False)
+            for field in fields:
+                pin = device_config.get(field)
+                if not isinstance(pin, int):
+                    continue
+                if analog and pin < 5:
+                    if pin == 4:
+                        continue
+                    pin += 26
+                owner = f"{name} '{device_id}' {field}"
+                if pin in pins and not (analog and pins[pin][1]):
+                    raise ValueError(f"{owner} uses GPIO {pin}, already used by {pins[pin][0]}")
+                pins[pin] = (owner, analog)
+
+def is_number(value):
+    """True for ints and floats, but not booleans"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_action(rule_id, action, config):
+    """Validate an automation action of a rule or schedule."""
+    if not isinstance(action, dict) or action.get('type') not in ['led', 'motor', 'lcd']:
+        raise ValueError(f"'{rule_id}' action type must be 'led', 'motor' or 'lcd'")
+
+    if action['type'] == 'led':
+        if action.get('id') not in config.get('leds', {}):
+            raise ValueError(f"'{rule_id}' action refers to unknown LED: {action.get('id')}")
+        if action.get('command', 'toggle') not in ['on', 'off', 'toggle']:
+            raise ValueError(f"'{rule_id}' has invalid LED command: {action['command']}")
+    elif action['type'] == 'motor':
+        if action.get('id') not in config.get('motors', {}):
+            raise ValueError(f"'{rule_id}' action refers to unknown motor: {action.get('id')}")
+        if action.get('command', 'on') not in ['on', 'off']:
+            raise ValueError(f"'{rule_id}' has invalid motor command: {action['command']}")
+        if action.get('direction', 'cw') not in ['cw', 'ccw']:
+            raise ValueError(f"'{rule_id}' has invalid motor direction: {action['direction']}")
+    elif not isinstance(action.get('text'), str):
+        raise ValueError(f"'{rule_id}' LCD action requires 'text'")
+
+def validate_rule(rule_id, rule, config):
+    """Validate an on-device automation rule."""
+    if rule.get('sensor') not in config.get('sensors', {}):
+        raise ValueError(f"Rule '{rule_id}' refers to unknown sensor: {rule.get('sensor')}")
+
+    condition = rule.get('condition')
+    if not isinstance(condition, dict) or condition.get('type') not in ['threshold', 'hysteresis', 'rate']:
+        raise ValueError(f"Rule '{rule_id}' condition type must be 'threshold', 'hysteresis' or 'rate'")
+    if condition.get('op', '>') not in ['>', '>=', '<', '<=']:
+        raise ValueError(f"Rule '{rule_id}' has invalid operator: {condition['op']}")
+    if condition['type'] == 'hysteresis':
+        if 'high' not in condition or 'low' not in condition:
+            raise ValueError(f"Rule '{rule_id}' hysteresis condition requires 'high' and 'low'")
+        if not is_number(condition['high']) or not is_number(condition['low']):
+            raise ValueError(f"Rule '{rule_id}' hysteresis 'high' and 'low' must be numbers")
+        if condition['low'] > condition['high']:
+            raise ValueError(f"Rule '{rule_id}' hysteresis 'low' must not exceed 'high'")
+    elif 'value' not in condition:
+        raise ValueError(f"Rule '{rule_id}' {condition['type']} condition requires 'value'")
+    elif not is_number(condition['value']):
+        raise ValueError(f"Rule '{rule_id}' {condition['type']} condition 'value' must be a number")
+
+    if 'action' not in rule:
+        raise ValueError(f"Rule '{rule_id}' missing required field: action")
+    validate_action(rule_id, rule['action'], config)
+    if 'else_action' in rule:
+        validate_action(rule_id, rule['else_action'], config)
+
+def validate_schedule(schedule_id, schedule, config):
+    """Validate an on-device scheduled action."""
+    if 'action' not in schedule:
+        raise ValueError(f"Schedule '{schedule_id}' missing required field: action")
+    validate_action(schedule_id, schedule['action'], config)
+
+    if 'at' in schedule:
+        if 'every_s' in schedule:
+            raise ValueError(f"Schedule '{schedule_id}' must use either 'at' or 'every_s', not both")
+        parts = str(schedule['at']).split(':')
+        if (len(parts) != 2 or not all(part.isdigit() for part in parts)
+                or int(parts[0]) > 23 or int(parts[1]) > 59):
+            raise ValueError(f"Schedule '{schedule_id}' 'at' must be a time of day as 'HH:MM'")
+    for field in ['every_s', 'start_in_s']:
+        if field in schedule and (not isinstance(schedule[field], int) or schedule[field] < 0):
+            raise ValueError(f"Schedule '{schedule_id}' {field} must be a non-negative integer")
+    if schedule.get('every_s') == 0:
+        raise ValueError(f"Schedule '{schedule_id}' every_s must be positive")
+
+def validate_mqtt(mqtt, config):
+    """Validate the optional MQTT telemetry section."""
+    if mqtt.get('enabled', False) and 'broker' not in mqtt:
+        raise ValueError("MQTT configuration must include 'broker' when enabled")
+
+    for field in ['port', 'sample_interval_ms', 'batch_size', 'keepalive_s', 'poll_ms',
+                  'min_backoff_ms', 'max_backoff_ms', 'connect_timeout_ms']:
+        if field in mqtt and (not isinstance(mqtt[field], int) or mqtt[field] <= 0):
+            raise ValueError(f"MQTT {field} must be a positive integer")
+
+    for sensor_id in mqtt.get('sensors', []):
+        if sensor_id not in config.get('sensors', {}):
+            raise ValueError(f"MQTT sensors refers to unknown sensor: {sensor_id}")
+
+def validate_acquisition(sensor_id, sensor_config):
+    """Validate ADC oversampling and filter settings of a sensor."""
+    if not sensor_config['adc']:
+        raise ValueError(f"Sensor '{sensor_id}' acquisition settings only apply to ADC sensors")
+
+    acquisition = sensor_config['acquisition']
+    allowed_fields = ['oversample', 'filter', 'trim', 'ema_alpha']
+    for field in acquisition:
+        if field not in allowed_fields:
+            raise ValueError(f"Sensor '{sensor_id}' acquisition has unknown field: {field}")
+
+    oversample = acquisition.get('oversample', 1)
+    if not isinstance(oversample, int) or not 1 <= oversample <= 256:
+        raise ValueError(f"Sensor '{sensor_id}' oversample must be an integer between 1 and 256")
+
+    if acquisition.get('filter', 'median') not in ['mean', 'median', 'trimmed_mean']:
+        raise ValueError(f"Sensor '{sensor_id}' has invalid filter: {acquisition['filter']}")
+
+    trim = acquisition.get('trim', 0.25)
+    if not isinstance(trim, (int, float)) or not 0 <= trim < 0.5:
+        raise ValueError(f"Sensor '{sensor_id}' trim must be a number in [0, 0.5)")
+
+    if 'ema_alpha' in acquisition:
+        alpha = acquisition['ema_alpha']
+        if not isinstance(alpha, (int, float)) or not 0 < alpha <= 1:
+            raise ValueError(f"Sensor '{sensor_id}' ema_alpha must be a number in (0, 1]")
+
 def main():
     parser = argparse.ArgumentParser(description='Convert TOML configuration to JSON')
     parser.add_argument('toml_path', type=Path, help='Path to TOML configuration file')
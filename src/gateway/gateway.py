@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""Fleet gateway for many geekhouse boards.
+
+The gateway is the only client of each board. It discovers every house
+through its HATEOAS root, polls all houses concurrently with one keep-alive
+connection and a minimum request spacing per board, caches the latest state
+and serves one aggregated API:
+
+    GET  /                      API root
+    GET  /houses                houses with status and links
+    GET  /houses/<name>         cached state of one house
+    GET  /sensors               latest readings of all houses
+    GET  /leds, /motors         devices of all houses
+    POST /houses/<name>/<path>  forward a command to a house
+
+List endpoints take ``house``, ``type``, ``location`` and ``color`` query
+filters, e.g. ``/sensors?type=light&location=roof``.
+"""
+import argparse
+import asyncio
+import json
+import time
+import tomllib
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+COLLECTIONS = ("leds", "sensors", "motors")
+FILTERS = ("house", "type", "location", "color")
+MAX_BODY = 64 * 1024
+# Load shedding responses of a board; polling waits for their Retry-After
+BUSY_STATUSES = (429, 503)
+
+class DeviceBusy(Exception):
+    """The board shed a poll request; retry after `retry_after_s`"""
+    def __init__(self, status, retry_after_s):
+        super().__init__(f"busy ({status}), retrying in {retry_after_s:g} s")
+        self.retry_after_s = retry_after_s
+
+class Device:
+    """One board: its session, rate limit and latest known state"""
+    def __init__(self, name, url, poll_interval_s=5.0, min_request_interval_ms=100, timeout=5.0):
+        self.name = name
+        self.url = url.rstrip("/")
+        self.poll_interval_s = poll_interval_s
+        self.min_request_interval = min_request_interval_ms / 1000
+        self.timeout = timeout
+
+        # A single pooled connection per board, reused by every request
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self._lock = asyncio.Lock()
+        self._next_request = 0.0
+        self._wake = asyncio.Event()
+
+        self.links = {}
+        self.state = {name: {} for name in COLLECTIONS}
+        self.online = False
+        self.error = None
+        self.last_poll = None
+        # Retry-After of the latest busy response
+        self.retry_after_s = poll_interval_s
+
+    async def request(self, method, path, body=None):
+        """Send one request, spaced at least min_request_interval from the last"""
+        async with self._lock:
+            delay = self._next_request - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                response = await asyncio.to_thread(
+                    self.session.request, method, f"{self.url}{path}",
+                    data=body, timeout=self.timeout,
+                    headers={"Content-Type": "application/json"} if body else None)
+            finally:
+                self._next_request = time.monotonic() + self.min_request_interval
+        if response.status_code in BUSY_STATUSES:
+            try:
+                self.retry_after_s = float(response.headers.get("Retry-After", self.poll_interval_s))
+            except ValueError:
+                self.retry_after_s = self.poll_interval_s
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            # e.g. Microdot's plain-text 404 and 405 responses
+            return response.status_code, {"data": {"error": response.text.strip() or response.reason}}
+
+    async def get(self, path):
+        """GET a document; returns it, raises DeviceBusy or ValueError otherwise"""
+        status, document = await self.request("GET", path)
+        if status in BUSY_STATUSES:
+            raise DeviceBusy(status, self.retry_after_s)
+        data = document.get("data") if isinstance(document, dict) else None
+        if status != 200 or not isinstance(data, dict) or "error" in data:
+            error = data.get("error") if isinstance(data, dict) else None
+            raise ValueError(f"GET {path} returned {status}: {error or 'unexpected document'}")
+        return document
+
+    async def discover(self):
+        """Read the root document and remember the collection links"""
+        root = await self.get("/")
+        self.links = {name: link["href"] for name, link in root.get("_links", {}).items()
+                      if name in COLLECTIONS}
+
+    async def poll(self):
+        """Refresh collections and sensor readings.
+
+        The new state replaces the cached one only once the poll is done,
+        so a busy board leaves the last good state in place.
+        """
+        if not self.links:
+            await self.discover()
+
+        state = {name: {} for name in COLLECTIONS}
+        for name, href in self.links.items():
+            document = await self.get(href)
+            items = {}
+            for item_id, item in document["data"].items():
+                if not isinstance(item, dict):
+                    continue
+                previous = self.state[name].get(item_id, {})
+                items[item_id] = {k: v for k, v in item.items() if k != "_links"}
+                if name == "sensors":
+                    read = item.get("_links", {}).get("read")
+                    items[item_id]["read_href"] = read["href"] if read else previous.get("read_href")
+                    for key in ("raw_value", "calibrated_value", "sampled_at"):
+                        if key in previous:
+                            items[item_id][key] = previous[key]
+                elif name == "motors":
+                    # The motor list carries no state; the motor document does
+                    link = item.get("_links", {}).get("self")
+                    items[item_id]["state_href"] = link["href"] if link else None
+                    if "state" in previous:
+                        items[item_id]["state"] = previous["state"]
+            state[name] = items
+
+        for motor in state["motors"].values():
+            if motor.get("state_href"):
+                try:
+                    data = (await self.get(motor["state_href"]))["data"]
+                except ValueError:
+                    continue
+                motor["state"] = data.get("state")
+
+        now = time.time()
+        for sensor in state["sensors"].values():
+            if sensor.get("read_href"):
+                try:
+                    data = (await self.get(sensor["read_href"]))["data"]
+                except ValueError:
+                    continue
+                sensor["raw_value"] = data.get("raw_value")
+                sensor["calibrated_value"] = data.get("calibrated_value")
+                sensor["sampled_at"] = now
+
+        self.state = state
+        self.last_poll = now
+
+    async def run(self):
+        """Poll forever; a forwarded command triggers an early poll"""
+        while True:
+            # Cleared before polling, so a command sent during a poll
+            # still triggers another one
+            self._wake.clear()
+            try:
+                await self.poll()
+                self.online, self.error = True, None
+            except DeviceBusy as e:
+                # The board answered: keep its state and links, and wait
+                self.online, self.error = True, str(e)
+                await asyncio.sleep(e.retry_after_s)
+                continue
+            except requests.RequestException as e:
+                self.online, self.error = False, str(e)
+                self.links = {}
+            except Exception as e:
+                # An unexpected document: rediscover on the next poll
+                self.error = str(e)
+                self.links = {}
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval_s)
+            except asyncio.TimeoutError:
+                pass
+
+    def refresh_soon(self):
+        self._wake.set()
+
+class Gateway:
+    """Aggregated HTTP API over the cached state of all devices"""
+    def __init__(self, devices):
+        self.devices = {device.name: device for device in devices}
+
+    @staticmethod
+    def response(data, links=None):
+        return {"data": data, "_links": links or {}}
+
+    def _house_summary(self, device):
+        return {
+            "url": device.url,
+            "online": device.online,
+            "error": device.error,
+            "last_poll": device.last_poll,
+            "counts": {name: len(device.state[name]) for name in COLLECTIONS},
+            "_links": {"self": {"href": f"/houses/{device.name}"}}
+        }
+
+    def _collection(self, name, query):
+        now = time.time()
+        items = []
+        for device in self.devices.values():
+            for item_id, item in device.state[name].items():
+                entry = {k: v for k, v in item.items() if k not in ("read_href", "state_href")}
+                entry["house"] = device.name
+                entry["id"] = item_id
+                if "sampled_at" in entry:
+                    entry["age_s"] = round(now - entry.pop("sampled_at"), 1)
+                if all(str(entry.get(f)) == query[f] for f in FILTERS if f in query):
+                    entry["_links"] = {"house": {"href": f"/houses/{device.name}"}}
+                    items.append(entry)
+        return items
+
+    async def handle(self, method, target, body):
+        """Return (status, document) for one request"""
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = path.strip("/").split("/") if path != "/" else []
+
+        if method == "GET" and not parts:
+            return 200, self.response({"message": "Welcome to the geekhouse fleet gateway"}, {
+                "self": {"href": "/"},
+                "houses": {"href": "/houses"},
+                **{name: {"href": f"/{name}"} for name in COLLECTIONS},
+                "filter_sensors": {"href": "/sensors?house={house}&type={type}&location={location}",
+                                   "templated": True}
+            })
+        if method == "GET" and parts == ["houses"]:
+            return 200, self.response(
+                {name: self._house_summary(device) for name, device in self.devices.items()},
+                {"self": {"href": "/houses"}})
+        if method == "GET" and len(parts) == 1 and parts[0] in COLLECTIONS:
+            return 200, self.response(self._collection(parts[0], query), {"self": {"href": target}})
+        if len(parts) >= 2 and parts[0] == "houses":
+            device = self.devices.get(parts[1])
+            if device is None:
+                return 404, self.response({"error": f"Invalid house: {parts[1]}"}, {"houses": {"href": "/houses"}})
+            if method == "GET" and len(parts) == 2:
+                data = self._house_summary(device)
+                data.update(device.state)
+                return 200, self.response(data, {"self": {"href": path}, "houses": {"href": "/houses"}})
+            if method in ("POST", "PUT", "DELETE") and len(parts) > 2:
+                device_path = "/" + "/".join(parts[2:]) + (f"?{url.query}" if url.query else "")
+                try:
+                    status, document = await device.request(method, device_path, body)
+                except Exception as e:
+                    return 502, self.response({"error": f"House {device.name} unreachable: {e}"})
+                device.refresh_soon()
+                return status, document
+        return 404, self.response({"error": f"Not found: {method} {path}"}, {"root": {"href": "/"}})
+
+    async def serve_client(self, reader, writer):
+        """Minimal HTTP/1.1 server loop with keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    break
+                body = await reader.readexactly(length) if length else None
+
+                status, document = await self.handle(method.upper(), target, body)
+                payload = json.dumps(document).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, host, port):
+        for device in self.devices.values():
+            asyncio.create_task(device.run())
+        server = await asyncio.start_server(self.serve_client, host, port)
+        print(f"Fleet gateway for {len(self.devices)} houses on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+def load_devices(config):
+    """Create devices from the [houses.<name>] tables of a gateway config"""
+    devices = []
+    for name, house in config.get("houses", {}).items():
+        if "url" not in house:
+            raise ValueError(f"House '{name}' missing required field: url")
+        devices.append(Device(
+            name, house["url"],
+            poll_interval_s=house.get("poll_interval_s", 5.0),
+            min_request_interval_ms=house.get("min_request_interval_ms", 100),
+            timeout=house.get("timeout_s", 5.0)))
+    if not devices:
+        raise ValueError("Gateway configuration has no houses")
+    return devices
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate many geekhouse boards behind one API')
+    parser.add_argument('config', type=Path, help='Gateway TOML configuration file')
+    args = parser.parse_args()
+
+    with open(args.config, 'rb') as f:
+        config = tomllib.load(f)
+    gateway_config = config.get("gateway", {})
+
+    gateway = Gateway(load_devices(config))
+    asyncio.run(gateway.run(gateway_config.get("host", "0.0.0.0"), gateway_config.get("port", 8080)))
+
+if __name__ == '__main__':
+    main()
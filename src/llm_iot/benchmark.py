@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""End-to-end latency benchmark for IoTController.
+
+Runs the controller against a stand-in Anthropic client with configurable
+latency and canned plans, and a local HTTP server that mimics the geekhouse
+API, then replays a corpus of commands and reports where the time goes:
+discovery, model calls, device HTTP and summarization.
+
+Corpus files have one command per line in the form
+
+    turn off all the lights | POST /leds/1/off; POST /leds/2/off
+
+where the part after '|' is the plan the stand-in model returns.
+"""
+import argparse
+import contextlib
+import io
+import json
+import re
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+from dialogue import IoTController
+
+DEFAULT_CORPUS = """\
+turn on the roof light | POST /leds/1/on
+turn off the roof light | POST /leds/1/off
+toggle the garden light | POST /leds/2/toggle
+turn off all the lights | POST /leds/1/off; POST /leds/2/off
+what is the light level on the roof | GET /sensors/2/value
+how warm is it inside | GET /sensors/4/value
+show all sensor readings | GET /sensors/1/value; GET /sensors/2/value; GET /sensors/3/value; GET /sensors/4/value
+start the fan | POST /motors/1/on
+stop the fan | POST /motors/1/off
+show hello world on the display | POST /lcd {"text": "hello world"}
+which sensors are there | GET /sensors
+"""
+
+# ---------------------------------------------------------------- device
+
+class SimulatedHouse:
+    """Device state and HATEOAS documents shaped like the server routes"""
+    def __init__(self):
+        self.leds = {"1": {"color": "yellow", "location": "roof", "state": 0},
+                     "2": {"color": "white", "location": "garden", "state": 0}}
+        self.sensors = {"1": {"type": "water", "location": "roof", "unit": "level", "raw": 1200, "scale": 1.0},
+                        "2": {"type": "light", "location": "roof", "unit": "lux", "raw": 30000, "scale": 0.1},
+                        "3": {"type": "light", "location": "garden", "unit": "lux", "raw": 28000, "scale": 0.1},
+                        "4": {"type": "temperature", "location": "internal", "unit": "celsius", "raw": 14200,
+                              "scale": -0.02926, "offset": 437.2}}
+        self.motors = {"1": {"type": "fan", "location": "roof", "state": 0}}
+        self.lcd_text = ""
+
+    @staticmethod
+    def response(data, links=None):
+        return {"data": data, "_links": links or {}}
+
+    def get(self, path):
+        parts = path.strip("/").split("/") if path != "/" else []
+        if not parts:
+            return self.response({"message": "Welcome to IoT API"}, {
+                name: {"href": f"/{name}" if name != "self" else "/"}
+                for name in ["self", "lcd", "leds", "motors", "sensors"]})
+        kind = parts[0]
+        if kind == "leds" and len(parts) == 1:
+            return self.response({led_id: dict(led, _links={
+                "self": {"href": f"/leds/{led_id}"}, "on": {"href": f"/leds/{led_id}/on"},
+                "off": {"href": f"/leds/{led_id}/off"}, "toggle": {"href": f"/leds/{led_id}/toggle"}})
+                for led_id, led in self.leds.items()}, {"self": {"href": "/leds"}})
+        if kind == "leds" and len(parts) == 2 and parts[1] in self.leds:
+            return self.response(dict(self.leds[parts[1]], id=parts[1]), {"all_leds": {"href": "/leds"}})
+        if kind == "sensors" and len(parts) == 1:
+            return self.response({sensor_id: {
+                "type": s["type"], "location": s["location"], "unit": s["unit"],
+                "_links": {"read": {"href": f"/sensors/{sensor_id}/value"}}}
+                for sensor_id, s in self.sensors.items()}, {"self": {"href": "/sensors"}})
+        if kind == "sensors" and len(parts) == 3 and parts[1] in self.sensors and parts[2] == "value":
+            s = self.sensors[parts[1]]
+            return self.response({
+                "id": parts[1], "raw_value": s["raw"],
+                "calibrated_value": s["raw"] * s["scale"] + s.get("offset", 0),
+                "type": s["type"], "location": s["location"], "unit": s["unit"]},
+                {"self": {"href": path}})
+        if kind == "motors" and len(parts) == 1:
+            return self.response({motor_id: {
+                "type": m["type"], "location": m["location"],
+                "_links": {"self": {"href": f"/motors/{motor_id}"}, "on": {"href": f"/motors/{motor_id}/on"},
+                           "off": {"href": f"/motors/{motor_id}/off"}}}
+                for motor_id, m in self.motors.items()}, {"self": {"href": "/motors"}})
+        if kind == "motors" and len(parts) == 2 and parts[1] in self.motors:
+            return self.response(dict(self.motors[parts[1]], id=parts[1]), {"all_motors": {"href": "/motors"}})
+        if kind == "lcd" and len(parts) == 1:
+            return self.response({"type": "16x2 LCD Display", "max_chars": 32, "_links": {
+                "display": {"href": "/lcd", "method": "POST", "template": {"text": "string (max 32 chars)"}}}},
+                {"self": {"href": "/lcd"}})
+        return None
+
+    def post(self, path, body):
+        parts = path.strip("/").split("/")
+        if parts[0] == "leds" and len(parts) == 3 and parts[1] in self.leds:
+            led = self.leds[parts[1]]
+            led["state"] = {"on": 1, "off": 0, "toggle": 1 - led["state"]}[parts[2]]
+            return self.response(dict(led, id=parts[1]), {"led": {"href": f"/leds/{parts[1]}"}})
+        if parts[0] == "motors" and len(parts) == 3 and parts[1] in self.motors:
+            motor = self.motors[parts[1]]
+            motor["state"] = 1 if parts[2] == "on" else 0
+            return self.response(dict(motor, id=parts[1]), {"motor": {"href": f"/motors/{parts[1]}"}})
+        if parts == ["lcd"]:
+            self.lcd_text = (body or {}).get("text", "")[:32]
+            return self.response({"message": "Text displayed on LCD", "text": self.lcd_text,
+                                  "display_info": {"total_length": len(self.lcd_text),
+                                                   "lines": 2 if len(self.lcd_text) > 16 else 1}})
+        return None
+
+def start_device(latency_ms):
+    """Serve a SimulatedHouse on a free local port; returns (server, url)"""
+    house = SimulatedHouse()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes; with Nagle's algorithm the
+        # body waits for the client's delayed ACK, ~40 ms per request
+        disable_nagle_algorithm = True
+
+        def _reply(self, document):
+            time.sleep(latency_ms / 1000)
+            if document is None:
+                self.send_response(404)
+                payload = b"Not found"
+            else:
+                self.send_response(200)
+                payload = json.dumps(document).encode()
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            with lock:
+                document = house.get(urlparse(self.path).path)
+            self._reply(document)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length) if length else b""
+            body = json.loads(raw) if raw else {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            with lock:
+                document = house.post(urlparse(self.path).path, body)
+            self._reply(document)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# ----------------------------------------------------------------- model
+
+class FakeAnthropic:
+    """Stand-in for anthropic.Anthropic returning canned plans after a delay"""
+    def __init__(self, plans, latency_ms):
+        self.plans = plans
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._cached_system = None
+        self.messages = self
+
+    def create(self, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        self.calls += 1
+        system = json.dumps(kwargs.get("system", ""))
+        input_tokens = (len(system) + len(json.dumps(kwargs["messages"]))) // 4
+        cache_read = input_tokens if system == self._cached_system else 0
+        self._cached_system = system
+        usage = SimpleNamespace(input_tokens=input_tokens - cache_read, output_tokens=50,
+                                cache_creation_input_tokens=0 if cache_read else input_tokens,
+                                cache_read_input_tokens=cache_read)
+
+        if "tools" in kwargs:
+            command = kwargs["messages"][0]["content"]
+            actions = self.plans.get(command, [{"method": "GET", "path": "/"}])
+            block = SimpleNamespace(type="tool_use", input={"actions": actions})
+        else:
+            block = SimpleNamespace(type="text", text="Summary of the response.")
+        return SimpleNamespace(content=[block], usage=usage)
+
+# ------------------------------------------------------------- controller
+
+STAGES = ["discovery", "model", "device_http", "summarization", "end_to_end"]
+# Commands are reported apart by whether the intent cache answered them
+KINDS = ["setup", "uncached", "cached"]
+
+class TimedController(IoTController):
+    """IoTController that records how long each stage takes"""
+    def __init__(self, *args, **kwargs):
+        self.timings = {kind: {stage: [] for stage in STAGES} for kind in KINDS}
+        self._current = self.timings["setup"]
+        super().__init__(*args, **kwargs)
+
+    def _timed(self, stage, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self._current[stage].append((time.perf_counter() - start) * 1000)
+
+    def _explore_api(self):
+        return self._timed("discovery", super()._explore_api)
+
+    def _get_plan(self, user_input):
+        return self._timed("model", super()._get_plan, user_input)
+
+    def execute_command(self, actions):
+        return self._timed("device_http", super().execute_command, actions)
+
+    def _format_response(self, response):
+        return self._timed("summarization", super()._format_response, response)
+
+    def handle(self, user_input):
+        self._current = {stage: [] for stage in STAGES}
+        try:
+            return self._timed("end_to_end", super().handle, user_input)
+        finally:
+            kind = "uncached" if self._current["model"] else "cached"
+            for stage, values in self._current.items():
+                self.timings[kind][stage].extend(values)
+            self._current = self.timings["setup"]
+
+    def _report_usage(self, stage, message):
+        pass
+
+def parse_corpus(text):
+    """Return [(command, actions)] from corpus text"""
+    corpus = []
+    for line in text.splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        command, _, plan = line.partition("|")
+        actions = []
+        for step in filter(None, (s.strip() for s in plan.split(";"))):
+            match = re.fullmatch(r"(\w+)\s+(\S+)(?:\s+(\{.*\}))?", step)
+            if not match:
+                raise ValueError(f"Invalid plan step: {step}")
+            action = {"method": match.group(1).upper(), "path": match.group(2)}
+            if match.group(3):
+                action["body"] = json.loads(match.group(3))
+            actions.append(action)
+        corpus.append((command.strip(), actions))
+    return corpus
+
+def summarize(values):
+    if not values:
+        return "n/a"
+    ordered = sorted(values)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (f"n={len(values):4d} total={sum(values):9.1f} mean={statistics.mean(values):8.1f} "
+            f"p50={statistics.median(values):8.1f} p95={p95:8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark IoTController end to end')
+    parser.add_argument('--commands', type=Path, help='Corpus file (default: built-in corpus)')
+    parser.add_argument('--rounds', type=int, default=2, help='Times to replay the corpus (default: 2)')
+    parser.add_argument('--llm-latency-ms', type=float, default=500, help='Model call latency (default: 500)')
+    parser.add_argument('--device-latency-ms', type=float, default=15, help='Device request latency (default: 15)')
+    parser.add_argument('--server-url', help='Benchmark a real device instead of the simulated house')
+    args = parser.parse_args()
+
+    corpus = parse_corpus(args.commands.read_text() if args.commands else DEFAULT_CORPUS)
+    plans = {command: actions for command, actions in corpus}
+
+    server = None
+    if args.server_url:
+        server_url = args.server_url
+    else:
+        server, server_url = start_device(args.device_latency_ms)
+
+    client = FakeAnthropic(plans, args.llm_latency_ms)
+    # The controller prints debug output; keep the report readable
+    with tempfile.TemporaryDirectory() as cache_dir, contextlib.redirect_stdout(io.StringIO()):
+        controller = TimedController(server_url, anthropic_client=client, cache_dir=cache_dir)
+        for _ in range(args.rounds):
+            for command, _ in corpus:
+                controller.handle(command)
+
+    if server:
+        server.shutdown()
+
+    print(f"{len(corpus)} commands x {args.rounds} rounds against {server_url}")
+    print(f"model latency {args.llm_latency_ms} ms, model calls: {client.calls}\n")
+    titles = {"setup": "setup", "uncached": "uncached commands (model called)",
+              "cached": "cached commands (intent cache hit, no planning call)"}
+    for kind in KINDS:
+        timings = controller.timings[kind]
+        if not any(timings.values()):
+            continue
+        print(f"{titles[kind]}, stage times in ms")
+        for stage in STAGES:
+            if timings[stage]:
+                print(f"  {stage:14s} {summarize(timings[stage])}")
+        print()
+
+if __name__ == '__main__':
+    main()
@@ -1,52 +1,122 @@
 import os
-import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from anthropic import Anthropic
 from dotenv import load_dotenv
 import readline  # Add this import at the top of the file
+import requests
+from anthropic import APIError
+from discovery import ApiExplorer
+from intent_cache import IntentCache
+from summarizer import render_response
+from prompt import build_system_prompt
+
+PLAN_METHODS = ["GET", "POST", "PUT", "DELETE"]
+
+# Tool the model fills in with the HTTP requests for one user command
+PLAN_TOOL = {
+    "name": "send_requests",
+    "description": "Send HTTP requests to the IoT server. All requests are sent concurrently.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "actions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "method": {"type": "string", "enum": PLAN_METHODS},
+                        "path": {"type": "string", "description": "Endpoint path, e.g. /leds/1/on"},
+                        "params": {"type": "object", "description": "Query parameters"},
+                        "body": {"type": "object", "description": "JSON request body"}
+                    },
+                    "required": ["method", "path"]
+                }
+            }
+        },
+        "required": ["actions"]
+    }
+}
+
+def _matches(path, template):
+    """Whether a path fits a link template, where '{name}' is any segment"""
+    segments = path.strip("/").split("/")
+    pattern = template.strip("/").split("/")
+    return len(segments) == len(pattern) and all(
+        p == s or (p.startswith("{") and p.endswith("}") and s)
+        for s, p in zip(segments, pattern))
+
+def _succeeded(response):
+    """Whether no response of a plan reports an error"""
+    responses = response if isinstance(response, list) else [response]
+    return all(isinstance(r, dict) and "error" not in r and "error" not in r.get("data", {})
+               for r in responses)
 
 class IoTController:
-    def __init__(self, server_url, api_model="claude-3-5-haiku-20241022"):
+    def __init__(self, server_url, api_model="claude-3-5-haiku-20241022",
+                 anthropic_client=None, cache_dir=None):
         load_dotenv()
         self.server_url = server_url
-        self.anthropic = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+        self.anthropic = anthropic_client or Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
         self.api_model = api_model
+        if cache_dir:
+            self.explorer = ApiExplorer(server_url, cache_file=os.path.join(cache_dir, "api_cache.json"))
+        else:
+            self.explorer = ApiExplorer(server_url)
+        self.session = self.explorer.session
         self.api_structure = self._explore_api()
+        if cache_dir:
+            self.intent_cache = IntentCache(self.explorer.api_fingerprint,
+                                            cache_file=os.path.join(cache_dir, "intents.json"))
+        else:
+            self.intent_cache = IntentCache(self.explorer.api_fingerprint)
+        # Built once so every request sends identical, cacheable bytes
+        self.system_prompt = build_system_prompt(self.api_structure, PLAN_TOOL["name"])
 
     def _explore_api(self):
         """Explore API structure starting from root"""
-        structure = {}
-        root_response = requests.get(f"{self.server_url}/").json()
-        structure['root'] = root_response
-
-        # Explore each link from root
-        for endpoint, data in root_response['_links'].items():
-            if endpoint != 'self':
-                try:
-                    response = requests.get(f"{self.server_url}{data['href']}").json()
-                    structure[endpoint] = response
-                except:
-                    continue
-
-        return structure
-
-    def _get_function_call(self, user_input):
-        """Get function call from Claude for user input"""
-        system_prompt = f"""You are an IoT API assistant. Convert user commands to function calls of the Python requests library to send requests to the IoT server.
-API structure: {json.dumps(self.api_structure, indent=2)}
-Server URL: {self.server_url}
-
-Respond only with the function call, no explanations."""
+        return self.explorer.explore()
 
+    def _get_plan(self, user_input):
+        """Get the list of HTTP actions for user input from Claude"""
         message = self.anthropic.messages.create(
             model=self.api_model,
             max_tokens=1024,
-            system=system_prompt,
+            system=self.system_prompt,
+            tools=[PLAN_TOOL],
+            tool_choice={"type": "tool", "name": PLAN_TOOL["name"]},
             messages=[{"role": "user", "content": user_input}]
         )
-        # DEBUG
-        print(f"Claude response: {message.content[0].text}")
-        return message.content[0].text
+        self._report_usage("plan", message)
+        for block in message.content:
+            if block.type == "tool_use":
+                # DEBUG
+                print(f"Claude plan: {json.dumps(block.input)}")
+                return block.input.get("actions", [])
+        raise ValueError("Model did not return a plan")
+
+    def _report_usage(self, stage, message):
+        """Print the token counts of one model call"""
+        usage = message.usage
+        print(f"[{stage} tokens] input: {usage.input_tokens}, "
+              f"cache write: {getattr(usage, 'cache_creation_input_tokens', 0) or 0}, "
+              f"cache read: {getattr(usage, 'cache_read_input_tokens', 0) or 0}, "
+              f"output: {usage.output_tokens}")
+
+    def _validate_plan(self, actions):
+        """Raise ValueError unless every action targets a discovered endpoint"""
+        if not isinstance(actions, list) or not actions:
+            raise ValueError("Plan must be a non-empty list of actions")
+        paths = ApiExplorer.paths(self.api_structure)
+        templates = ApiExplorer.path_templates(self.api_structure)
+        for action in actions:
+            if not isinstance(action, dict):
+                raise ValueError(f"Invalid action: {action!r}")
+            if action.get("method") not in PLAN_METHODS:
+                raise ValueError(f"Invalid method: {action.get('method')}")
+            path = str(action.get("path", "")).split("?")[0]
+            if path not in paths and not any(_matches(path, t) for t in templates):
+                raise ValueError(f"Unknown endpoint: {path}")
 
     def _convert_to_human_language(self, response):
         prompt = """Convert this IoT API JSON response to concise human language, focusing on the most important information.
@@ -59,24 +129,63 @@ Respond only with the function call, no explanations."""
             max_tokens=1024,
             messages=[{"role": "user", "content": prompt.format(response=json.dumps(response, indent=2))}]
         )
+        self._report_usage("summary", message)
         return message.content[0].text
 
 
     def _format_response(self, response):
-        if isinstance(response, dict):
-            human_response = self._convert_to_human_language(response)
-            return f"\n{human_response}"
-        return f"\nResponse: {response}"
-
-
-    def execute_command(self, function_call):
-        # Execute request
+        """Render known response shapes locally; ask the model about the rest"""
+        responses = response if isinstance(response, list) else [response]
+        lines = [render_response(r) for r in responses]
+
+        unknown = [r for r, line in zip(responses, lines) if line is None]
+        if unknown:
+            human_response = self._convert_to_human_language(unknown[0] if len(unknown) == 1 else unknown)
+            lines = [line for line in lines if line is not None] + [human_response]
+        return "\n" + "\n".join(lines)
+
+    def _send(self, action):
+        """Send one HTTP action over the pooled session"""
         try:
-            response = eval(function_call)
+            response = self.session.request(
+                action["method"],
+                f"{self.server_url}{action['path']}",
+                params=action.get("params"),
+                json=action.get("body"),
+                timeout=self.explorer.timeout
+            )
             return response.json()
         except Exception as e:
             return {"error": str(e)}
 
+    def execute_command(self, actions):
+        """Send all actions of a plan concurrently.
+
+        Returns the response of a single action as is, and a list of responses
+        in plan order for several actions.
+        """
+        try:
+            self._validate_plan(actions)
+        except ValueError as e:
+            return {"error": str(e)}
+
+        if len(actions) == 1:
+            return self._send(actions[0])
+        with ThreadPoolExecutor(max_workers=min(len(actions), self.explorer.max_workers)) as executor:
+            return list(executor.map(self._send, actions))
+
+    def handle(self, user_input):
+        """Process one user command and return the text to show"""
+        # Repeated commands skip the model entirely
+        actions = self.intent_cache.lookup(user_input)
+        cached = actions is not None
+        if not cached:
+            actions = self._get_plan(user_input)
+        response = self.execute_command(actions)
+        if not cached and _succeeded(response):
+            self.intent_cache.store(user_input, actions)
+        return self._format_response(response)
+
     def run(self):
         """Main loop"""
         print("\033[1mIoT Controller started. Type 'quit' to exit.\033[0m")
@@ -95,17 +204,16 @@ Respond only with the function call, no explanations."""
                 if user_input.lower() == 'quit':
                     break
                 if user_input.lower() == 'help':
-                    print(self.api_structure)
+                    print(self.system_prompt[0]["text"])
                     continue
                 if user_input.lower() == '':
                     continue
 
-                # Process command as before...
-                function_call = self._get_function_call(user_input)
-                response = self.execute_command(function_call)
-                formatted_response = self._format_response(response)
-                print(formatted_response)
+                print(self.handle(user_input))
 
+            except (ValueError, requests.RequestException, APIError) as e:
+                # One bad model reply or network error must not end the session
+                print(f"Error: {e}")
             except KeyboardInterrupt:
                 print("\nUse 'quit' to exit")
                 continue
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".iot_controller_cache.json")
+
+# Link relations that name actions rather than documents to read
+ACTION_RELATIONS = {"on", "off", "toggle", "create", "update", "delete", "update_config", "display"}
+
+class ApiExplorer:
+    """Discover the HATEOAS API of a geekhouse server.
+
+    Documents are fetched level by level over a pooled keep-alive session,
+    with each level fetched concurrently. The result is cached on disk
+    together with a fingerprint of the link graph of the root and first-level
+    documents, so later startups only re-fetch those to revalidate the cache.
+    """
+    def __init__(self, server_url, max_depth=3, max_workers=8, timeout=5,
+                 cache_file=DEFAULT_CACHE_FILE):
+        self.server_url = server_url
+        self.max_depth = max_depth
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache_file = cache_file
+        self.api_fingerprint = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _fetch(self, href):
+        """GET one document; None if it is missing or not JSON"""
+        try:
+            response = self.session.get(f"{self.server_url}{href}", timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError):
+            return None
+
+    def _fetch_all(self, hrefs):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(hrefs, executor.map(self._fetch, hrefs)))
+
+    @staticmethod
+    def links(document):
+        """Yield (relation, link) pairs from a document and its nested items"""
+        if isinstance(document, dict):
+            for relation, link in document.get("_links", {}).items():
+                if isinstance(link, dict) and "href" in link:
+                    yield relation, link
+            for key, value in document.items():
+                if key != "_links":
+                    yield from ApiExplorer.links(value)
+        elif isinstance(document, list):
+            for item in document:
+                yield from ApiExplorer.links(item)
+
+    @staticmethod
+    def _readable(relation, link):
+        """Whether a link points at a document that can be fetched with GET"""
+        href = link["href"]
+        return (href.startswith("/") and "?" not in href and "{" not in href
+                and not link.get("templated")
+                and link.get("method", "GET") == "GET"
+                and relation not in ACTION_RELATIONS)
+
+    @staticmethod
+    def paths(structure):
+        """All concrete paths linked from the discovered documents"""
+        paths = set(structure)
+        for document in structure.values():
+            for _, link in ApiExplorer.links(document):
+                href = link["href"]
+                if href.startswith("/") and not link.get("templated") and "{" not in href:
+                    paths.add(href.split("?")[0].strip())
+        return paths
+
+    @staticmethod
+    def path_templates(structure):
+        """Paths of templated links, e.g. '/leds/filter' or '/leds/{id}/on'"""
+        templates = set()
+        for document in structure.values():
+            for _, link in ApiExplorer.links(document):
+                href = link["href"].strip()
+                if href.startswith("/") and (link.get("templated") or "{" in href):
+                    templates.add(href.split("?")[0])
+        return templates
+
+    @staticmethod
+    def fingerprint(documents):
+        """Hash the link graph of some documents, ignoring volatile values"""
+        hrefs = sorted(
+            f"{href} {relation} {link['href']}"
+            for href, document in documents.items()
+            for relation, link in ApiExplorer.links(document)
+        )
+        return hashlib.sha256("\n".join(hrefs).encode()).hexdigest()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, fingerprint, structure):
+        cache = self._load_cache()
+        cache[self.server_url] = {"fingerprint": fingerprint, "structure": structure}
+        try:
+            with open(self.cache_file, "w") as f:
+                json.dump(cache, f)
+        except OSError as e:
+            print(f"Error writing API cache: {e}")
+
+    def _next_level(self, documents, visited):
+        hrefs = []
+        for document in documents.values():
+            for relation, link in self.links(document):
+                href = link["href"]
+                if self._readable(relation, link) and href not in visited:
+                    visited.add(href)
+                    hrefs.append(href)
+        return hrefs
+
+    def explore(self, use_cache=True):
+        """Return the API structure as a dict of documents keyed by path"""
+        root = self._fetch("/")
+        if root is None:
+            raise RuntimeError(f"No API root at {self.server_url}/")
+
+        visited = {"/"}
+        structure = {"/": root}
+        level = {"/": root}
+        level.update({href: doc for href, doc in self._fetch_all(self._next_level(level, visited)).items()
+                      if doc is not None})
+        structure.update(level)
+        fingerprint = self.fingerprint(level)
+        self.api_fingerprint = fingerprint
+
+        cached = self._load_cache().get(self.server_url) if use_cache else None
+        if cached and cached["fingerprint"] == fingerprint:
+            # Same link graph: keep deeper documents, refresh what was fetched
+            cached["structure"].update(structure)
+            return cached["structure"]
+
+        for _ in range(1, self.max_depth):
+            hrefs = self._next_level(level, visited)
+            if not hrefs:
+                break
+            level = {href: doc for href, doc in self._fetch_all(hrefs).items() if doc is not None}
+            structure.update(level)
+
+        self._save_cache(fingerprint, structure)
+        return structure
@@ -0,0 +1,97 @@
+import json
+import os
+import re
+
+# Bumped whenever the format of cached plans changes
+FORMAT_VERSION = 2
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".iot_controller_intents.json")
+
+# Words that do not change what a command means
+STOPWORDS = {"a", "an", "the", "please", "pls", "can", "could", "would", "you", "kindly",
+             "now", "just", "me", "for", "i", "want", "to", "my"}
+
+# Words that must match exactly for two commands to be the same command
+CRITICAL_WORDS = {"on", "off", "toggle", "cw", "ccw", "clockwise", "counterclockwise",
+                  "start", "stop", "run", "all", "not", "no", "up", "down", "open", "close"}
+
+class IntentCache:
+    """Map user utterances to request plans that have already worked.
+
+    Lookups try the normalized utterance first, then a token-set similarity
+    match. A fuzzy match is only accepted when the differing words are
+    neither numbers nor critical words, so "turn on light 1" never matches
+    "turn off light 1" or "turn on light 2". Entries belong to one API
+    fingerprint and are dropped when the discovered API changes.
+    """
+    def __init__(self, fingerprint, cache_file=DEFAULT_CACHE_FILE, threshold=0.9):
+        self.cache_file = cache_file
+        self.threshold = threshold
+        self.fingerprint = fingerprint
+        self.entries = {}
+        self._load()
+        self._tokens = {key: set(key.split()) for key in self.entries}
+
+    @staticmethod
+    def normalize(utterance):
+        """Lowercase, drop punctuation and filler words, singularize plurals"""
+        words = re.findall(r"[a-z0-9]+", utterance.lower())
+        tokens = []
+        for word in words:
+            if word in STOPWORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            tokens.append(word)
+        return " ".join(tokens)
+
+    def _load(self):
+        try:
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cache.get("version") == FORMAT_VERSION and cache.get("fingerprint") == self.fingerprint:
+            self.entries = cache.get("entries", {})
+
+    def _save(self):
+        try:
+            with open(self.cache_file, "w") as f:
+                json.dump({"version": FORMAT_VERSION, "fingerprint": self.fingerprint,
+                           "entries": self.entries}, f)
+        except OSError as e:
+            print(f"Error writing intent cache: {e}")
+
+    def _compatible(self, tokens, other):
+        difference = tokens ^ other
+        if any(token.isdigit() or token in CRITICAL_WORDS for token in difference):
+            return False
+        return len(tokens & other) / len(tokens | other) >= self.threshold
+
+    def lookup(self, utterance):
+        """Return the cached plan for an utterance, or None"""
+        key = self.normalize(utterance)
+        if not key:
+            return None
+        if key in self.entries:
+            return self.entries[key]["plan"]
+
+        tokens = set(key.split())
+        best_key, best_score = None, 0
+        for other_key, other in self._tokens.items():
+            if self._compatible(tokens, other):
+                score = len(tokens & other) / len(tokens | other)
+                if score > best_score:
+                    best_key, best_score = other_key, score
+        if best_key is None:
+            return None
+        return self.entries[best_key]["plan"]
+
+    def store(self, utterance, plan):
+        """Remember a plan that was validated and executed successfully"""
+        key = self.normalize(utterance)
+        if not key:
+            return
+        self.entries[key] = {"plan": plan}
+        self._tokens[key] = set(key.split())
+        self._save()
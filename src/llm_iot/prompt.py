@@ -0,0 +1,85 @@
+"""Compact endpoint catalogue for the controller's system prompt.
+
+The discovered HATEOAS documents are large and contain live values such as
+LED states. The catalogue keeps only what the model needs to plan requests:
+one line per endpoint pattern with its method, query parameters and body
+template, plus the devices behind each collection. Output is sorted and free
+of live values, so it is byte-identical across calls and provider-side prompt
+caching applies.
+"""
+import json
+import re
+
+from discovery import ACTION_RELATIONS, ApiExplorer
+
+DEVICE_ATTRIBUTES = ("type", "color", "location", "unit")
+
+def _collections(api_structure):
+    """Map collection names to {device id: descriptive attributes}"""
+    collections = {}
+    for path, document in api_structure.items():
+        segments = path.strip("/").split("/")
+        data = document.get("data") if isinstance(document, dict) else None
+        if len(segments) != 1 or not segments[0] or not isinstance(data, dict):
+            continue
+        devices = {
+            device_id: [str(item[a]) for a in DEVICE_ATTRIBUTES if a in item]
+            for device_id, item in data.items()
+            if isinstance(item, dict) and "_links" in item
+        }
+        if devices:
+            collections[segments[0]] = devices
+    return collections
+
+def _pattern(path, collections):
+    """Replace device ids in a path by '{id}'"""
+    segments = path.strip("/").split("/")
+    if len(segments) > 1 and segments[1] in collections.get(segments[0], {}):
+        segments[1] = "{id}"
+    return "/" + "/".join(segments)
+
+def build_catalogue(api_structure):
+    """Return the endpoint and device catalogue as text"""
+    collections = _collections(api_structure)
+    endpoints = {}
+
+    for path in api_structure:
+        endpoints.setdefault(("GET", _pattern(path, collections)), (set(), set()))
+
+    for document in api_structure.values():
+        for relation, link in ApiExplorer.links(document):
+            href = link["href"].strip()
+            if not href.startswith("/"):
+                continue
+            method = link.get("method") or ("POST" if relation in ACTION_RELATIONS else "GET")
+            path, _, query = href.partition("?")
+            params, bodies = endpoints.setdefault((method, _pattern(path, collections)), (set(), set()))
+            params.update(re.findall(r"([A-Za-z_]+)=", query))
+            for key in ("template", "templates"):
+                if key in link:
+                    bodies.add(json.dumps(link[key], sort_keys=True, separators=(",", ":")))
+
+    lines = ["Endpoints (method path [params] [body]):"]
+    for (method, pattern), (params, bodies) in sorted(endpoints.items(), key=lambda e: (e[0][1], e[0][0])):
+        line = f"{method} {pattern}"
+        if params:
+            line += " params: " + ",".join(sorted(params))
+        for body in sorted(bodies):
+            line += " body: " + body
+        lines.append(line)
+
+    lines.append("")
+    lines.append("Devices ({id}: attributes):")
+    for name, devices in sorted(collections.items()):
+        entries = "; ".join(" ".join([device_id] + attrs) for device_id, attrs in sorted(devices.items()))
+        lines.append(f"{name}: {entries}")
+    return "\n".join(lines)
+
+def build_system_prompt(api_structure, tool_name):
+    """System prompt blocks for planning, marked for prompt caching"""
+    text = f"""You are an IoT API assistant. Convert user commands to HTTP requests to the IoT server by calling the {tool_name} tool once.
+Put every request the command needs into that single call; the requests are sent concurrently, so do not rely on their order.
+Use concrete device ids in paths.
+
+{build_catalogue(api_structure)}"""
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
@@ -0,0 +1,80 @@
+"""Render known geekhouse API responses as sentences without a model call.
+
+Each renderer recognizes one HATEOAS response shape produced by the server
+routes and returns None for anything else, so unknown shapes can still be
+summarized by the LLM.
+"""
+
+def _on_off(state):
+    return "on" if state else "off"
+
+def _number(value):
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return str(value)
+
+def _render_error(data):
+    if "error" in data:
+        return f"Error: {data['error']}"
+
+def _render_led(data):
+    if {"id", "state", "color", "location"} <= data.keys():
+        return f"LED {data['id']} ({data['color']}, {data['location']}) is {_on_off(data['state'])}."
+
+def _render_led_list(data):
+    if data and all(isinstance(led, dict) and {"color", "location", "state"} <= led.keys()
+                    for led in data.values()):
+        return "\n".join(
+            f"LED {led_id} ({led['color']}, {led['location']}) is {_on_off(led['state'])}."
+            for led_id, led in data.items()
+        )
+
+def _render_sensor_value(data):
+    if {"id", "calibrated_value", "unit", "type", "location"} <= data.keys():
+        text = (f"Sensor {data['id']} ({data['type']}, {data['location']}) reads "
+                f"{_number(data['calibrated_value'])} {data['unit']}.")
+        if data.get("count") is not None:
+            text += f" It was triggered {data['count']} times"
+            if data.get("ms_since_change") is not None:
+                text += f", last change {_number(data['ms_since_change'] / 1000)} s ago"
+            text += "."
+        return text
+
+def _render_motor(data):
+    if {"id", "state", "type", "location"} <= data.keys() and "unit" not in data:
+        state = "running" if data["state"] else "stopped"
+        return f"Motor {data['id']} ({data['type']}, {data['location']}) is {state}."
+
+def _render_lcd(data):
+    if "text" in data and "display_info" in data:
+        return f"The LCD now shows \"{data['text']}\"."
+
+def _render_message(data):
+    if set(data.keys()) <= {"id", "message"} and "message" in data:
+        return data["message"] + "."
+
+RENDERERS = [
+    _render_error,
+    _render_led,
+    _render_sensor_value,
+    _render_motor,
+    _render_lcd,
+    _render_message,
+    _render_led_list,
+]
+
+def render_response(response):
+    """Return a sentence for a known response shape, or None"""
+    if not isinstance(response, dict):
+        return None
+    if "error" in response:
+        return f"Error: {response['error']}"
+
+    data = response.get("data")
+    if not isinstance(data, dict):
+        return None
+    for renderer in RENDERERS:
+        text = renderer(data)
+        if text:
+            return text
+    return None
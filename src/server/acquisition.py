@@ -0,0 +1,96 @@
+from array import array
+
+FILTERS = ("mean", "median", "trimmed_mean")
+
+class Sampler:
+    """Oversample an ADC into a preallocated buffer and filter the result.
+
+    `read()` takes `oversample` readings, reduces them with the configured
+    filter and optionally smooths the result with an exponential moving
+    average. The sampling loop works in place and does not allocate.
+    """
+    def __init__(self, adc, oversample=1, filter="median", trim=0.25, ema_alpha=None):
+        if oversample < 1:
+            raise ValueError("oversample must be at least 1")
+        if filter not in FILTERS:
+            raise ValueError(f"Invalid filter: {filter}")
+        if not 0 <= trim < 0.5:
+            raise ValueError("trim must be in [0, 0.5)")
+        if ema_alpha is not None and not 0 < ema_alpha <= 1:
+            raise ValueError("ema_alpha must be in (0, 1]")
+
+        self.adc = adc
+        self.oversample = oversample
+        self.filter = filter
+        self.trim = trim
+        self.ema_alpha = ema_alpha
+        self._drop = int(oversample * trim)  # samples dropped at each end
+        self._buf = array('H', [0] * oversample)
+        self._ema = None
+
+    def settings(self):
+        """Acquisition settings in config file form"""
+        settings = {
+            "oversample": self.oversample,
+            "filter": self.filter,
+            "trim": self.trim
+        }
+        if self.ema_alpha is not None:
+            settings["ema_alpha"] = self.ema_alpha
+        return settings
+
+    def read(self):
+        """Return one filtered 16-bit reading"""
+        self.fill(0, self.oversample)
+        return self.reduce()
+
+    def fill(self, start, stop):
+        """Take readings start..stop-1 of the next value.
+
+        read() fills the whole buffer at once; callers can also fill it in
+        chunks and yield in between, then call reduce().
+        """
+        buf = self._buf
+        read_u16 = self.adc.read_u16
+        for i in range(start, stop):
+            buf[i] = read_u16()
+
+    def reduce(self):
+        """Filter the filled buffer into one reading"""
+        buf = self._buf
+        n = self.oversample
+        if n == 1:
+            value = buf[0]
+        elif self.filter == "mean":
+            total = 0
+            for i in range(n):
+                total += buf[i]
+            value = total // n
+        else:
+            _sort(buf, n)
+            if self.filter == "median":
+                mid = n // 2
+                value = buf[mid] if n % 2 else (buf[mid - 1] + buf[mid]) // 2
+            else:
+                total = 0
+                for i in range(self._drop, n - self._drop):
+                    total += buf[i]
+                value = total // (n - 2 * self._drop)
+
+        if self.ema_alpha is not None:
+            if self._ema is None:
+                self._ema = value
+            else:
+                self._ema += self.ema_alpha * (value - self._ema)
+            value = int(self._ema + 0.5)
+        return value
+
+def _sort(buf, n):
+    """In-place insertion sort, fast for the small buffers used here"""
+    for i in range(1, n):
+        v = buf[i]
+        j = i - 1
+        while j >= 0 and buf[j] > v:
+            buf[j + 1] = buf[j]
+            j -= 1
+        buf[j + 1] = v
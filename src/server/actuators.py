@@ -0,0 +1,127 @@
+import asyncio
+
+ACTION_TYPES = ("led", "motor", "lcd")
+
+class Actuators:
+    """Operations on LEDs, motors and the LCD shared by routes and automations"""
+    def __init__(self, config_handler, lcd):
+        self.config = config_handler
+        self.lcd = lcd
+        # Callables notified as listener(kind, device_id, state) on every change
+        self.listeners = []
+        # motor id -> task stopping a timed run
+        self._motor_stops = {}
+
+    def _notify(self, kind, device_id, state):
+        for listener in self.listeners:
+            listener(kind, device_id, state)
+
+    def led(self, led_id, command):
+        """Switch an LED 'on', 'off' or 'toggle' and return its state"""
+        led = self.config.leds[led_id]["pin"]
+        if command == "on":
+            led.on()
+        elif command == "off":
+            led.off()
+        elif command == "toggle":
+            led.toggle()
+        else:
+            raise ValueError(f"Invalid LED command: {command}")
+        self._notify("leds", led_id, led.value())
+        return led.value()
+
+    def motor_on(self, motor_id, direction="cw", seconds=0):
+        """Start a motor; with seconds > 0 a task stops it after that long.
+
+        Returns at once, so a timed run does not hold the caller (or its
+        request slot) for the whole run. A new command for the motor cancels
+        a pending stop.
+        """
+        self._cancel_stop(motor_id)
+        motor_on = self.config.motors[motor_id]["pin_on"]
+        motor_dir = self.config.motors[motor_id]["pin_dir"]
+        if direction == "cw":
+            motor_dir.value(0)
+            motor_on.value(1)
+        else:
+            motor_dir.value(1)
+            motor_on.value(0)
+        self._notify("motors", motor_id, {"running": 1, "direction": direction})
+
+        if seconds > 0:
+            self._motor_stops[motor_id] = asyncio.create_task(self._stop_after(motor_id, seconds))
+        return motor_on.value()
+
+    async def _stop_after(self, motor_id, seconds):
+        await asyncio.sleep(seconds)
+        self._motor_stops.pop(motor_id, None)
+        if motor_id in self.config.motors:
+            self.motor_off(motor_id)
+
+    def _cancel_stop(self, motor_id):
+        task = self._motor_stops.pop(motor_id, None)
+        if task is not None:
+            task.cancel()
+
+    def motor_off(self, motor_id):
+        """Stop a motor"""
+        self._cancel_stop(motor_id)
+        motor_on = self.config.motors[motor_id]["pin_on"]
+        motor_dir = self.config.motors[motor_id]["pin_dir"]
+        motor_on.value(0)
+        motor_dir.value(0)
+        self._notify("motors", motor_id, {"running": 0})
+        return motor_on.value()
+
+    def lcd_display(self, text):
+        """Show text on the LCD, split over two lines and truncated to 32 chars"""
+        if len(text) > 32:
+            text = text[:32]  # truncate to maximum length
+
+        self.lcd.clear()
+        if len(text) > 16:
+            self.lcd.write(0, 0, text[:16])  # first line
+            self.lcd.write(0, 1, text[16:])  # second line
+        else:
+            self.lcd.write(0, 0, text)
+        self._notify("lcd", "text", text)
+        return text
+
+    def run(self, action, value=None):
+        """Run an automation action without blocking the caller.
+
+        `value` is the sample that triggered the action, if any; LCD text can
+        include it as '{value}'.
+        """
+        action_type = action["type"]
+        if action_type == "led":
+            self.led(action["id"], action.get("command", "toggle"))
+        elif action_type == "motor":
+            if action.get("command", "on") == "off":
+                self.motor_off(action["id"])
+            else:
+                self.motor_on(action["id"], action.get("direction", "cw"), action.get("seconds", 0))
+        elif action_type == "lcd":
+            self.lcd_display(action["text"].replace("{value}", str(value)))
+
+    def validate_action(self, action):
+        """Raise ValueError unless the action refers to existing devices"""
+        if not isinstance(action, dict) or action.get("type") not in ACTION_TYPES:
+            raise ValueError(f"Action type must be one of {', '.join(ACTION_TYPES)}")
+
+        if action["type"] == "led":
+            if action.get("id") not in self.config.leds:
+                raise ValueError(f"Invalid LED: {action.get('id')}")
+            if action.get("command", "toggle") not in ["on", "off", "toggle"]:
+                raise ValueError(f"Invalid LED command: {action['command']}")
+        elif action["type"] == "motor":
+            if action.get("id") not in self.config.motors:
+                raise ValueError(f"Invalid motor: {action.get('id')}")
+            if action.get("command", "on") not in ["on", "off"]:
+                raise ValueError(f"Invalid motor command: {action['command']}")
+            if action.get("direction", "cw") not in ["cw", "ccw"]:
+                raise ValueError(f"Invalid motor direction: {action['direction']}")
+            if not isinstance(action.get("seconds", 0), int):
+                raise ValueError("Motor seconds must be an integer")
+        elif not isinstance(action.get("text"), str):
+            raise ValueError("LCD action requires 'text'")
@@ -0,0 +1,122 @@
+import asyncio
+import gc
+import heapq
+from utils import create_response
+
+# Lower values are served first
+ACTUATOR = 0
+NORMAL = 1
+BULK = 2
+
+ACTUATOR_COLLECTIONS = ("leds", "motors", "lcd")
+BULK_PATHS = ("/", "/leds", "/sensors", "/motors", "/rules", "/schedules")
+
+def request_priority(method, path):
+    """Actuator commands first, discovery documents and histories last"""
+    parts = path.strip("/").split("/")
+    if method != "GET" and parts[0] in ACTUATOR_COLLECTIONS:
+        return ACTUATOR
+    if method == "GET" and ((path.rstrip("/") or "/") in BULK_PATHS or parts[-1] == "events"):
+        return BULK
+    return NORMAL
+
+class AdmissionControl:
+    """Cap concurrent request handlers and shed load by priority.
+
+    At most `max_active` handlers run at once. Further requests wait in a
+    queue of at most `max_queue` entries ordered by priority; when it is
+    full, a new request evicts the lowest-priority waiter or is rejected
+    itself. Waiters give up after `queue_timeout_ms`. Below `min_free_heap`
+    bytes everything but actuator commands is rejected. Rejections are
+    503 responses with a Retry-After header.
+    """
+    def __init__(self, app, max_active=2, max_queue=8, queue_timeout_ms=3000,
+                 min_free_heap=16384, retry_after_s=2):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_timeout_ms = queue_timeout_ms
+        self.min_free_heap = min_free_heap
+        self.retry_after_s = retry_after_s
+
+        self.active = 0
+        # Heap of [priority, seq, event, outcome]; outcome is None while
+        # waiting, True once admitted and False if evicted
+        self._queue = []
+        self._seq = 0
+        self.counts = {"admitted": 0, "queued": 0, "evicted": 0, "timed_out": 0, "low_memory": 0, "rejected": 0}
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.after_error_request(self._after_request)
+
+    def _free_heap(self):
+        if not hasattr(gc, "mem_free"):
+            return None
+        free = gc.mem_free()
+        if free < self.min_free_heap:
+            gc.collect()
+            free = gc.mem_free()
+        return free
+
+    def _reject(self, reason):
+        return create_response({"error": f"Server busy: {reason}"}, {"root": {"href": "/"}},
+                               status_code=503, headers={"Retry-After": str(self.retry_after_s)})
+
+    async def _before_request(self, request):
+        priority = request_priority(request.method, request.path)
+
+        if priority != ACTUATOR:
+            free = self._free_heap()
+            if free is not None and free < self.min_free_heap:
+                self.counts["low_memory"] += 1
+                return self._reject("low memory")
+
+        if self.active < self.max_active and not self._queue:
+            self.active += 1
+            self.counts["admitted"] += 1
+            request.g.admitted = True
+            return None
+
+        if len(self._queue) >= self.max_queue:
+            # Evict the newest waiter of the lowest priority, if lower than ours
+            worst = max(self._queue)
+            if worst[0] <= priority:
+                self.counts["rejected"] += 1
+                return self._reject("queue full")
+            self._queue.remove(worst)
+            heapq.heapify(self._queue)
+            self.counts["evicted"] += 1
+            worst[3] = False
+            worst[2].set()
+
+        self._seq += 1
+        entry = [priority, self._seq, asyncio.Event(), None]
+        heapq.heappush(self._queue, entry)
+        self.counts["queued"] += 1
+        try:
+            await asyncio.wait_for(entry[2].wait(), self.queue_timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+
+        if entry[3] is False:
+            return self._reject("evicted by a more urgent request")
+        if entry[3] is None:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            self.counts["timed_out"] += 1
+            return self._reject("timed out in queue")
+        self.counts["admitted"] += 1
+        request.g.admitted = True
+        return None
+
+    async def _after_request(self, request, response):
+        if request and getattr(request.g, "admitted", False):
+            request.g.admitted = False
+            self.active -= 1
+            # Hand free slots to the highest-priority waiters
+            while self._queue and self.active < self.max_active:
+                entry = heapq.heappop(self._queue)
+                entry[3] = True
+                self.active += 1
+                entry[2].set()
+        return response
@@ -0,0 +1,133 @@
+from machine import Pin, disable_irq, enable_irq
+from array import array
+import time
+
+class EdgeCapture:
+    """Record debounced edges of a digital input from its IRQ handler.
+
+    Edges land in a preallocated ring buffer, so nothing is allocated between
+    edges and short pulses are never lost to a slow poll rate. The newest
+    `queue_size` edges are kept; older ones are counted as dropped.
+
+    The direction of an edge comes from the IRQ flags, not from reading the
+    pin, which may already be back at its old level. An edge within
+    `debounce_ms` of the last accepted one only updates the tracked level;
+    once the window has passed, a level that differs from the recorded
+    state is recorded as the edge that was held back.
+    """
+    def __init__(self, pin, debounce_ms=20, queue_size=32):
+        self.pin = pin
+        self.debounce_ms = debounce_ms
+        self.queue_size = queue_size
+        self._ticks = array('L', [0] * queue_size)
+        self._values = bytearray(queue_size)
+        self._head = 0  # total number of accepted edges
+        self.count = 0  # rising edges, i.e. activations
+        self._state = pin.value()  # level as recorded
+        self._level = self._state  # level after the latest edge seen
+        self._level_ms = self._last = time.ticks_ms()
+        # Keep a single bound method so the IRQ never allocates one
+        self._handler = self._on_edge
+        self._irq = pin.irq(handler=self._handler, trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING)
+
+    def _record(self, value, now):
+        slot = self._head % self.queue_size
+        self._ticks[slot] = now
+        self._values[slot] = value
+        self._head += 1
+        self._state = value
+        self._last = now
+        if value:
+            self.count += 1
+
+    def _settle(self, now):
+        """Record a level that outlasted the debounce window"""
+        if self._level != self._state and time.ticks_diff(now, self._last) >= self.debounce_ms:
+            self._record(self._level, self._level_ms)
+
+    def _track(self, value, now):
+        self._settle(now)
+        self._level = value
+        self._level_ms = now
+        if value != self._state and (not self._head or time.ticks_diff(now, self._last) >= self.debounce_ms):
+            self._record(value, now)
+
+    def _on_edge(self, pin):
+        now = time.ticks_ms()
+        flags = self._irq.flags()
+        rising = flags & Pin.IRQ_RISING
+        falling = flags & Pin.IRQ_FALLING
+        if rising and falling:
+            # A pulse shorter than the handler latency: away and back
+            self._track(1 - self._level, now)
+            self._track(1 - self._level, now)
+            return
+        if rising:
+            value = 1
+        elif falling:
+            value = 0
+        else:
+            value = pin.value()
+        if value == self._level:
+            # The opposite edge never reached the handler
+            self._track(1 - value, now)
+        self._track(value, now)
+
+    def _resync(self):
+        """Catch up with the pin once no more edges arrive; IRQs disabled"""
+        now = time.ticks_ms()
+        value = self.pin.value()
+        if value != self._level:
+            self._level = value
+            self._level_ms = now
+        self._settle(now)
+
+    def release(self):
+        """Detach the IRQ handler from the pin"""
+        self.pin.irq(handler=None)
+
+    def summary(self):
+        """Counters and last change time, without the event list"""
+        state = disable_irq()
+        self._resync()
+        edges, count, last = self._head, self.count, self._last
+        enable_irq(state)
+
+        return {
+            "count": count,
+            "edges": edges,
+            "dropped": max(0, edges - self.queue_size),
+            "last_change_ms": last if edges else None,
+            "ms_since_change": time.ticks_diff(time.ticks_ms(), last) if edges else None
+        }
+
+    def events(self):
+        """Buffered edges, oldest first, as (ticks_ms, value) pairs"""
+        state = disable_irq()
+        self._resync()
+        head = self._head
+        ticks = array('L', self._ticks)
+        values = bytes(self._values)
+        enable_irq(state)
+
+        first = max(0, head - self.queue_size)
+        return [(ticks[i % self.queue_size], values[i % self.queue_size])
+                for i in range(first, head)]
+
+    def events_since(self, seen):
+        """Edges accepted after the first `seen` ones, as (edges so far, [(ticks_ms, value)]).
+
+        Pass the returned total back in to get only the edges after it;
+        nothing is allocated while there are none.
+        """
+        state = disable_irq()
+        self._resync()
+        head = self._head
+        if head == seen:
+            enable_irq(state)
+            return head, []
+        first = max(seen, head - self.queue_size)
+        edges = [(self._ticks[i % self.queue_size], self._values[i % self.queue_size])
+                 for i in range(first, head)]
+        enable_irq(state)
+        return head, edges
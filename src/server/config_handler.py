@@ -1,14 +1,80 @@
 import json
 from machine import Pin, ADC
+from capture import EdgeCapture
+from acquisition import Sampler
+from utils import validate_calibration
+
+DEVICE_KINDS = ("leds", "motors", "sensors")
+REQUIRED_FIELDS = {
+    "leds": ("pin", "color", "location", "type"),
+    "motors": ("pin_on", "pin_dir", "type", "location"),
+    "sensors": ("pin", "type", "location", "unit", "adc")
+}
+# Fields that need new hardware objects when they change
+PIN_FIELDS = {
+    "leds": ("pin",),
+    "motors": ("pin_on", "pin_dir"),
+    "sensors": ("pin", "adc")
+}
+
+def gpio_number(kind, device, field):
+    """GPIO behind a device pin; ADC sensors give a channel, 4 is the internal temperature sensor"""
+    pin = device[field]
+    if kind == "sensors" and device["adc"] and pin < 5:
+        return 26 + pin if pin < 4 else None
+    return pin
 
 class ConfigHandler:
     def __init__(self, config_file='config.json'):
         self.config_file = config_file
         self.wifi_config = {}
         self.server_config = {}
+        self.mqtt_config = {}
         self.leds = {}
         self.sensors = {}
         self.motors = {}
+        self.rules = {}
+        self.schedules = {}
+        # Called as hook(changes) after apply_devices()
+        self.reload_hooks = []
+
+    def _build_led(self, led_config):
+        return {
+            "pin": Pin(led_config["pin"], Pin.OUT),
+            "pin_no": led_config["pin"],
+            "color": led_config["color"],
+            "location": led_config["location"],
+            "type": led_config["type"]
+        }
+
+    def _build_motor(self, motor_config):
+        return {
+            "pin_on": Pin(motor_config["pin_on"], Pin.OUT),
+            "pin_dir": Pin(motor_config["pin_dir"], Pin.OUT),
+            "pin_on_no": motor_config["pin_on"],
+            "pin_dir_no": motor_config["pin_dir"],
+            "type": motor_config["type"],
+            "location": motor_config["location"]
+        }
+
+    def _build_sensor(self, sensor_config):
+        sensor = {
+            "pin_no": sensor_config["pin"],
+            "type": sensor_config["type"],
+            "location": sensor_config["location"],
+            "unit": sensor_config["unit"],
+            "config": sensor_config.get("config", {})
+        }
+        if sensor_config.get("adc", False):
+            adc = ADC(sensor_config["pin"])
+            sensor["pin"] = adc
+            sensor["sampler"] = Sampler(adc, **sensor_config.get("acquisition", {}))
+        else:
+            # Digital sensors are captured by IRQ instead of polled
+            pin = Pin(sensor_config["pin"], Pin.IN)
+            sensor["pin"] = pin
+            sensor["capture"] = EdgeCapture(pin, debounce_ms=sensor_config.get("debounce_ms", 20))
+        return sensor
 
     def load_config(self):
         """Load configuration from JSON file"""
@@ -19,37 +85,21 @@ class ConfigHandler:
             # Load WiFi configuration
             self.wifi_config = config.get('wifi', {})
             self.server_config = config.get('server', {'port': 80})
+            self.mqtt_config = config.get('mqtt', {})
 
-            # Initialize LEDs
+            # Initialize devices
             for led_id, led_config in config.get('leds', {}).items():
-                self.leds[led_id] = {
-                    "pin": Pin(led_config["pin"], Pin.OUT),
-                    "color": led_config["color"],
-                    "location": led_config["location"],
-                    "type": led_config["type"]
-                }
-
-            # Initialize Motors
+                self.leds[led_id] = self._build_led(led_config)
             for motor_id, motor_config in config.get('motors', {}).items():
-                self.motors[motor_id] = {
-                    "pin_on": Pin(motor_config["pin_on"], Pin.OUT),
-                    "pin_dir": Pin(motor_config["pin_dir"], Pin.OUT),
-                    "type": motor_config["type"],
-                    "location": motor_config["location"]
-                }
-
-            # Initialize Sensors
+                self.motors[motor_id] = self._build_motor(motor_config)
             for sensor_id, sensor_config in config.get('sensors', {}).items():
-                pin_class = ADC if sensor_config.get("adc", False) else Pin
-                self.sensors[sensor_id] = {
-                    "pin": pin_class(sensor_config["pin"]),
-                    "type": sensor_config["type"],
-                    "location": sensor_config["location"],
-                    "unit": sensor_config["unit"],
-                    "config": sensor_config.get("config", {})
-                }
-
-            print(f"Configuration loaded: {len(self.leds)} LEDs, {len(self.sensors)} sensors, {len(self.motors)} motors")
+                self.sensors[sensor_id] = self._build_sensor(sensor_config)
+
+            # Rules are plain data, compiled by the rules engine
+            self.rules = config.get('rules', {})
+            self.schedules = config.get('schedules', {})
+
+            print(f"Configuration loaded: {len(self.leds)} LEDs, {len(self.sensors)} sensors, {len(self.motors)} motors, {len(self.rules)} rules, {len(self.schedules)} schedules")
             return True
         except Exception as e:
             print(f"Error loading configuration: {str(e)}")
@@ -60,39 +110,13 @@ class ConfigHandler:
         config = {
             "wifi": self.wifi_config,
             "server": self.server_config,
-            "leds": {},
-            "motors": {},
-            "sensors": {}
+            "mqtt": self.mqtt_config,
+            "rules": self.rules,
+            "schedules": self.schedules
         }
 
-        # Save LED configurations
-        for led_id, led_info in self.leds.items():
-            config["leds"][led_id] = {
-                "pin": led_info["pin"].id(),
-                "color": led_info["color"],
-                "location": led_info["location"],
-                "type": led_info["type"]
-            }
-
-        # Save motor configurations
-        for motor_id, motor_info in self.motors.items():
-            config["motors"][motor_id] = {
-                "pin_on": motor_info["pin_on"].id(),
-                "pin_dir": motor_info["pin_dir"].id(),
-                "type": motor_info["type"],
-                "location": motor_info["location"]
-            }
-
-        # Save sensor configurations
-        for sensor_id, sensor_info in self.sensors.items():
-            config["sensors"][sensor_id] = {
-                "pin": sensor_info["pin"].id(),
-                "type": sensor_info["type"],
-                "location": sensor_info["location"],
-                "unit": sensor_info["unit"],
-                "adc": isinstance(sensor_info["pin"], ADC),
-                "config": sensor_info["config"]
-            }
+        for kind in DEVICE_KINDS:
+            config[kind] = self.device_configs(kind)
 
         try:
             with open(self.config_file, 'w') as f:
@@ -101,4 +125,202 @@ class ConfigHandler:
             return True
         except Exception as e:
             print(f"Error saving configuration: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    def device_config(self, kind, info):
+        """A device in config file form"""
+        if kind == "leds":
+            return {
+                "pin": info["pin_no"],
+                "color": info["color"],
+                "location": info["location"],
+                "type": info["type"]
+            }
+        if kind == "motors":
+            return {
+                "pin_on": info["pin_on_no"],
+                "pin_dir": info["pin_dir_no"],
+                "type": info["type"],
+                "location": info["location"]
+            }
+        config = {
+            "pin": info["pin_no"],
+            "type": info["type"],
+            "location": info["location"],
+            "unit": info["unit"],
+            "adc": "sampler" in info,
+            "config": info["config"]
+        }
+        if "capture" in info:
+            config["debounce_ms"] = info["capture"].debounce_ms
+        if "sampler" in info:
+            config["acquisition"] = info["sampler"].settings()
+        return config
+
+    def device_configs(self, kind):
+        return {device_id: self.device_config(kind, info)
+                for device_id, info in getattr(self, kind).items()}
+
+    def validate_devices(self, config):
+        """Raise ValueError unless the LED, motor and sensor sections are usable"""
+        pins = {}  # GPIO number -> (device field using it, ADC input)
+        for kind in DEVICE_KINDS:
+            devices = config.get(kind, {})
+            if not isinstance(devices, dict):
+                raise ValueError(f"'{kind}' must be an object")
+            for device_id, device in devices.items():
+                for field in REQUIRED_FIELDS[kind]:
+                    if field not in device:
+                        raise ValueError(f"{kind} '{device_id}' missing required field: {field}")
+                for field in PIN_FIELDS[kind]:
+                    if field == "adc":
+                        continue
+                    if not isinstance(device[field], int):
+                        raise ValueError(f"{kind} '{device_id}' {field} must be an integer")
+                    # A second device on a GPIO would silently reconfigure it;
+                    # only ADC sensors can share an input
+                    gpio = gpio_number(kind, device, field)
+                    if gpio is None:
+                        continue
+                    owner = (f"{kind} '{device_id}' {field}", kind == "sensors" and device["adc"])
+                    if gpio in pins and not (owner[1] and pins[gpio][1]):
+                        raise ValueError(f"{owner[0]} uses GPIO {gpio}, already used by {pins[gpio][0]}")
+                    pins[gpio] = owner
+                if kind == "sensors":
+                    calibration = device.get("config", {})
+                    if calibration:
+                        try:
+                            validate_calibration(calibration)
+                        except (KeyError, TypeError, ValueError) as e:
+                            raise ValueError(f"sensors '{device_id}' has invalid config: {e}")
+                    if device["adc"]:
+                        # The Sampler checks its own settings
+                        Sampler(None, **device.get("acquisition", {}))
+                    elif not isinstance(device.get("debounce_ms", 20), int):
+                        raise ValueError(f"sensors '{device_id}' debounce_ms must be an integer")
+
+        # Rules and schedules must not lose their devices
+        for rule_id, rule in self.rules.items():
+            if rule["sensor"] not in config.get("sensors", {}):
+                raise ValueError(f"Rule '{rule_id}' uses sensor {rule['sensor']}")
+        automations = [("Rule", rule_id, rule.get(key)) for rule_id, rule in self.rules.items()
+                       for key in ("action", "else_action")]
+        automations += [("Schedule", schedule_id, schedule["action"])
+                        for schedule_id, schedule in self.schedules.items()]
+        for name, automation_id, action in automations:
+            if action and action["type"] in ("led", "motor") and action["id"] not in config.get(action["type"] + "s", {}):
+                raise ValueError(f"{name} '{automation_id}' uses {action['type']} {action['id']}")
+
+    def _release(self, kind, info):
+        """Leave a device's pins in a safe state"""
+        if kind == "leds":
+            info["pin"].off()
+            info["pin"].init(Pin.IN)
+        elif kind == "motors":
+            info["pin_on"].value(0)
+            info["pin_dir"].value(0)
+            info["pin_on"].init(Pin.IN)
+            info["pin_dir"].init(Pin.IN)
+        elif "capture" in info:
+            info["capture"].release()
+
+    def _normalize(self, kind, device):
+        """A device configuration with defaults filled in, like device_config()"""
+        normalized = {field: device[field] for field in REQUIRED_FIELDS[kind]}
+        if kind == "sensors":
+            normalized["adc"] = bool(device["adc"])
+            normalized["config"] = device.get("config", {})
+            if device["adc"]:
+                normalized["acquisition"] = Sampler(None, **device.get("acquisition", {})).settings()
+            else:
+                normalized["debounce_ms"] = device.get("debounce_ms", 20)
+        return normalized
+
+    def _update(self, kind, info, new):
+        """Apply changes that keep the device's pins"""
+        for field in ("color", "location", "type", "unit", "config"):
+            if field in new:
+                info[field] = new[field]
+        if "sampler" in info and new["acquisition"] != info["sampler"].settings():
+            info["sampler"] = Sampler(info["pin"], **new["acquisition"])
+        elif "capture" in info:
+            info["capture"].debounce_ms = new["debounce_ms"]
+
+    def apply_devices(self, config):
+        """Reconfigure LEDs, motors and sensors in place.
+
+        Only devices that differ from the new configuration are touched:
+        removed devices are released, devices with new pins are rebuilt and
+        the rest keep their pin objects and state. Everything is validated
+        before any pin is released; if building a device still fails, the
+        previous devices are restored. Returns the ids changed per kind and
+        runs the reload hooks.
+        """
+        self.validate_devices(config)
+
+        # Work out every change before touching hardware
+        changes = {"added": {}, "updated": {}, "removed": {}}
+        release = []   # (kind, device id, old device config)
+        rebuild = []   # (kind, device id, new device config)
+        updates = []   # (kind, device id, normalized new config)
+        for kind in DEVICE_KINDS:
+            current = getattr(self, kind)
+            new_devices = config.get(kind, {})
+            for change in changes.values():
+                change[kind] = []
+
+            for device_id in current:
+                if device_id not in new_devices:
+                    release.append((kind, device_id, self.device_config(kind, current[device_id])))
+                    changes["removed"][kind].append(device_id)
+
+            for device_id, new in new_devices.items():
+                if device_id not in current:
+                    rebuild.append((kind, device_id, new))
+                    changes["added"][kind].append(device_id)
+                    continue
+                old = self.device_config(kind, current[device_id])
+                normalized = self._normalize(kind, new)
+                if any(old[field] != normalized[field] for field in PIN_FIELDS[kind]):
+                    release.append((kind, device_id, old))
+                    rebuild.append((kind, device_id, new))
+                    changes["updated"][kind].append(device_id)
+                elif old != normalized:
+                    updates.append((kind, device_id, normalized))
+                    changes["updated"][kind].append(device_id)
+
+        # Release pins first, so a device can take over a freed pin
+        levels = {}  # outputs to restore on failure
+        for kind, device_id, _ in release:
+            info = getattr(self, kind).pop(device_id)
+            if kind != "sensors":
+                levels[(kind, device_id)] = [(field, info[field].value()) for field in PIN_FIELDS[kind]]
+            self._release(kind, info)
+        built = []
+        try:
+            for kind, device_id, new in rebuild:
+                getattr(self, kind)[device_id] = getattr(self, "_build_" + kind[:-1])(new)
+                built.append((kind, device_id))
+        except Exception as e:
+            print(f"Device rebuild failed, restoring previous devices: {str(e)}")
+            for kind, device_id in built:
+                self._release(kind, getattr(self, kind).pop(device_id))
+            for kind, device_id, old in release:
+                info = getattr(self, "_build_" + kind[:-1])(old)
+                for field, value in levels.get((kind, device_id), ()):
+                    info[field].value(value)
+                getattr(self, kind)[device_id] = info
+            # The restored devices have new pin objects
+            restored = {change: {kind: [] for kind in DEVICE_KINDS} for change in changes}
+            for kind, device_id, _ in release:
+                restored["updated"][kind].append(device_id)
+            for hook in self.reload_hooks:
+                hook(restored)
+            raise
+
+        for kind, device_id, normalized in updates:
+            self._update(kind, getattr(self, kind)[device_id], normalized)
+
+        for hook in self.reload_hooks:
+            hook(changes)
+        return changes
@@ -0,0 +1,197 @@
+import time
+
+# Segment types the table can match without a regular expression
+SEGMENT_PARSERS = {"string": None, "int": int}
+
+def split_pattern(url_pattern):
+    """'/sensors/<sensor_id>/value' -> [('sensors',), ('sensor_id', 'string'), ('value',)]"""
+    segments = []
+    for segment in url_pattern.strip("/").split("/"):
+        if segment.startswith("<") and segment.endswith(">"):
+            name = segment[1:-1]
+            type_ = "string"
+            if ":" in name:
+                type_, name = name.rsplit(":", 1)
+            segments.append((name, type_))
+        elif segment:
+            segments.append((segment,))
+    return segments
+
+def overlaps(first, second):
+    """True if a path could match both patterns"""
+    a = split_pattern(first)
+    b = split_pattern(second)
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        if len(x) == 1 and len(y) == 1 and x != y:
+            return False
+    return True
+
+class RouteNode:
+    def __init__(self):
+        self.static = {}    # segment -> RouteNode
+        self.param = None   # (name, parser, RouteNode)
+        self.methods = {}   # method -> url_map entry
+
+class RouteDispatch:
+    """Match requests with a segment table instead of trying every route.
+
+    Microdot matches a request by trying each route's regular expression in
+    registration order. build() turns the app's url_map into a tree keyed by
+    path segment, so a request costs one dict lookup per segment, and
+    replaces the app's find_route. Static segments win over parameters, as
+    the routes are registered in that order. Patterns with 'path' or 're:'
+    segments keep the regex match after the table.
+
+    With table=False the url_map stays, optionally reordered so that
+    `hot_routes` (patterns, e.g. taken from GET /routes) are tried first.
+
+    Either way, hits and matching time are counted per route.
+    """
+    def __init__(self, app, table=True, hot_routes=None):
+        self.app = app
+        self.table = table
+        self.hot_routes = hot_routes or []
+        self.root = RouteNode()
+        self._fallback = []
+        self._keys = {}
+        self._find_route = app.find_route
+        self.stats = {}  # route key -> [hits, total match us, max match us]
+        self.misses = [0, 0, 0]
+
+    def build(self):
+        """Index the registered routes; call once all routes are added"""
+        url_map = self.app.url_map
+        for entry in url_map:
+            key = f"{','.join(entry[0])} {entry[1].url_pattern}"
+            self._keys[entry[2]] = key
+            self.stats[key] = [0, 0, 0]
+
+        if not self.table:
+            self._reorder(url_map)
+        else:
+            for entry in url_map:
+                if not self._insert(entry):
+                    self._fallback.append(entry)
+        self.app.find_route = self.find_route
+
+    def _insert(self, entry):
+        segments = split_pattern(entry[1].url_pattern)
+        for segment in segments:
+            if len(segment) == 2 and segment[1] not in SEGMENT_PARSERS:
+                return False
+        node = self.root
+        for segment in segments:
+            if len(segment) == 1:
+                node = node.static.setdefault(segment[0], RouteNode())
+                continue
+            name, type_ = segment
+            if node.param is None:
+                node.param = (name, SEGMENT_PARSERS[type_], RouteNode())
+            elif node.param[0] != name or node.param[1] is not SEGMENT_PARSERS[type_]:
+                return False
+            node = node.param[2]
+        for method in entry[0]:
+            node.methods.setdefault(method, entry)
+        return True
+
+    def _reorder(self, url_map):
+        """Move hot routes forward unless they could take over another route's paths"""
+        for pattern in reversed(self.hot_routes):
+            for i in range(len(url_map)):
+                if url_map[i][1].url_pattern == pattern:
+                    break
+            else:
+                print(f"Unknown hot route: {pattern}")
+                continue
+            entry = url_map[i]
+            for j in range(i):
+                if overlaps(pattern, url_map[j][1].url_pattern):
+                    print(f"Hot route {pattern} stays behind {url_map[j][1].url_pattern}")
+                    break
+            else:
+                url_map.pop(i)
+                url_map.insert(0, entry)
+
+    def _lookup(self, node, segments, i, args):
+        """Return the node of segments[i:] below `node`, filling in args"""
+        if i == len(segments):
+            return node if node.methods else None
+        segment = segments[i]
+        if not segment:
+            return None
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._lookup(child, segments, i + 1, args)
+            if found is not None:
+                return found
+        if node.param is None:
+            return None
+        name, parser, child = node.param
+        if parser:
+            try:
+                segment = parser(segment)
+            except ValueError:
+                return None
+        found = self._lookup(child, segments, i + 1, args)
+        if found is not None:
+            # Only set once the rest matched, so backtracking leaves no args
+            args[name] = segment
+        return found
+
+    def _find_in_table(self, req):
+        method = req.method.upper()
+        if method == "OPTIONS" and self.app.options_handler:
+            return self.app.options_handler(req), "", None
+        if method == "HEAD":
+            method = "GET"
+        args = {}
+        segments = req.path[1:].split("/") if req.path != "/" else []
+        node = self._lookup(self.root, segments, 0, args)
+        if node is not None:
+            entry = node.methods.get(method)
+            req.url_args = args
+            if entry is None:
+                return 405, "", None
+            return entry[2], entry[3], entry[4]
+        for entry in self._fallback:
+            req.url_args = entry[1].match(req.path)
+            if req.url_args is not None and method in entry[0]:
+                return entry[2], entry[3], entry[4]
+        return 404, "", None
+
+    def find_route(self, req):
+        start = time.ticks_us()
+        if self.table:
+            route = self._find_in_table(req)
+        else:
+            route = self._find_route(req)
+        elapsed_us = time.ticks_diff(time.ticks_us(), start)
+
+        stats = self.misses
+        if callable(route[0]):
+            stats = self.stats.get(self._keys.get(route[0]), stats)
+        stats[0] += 1
+        stats[1] += elapsed_us
+        if elapsed_us > stats[2]:
+            stats[2] = elapsed_us
+        return route
+
+    def report(self):
+        """Hits and matching time per route, busiest first"""
+        routes = []
+        for key, (hits, total_us, max_us) in self.stats.items():
+            routes.append({
+                "route": key,
+                "hits": hits,
+                "avg_match_us": total_us // hits if hits else 0,
+                "max_match_us": max_us
+            })
+        routes.sort(key=lambda route: -route["hits"])
+        hits, total_us, max_us = self.misses
+        return {
+            "mode": "table" if self.table else "linear",
+            "routes": routes,
+            "unmatched": {"hits": hits, "avg_match_us": total_us // hits if hits else 0, "max_match_us": max_us}
+        }
@@ -0,0 +1,160 @@
+import _thread
+import time
+from array import array
+
+LCD_COLS = 16
+LCD_ROWS = 2
+
+class SharedSampler:
+    """Core 0 side of a sensor sampled on core 1.
+
+    Replaces the sensor's Sampler in the configuration, so read() returns
+    the latest value stored by core 1 instead of touching the ADC.
+    """
+    def __init__(self, worker, index, sampler):
+        self.worker = worker
+        self.index = index
+        self.sampler = sampler
+
+    def read(self):
+        return self.worker.latest(self.index)
+
+    def age_ms(self):
+        return self.worker.age_ms(self.index)
+
+    def settings(self):
+        return self.sampler.settings()
+
+class LcdMailbox:
+    """Core 0 side of the LCD: clear() and write() only update a frame.
+
+    Core 1 draws the frame whenever it changed, so the slow I2C writes
+    never block the event loop.
+    """
+    def __init__(self, lock):
+        self._lock = lock
+        self._frame = [bytearray(b" " * LCD_COLS) for _ in range(LCD_ROWS)]
+        self._dirty = False
+
+    def clear(self):
+        with self._lock:
+            for line in self._frame:
+                for i in range(LCD_COLS):
+                    line[i] = 32
+            self._dirty = True
+
+    def write(self, x, y, text):
+        x = min(max(x, 0), LCD_COLS - 1)
+        y = min(max(y, 0), LCD_ROWS - 1)
+        data = text.encode()
+        with self._lock:
+            line = self._frame[y]
+            for i in range(min(len(data), LCD_COLS - x)):
+                line[x + i] = data[i]
+            self._dirty = True
+
+    def take(self, frame):
+        """Copy a changed frame into `frame`; returns False if unchanged"""
+        with self._lock:
+            if not self._dirty:
+                return False
+            for row in range(LCD_ROWS):
+                frame[row][:] = self._frame[row]
+            self._dirty = False
+        return True
+
+class CoreWorker:
+    """Sensor acquisition and LCD output on the second core.
+
+    Each pass samples every ADC sensor with its Sampler and stores the value
+    and time in preallocated arrays, then draws the LCD frame if it changed.
+    Core 0 only takes the lock to copy a value or a frame.
+    """
+    def __init__(self, config_handler, lcd, interval_ms=50):
+        self.lock = _thread.allocate_lock()
+        self.lcd = lcd
+        self.interval_ms = interval_ms
+        self.display = LcdMailbox(self.lock)
+        self.running = False
+        self.passes = 0
+
+        self.config = config_handler
+        self._frame = [bytearray(LCD_COLS) for _ in range(LCD_ROWS)]
+        self._table = ([], array('H'), array('L'))
+        self.rebind()
+
+    def rebind(self, changes=None):
+        """Take over the samplers of all ADC sensors; also a reload hook"""
+        samplers = []
+        for sensor_info in self.config.sensors.values():
+            sampler = sensor_info.get("sampler")
+            if sampler is None:
+                continue
+            if isinstance(sampler, SharedSampler):
+                sampler = sampler.sampler
+            sensor_info["sampler"] = SharedSampler(self, len(samplers), sampler)
+            samplers.append(sampler)
+
+        # Samplers, values and times are swapped as one table. Samplers
+        # core 1 already uses keep their last value; new ones are read here,
+        # which is safe because core 1 has not seen them yet.
+        count = len(samplers)
+        table = (samplers, array('H', [0] * count), array('L', [0] * count))
+        with self.lock:
+            old_samplers, old_values, old_stamps = self._table
+            for i in range(count):
+                for j in range(len(old_samplers)):
+                    if old_samplers[j] is samplers[i]:
+                        table[1][i] = old_values[j]
+                        table[2][i] = old_stamps[j]
+        for i in range(count):
+            if samplers[i] not in old_samplers:
+                table[1][i] = samplers[i].read()
+                table[2][i] = time.ticks_ms()
+        with self.lock:
+            self._table = table
+
+    def latest(self, index):
+        with self.lock:
+            return self._table[1][index]
+
+    def age_ms(self, index):
+        with self.lock:
+            stamp = self._table[2][index]
+        return time.ticks_diff(time.ticks_ms(), stamp)
+
+    def _sample(self):
+        samplers, values, stamps = self._table
+        for i in range(len(samplers)):
+            value = samplers[i].read()
+            now = time.ticks_ms()
+            with self.lock:
+                values[i] = value
+                stamps[i] = now
+
+    def _draw(self):
+        if self.display.take(self._frame):
+            self.lcd.clear()
+            for row in range(LCD_ROWS):
+                self.lcd.write(0, row, self._frame[row].decode())
+
+    def _run(self):
+        while self.running:
+            start = time.ticks_ms()
+            try:
+                self._sample()
+                self._draw()
+            except Exception as e:
+                print(f"Core 1 error: {str(e)}")
+            self.passes += 1
+            remaining = self.interval_ms - time.ticks_diff(time.ticks_ms(), start)
+            if remaining > 0:
+                time.sleep_ms(remaining)
+
+    def start(self):
+        """Continue sampling on the second core"""
+        self.running = True
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        self.running = False
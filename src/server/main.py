@@ -1,9 +1,29 @@
+import gc
+import json
+import os
+import time
 from server import IoTServer
 
+def record_boot_stats(path='boot_stats.json', flag='boot_stats.flag'):
+    """Record time since reset and heap use once the server is built.
+
+    Only done when the flag file exists (deploy/sync.py --stats leaves it), so
+    normal boots do not write to flash; the flag is removed on the way.
+    """
+    try:
+        os.remove(flag)
+    except OSError:
+        return
+    gc.collect()
+    stats = {"boot_ms": time.ticks_ms(), "mem_free": gc.mem_free(), "mem_alloc": gc.mem_alloc()}
+    with open(path, 'w') as f:
+        json.dump(stats, f)
+
 def main():
     try:
         # Create and run server with default config file
         server = IoTServer('config.json')
+        record_boot_stats()
         server.run()
     except Exception as e:
         print(f"Application error: {str(e)}")
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from utils import apply_calibration, read_sensor
+
+# ADC readings taken between yields to the event loop
+FILL_CHUNK = 16
+
+class SensorReader:
+    """Single-flight sensor reads with a per-sensor cache.
+
+    Routes, rules and telemetry read through one SensorReader. Concurrent
+    reads of a sensor share one acquisition: later callers wait for the
+    one in flight instead of touching the ADC again. A caller passing
+    max_age_ms > 0 accepts a cached reading that is at most that old;
+    with 0 it gets a reading finished after its call.
+
+    Every new reading is passed to the listeners as
+    listener(sensor_id, calibrated_value), once.
+    """
+    def __init__(self, config_handler):
+        self.config = config_handler
+        self.listeners = []
+        self._cache = {}  # sensor id -> (raw, calibrated, ticks_ms)
+        self._inflight = {}  # sensor id -> asyncio.Event
+        self.counts = {"acquisitions": 0, "coalesced": 0, "cache_hits": 0}
+
+    def _cached(self, sensor_id, max_age_ms, now):
+        entry = self._cache.get(sensor_id)
+        if entry and max_age_ms > 0 and time.ticks_diff(now, entry[2]) <= max_age_ms:
+            self.counts["cache_hits"] += 1
+            return entry
+        return None
+
+    def _store(self, sensor_id, raw_value, calibrated_value, stamp):
+        entry = (raw_value, calibrated_value, stamp)
+        self._cache[sensor_id] = entry
+        self.counts["acquisitions"] += 1
+        for listener in self.listeners:
+            # A failing listener must not fail the read that fed it
+            try:
+                listener(sensor_id, calibrated_value)
+            except Exception as e:
+                print(f"Reading listener failed for sensor {sensor_id}: {str(e)}")
+        return entry
+
+    def _read(self, sensor_info):
+        """Read a sensor in one go, as (raw, calibrated, ticks_ms)"""
+        raw_value, calibrated_value = read_sensor(sensor_info)
+        stamp = time.ticks_ms()
+        sampler = sensor_info.get("sampler")
+        if hasattr(sampler, "age_ms"):
+            # Sampled on core 1, possibly a while ago
+            stamp = time.ticks_add(stamp, -sampler.age_ms())
+        return raw_value, calibrated_value, stamp
+
+    async def _acquire(self, sensor_info):
+        """Read a sensor, yielding between chunks of ADC readings"""
+        sampler = sensor_info.get("sampler")
+        if sampler is None or not hasattr(sampler, "fill"):
+            return self._read(sensor_info)
+        for start in range(0, sampler.oversample, FILL_CHUNK):
+            sampler.fill(start, min(start + FILL_CHUNK, sampler.oversample))
+            await asyncio.sleep(0)
+        raw_value = sampler.reduce()
+        return raw_value, apply_calibration(raw_value, sensor_info["config"]), time.ticks_ms()
+
+    async def read(self, sensor_id, max_age_ms=0):
+        """Return (raw_value, calibrated_value, age_ms) of a sensor"""
+        requested = time.ticks_ms()
+        entry = self._cached(sensor_id, max_age_ms, requested)
+
+        while entry is None:
+            event = self._inflight.get(sensor_id)
+            if event is not None:
+                await event.wait()
+                latest = self._cache.get(sensor_id)
+                # The shared acquisition may have failed or begun too early
+                if latest and (max_age_ms > 0 or time.ticks_diff(latest[2], requested) >= 0):
+                    self.counts["coalesced"] += 1
+                    entry = latest
+                continue
+
+            event = asyncio.Event()
+            self._inflight[sensor_id] = event
+            try:
+                entry = self._store(sensor_id, *await self._acquire(self.config.sensors[sensor_id]))
+            finally:
+                del self._inflight[sensor_id]
+                event.set()
+
+        return entry[0], entry[1], time.ticks_diff(time.ticks_ms(), entry[2])
+
+    def read_now(self, sensor_id, max_age_ms=0):
+        """Synchronous read for callers outside a coroutine.
+
+        While an acquisition of the sensor is in flight its sampler is in
+        use, so the latest cached reading is returned instead.
+        """
+        now = time.ticks_ms()
+        entry = self._cached(sensor_id, max_age_ms, now)
+        if entry is None and sensor_id in self._inflight and sensor_id in self._cache:
+            entry = self._cache[sensor_id]
+        if entry is None:
+            entry = self._store(sensor_id, *self._read(self.config.sensors[sensor_id]))
+        return entry[0], entry[1], time.ticks_diff(now, entry[2])
+
+    def invalidate(self, changes=None):
+        """Forget cached readings of changed sensors; also a reload hook"""
+        if changes is None:
+            self._cache = {}
+            return
+        for kind in ("updated", "removed"):
+            for sensor_id in changes[kind]["sensors"]:
+                self._cache.pop(sensor_id, None)
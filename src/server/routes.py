@@ -1,11 +1,19 @@
-from utils import create_response, apply_calibration
+from utils import create_response, apply_calibration, validate_calibration, memory_status
 import json
-import asyncio
+import time
 class Routes:
-    def __init__(self, app, config_handler, lcd):
+    def __init__(self, app, config_handler, actuators, reader, rules=None, scheduler=None,
+                 dispatch=None, admission=None):
         self.app = app
         self.config = config_handler
-        self.lcd = lcd
+        self.actuators = actuators
+        self.rules = rules
+        self.scheduler = scheduler
+        # Shared with rules and telemetry, so reads coalesce
+        self.reader = reader
+        self.dispatch = dispatch
+        self.admission = admission
+        self.started = time.time()
         self.setup_routes()
 
     def setup_routes(self):
@@ -18,6 +26,10 @@ class Routes:
                 "leds": {"href": "/leds"},
                 "motors": {"href": "/motors"},
                 "sensors": {"href": "/sensors"},
+                "rules": {"href": "/rules"},
+                "schedules": {"href": "/schedules"},
+                "config": {"href": "/config"},
+                "routes": {"href": "/routes"},
                 "status": {"href": "/status"}
             }
             return create_response({"message": "Welcome to IoT API"}, links)
@@ -113,13 +125,12 @@ class Routes:
                     {"all_leds": {"href": "/leds"}}
                 )
 
-            led = self.config.leds[led_id]["pin"]
-            led.on()
+            state = self.actuators.led(led_id, "on")
 
             return create_response(
                 {
                     "id": led_id,
-                    "state": led.value(),
+                    "state": state,
                     "color": self.config.leds[led_id]["color"],
                     "location": self.config.leds[led_id]["location"]
                 },
@@ -140,13 +151,12 @@ class Routes:
                     {"all_leds": {"href": "/leds"}}
                 )
 
-            led = self.config.leds[led_id]["pin"]
-            led.off()
+            state = self.actuators.led(led_id, "off")
 
             return create_response(
                 {
                     "id": led_id,
-                    "state": led.value(),
+                    "state": state,
                     "color": self.config.leds[led_id]["color"],
                     "location": self.config.leds[led_id]["location"]
                 },
@@ -166,13 +176,12 @@ class Routes:
                     {"all_leds": {"href": "/leds"}}
                 )
 
-            led = self.config.leds[led_id]["pin"]
-            led.toggle()
+            state = self.actuators.led(led_id, "toggle")
 
             return create_response(
                 {
                     "id": led_id,
-                    "state": led.value(),
+                    "state": state,
                     "color": self.config.leds[led_id]["color"],
                     "location": self.config.leds[led_id]["location"]
                 },
@@ -198,6 +207,8 @@ class Routes:
                         "config": {"href": f"/sensors/{sensor_id}/config"}
                     }
                 }
+                if "capture" in sensor_info:
+                    sensor_data[sensor_id]["_links"]["events"] = {"href": f"/sensors/{sensor_id}/events"}
 
             links = {
                 "self": {"href": "/sensors"},
@@ -247,25 +258,65 @@ class Routes:
                 )
 
             sensor_info = self.config.sensors[sensor_id]
-            raw_value = sensor_info["pin"].read_u16()
-            calibrated_value = apply_calibration(raw_value, sensor_info["config"])
+            links = {
+                "self": {"href": f"/sensors/{sensor_id}/value"},
+                "sensor": {"href": f"/sensors/{sensor_id}"},
+                "config": {"href": f"/sensors/{sensor_id}/config"},
+                "all_sensors": {"href": "/sensors"}
+            }
 
-            return create_response(
-                {
-                    "id": sensor_id,
-                    "raw_value": raw_value,
-                    "calibrated_value": calibrated_value,
-                    "type": sensor_info["type"],
-                    "location": sensor_info["location"],
-                    "unit": sensor_info["unit"]
-                },
-                {
-                    "self": {"href": f"/sensors/{sensor_id}/value"},
-                    "sensor": {"href": f"/sensors/{sensor_id}"},
-                    "config": {"href": f"/sensors/{sensor_id}/config"},
-                    "all_sensors": {"href": "/sensors"}
-                }
-            )
+            # Clients may accept a recent reading instead of a new one
+            try:
+                max_age_ms = int(request.args.get('max_age_ms', 0))
+            except ValueError:
+                return create_response({"error": "max_age_ms must be an integer"}, links)
+            raw_value, calibrated_value, age_ms = await self.reader.read(sensor_id, max_age_ms)
+
+            data = {
+                "id": sensor_id,
+                "raw_value": raw_value,
+                "calibrated_value": calibrated_value,
+                "age_ms": age_ms,
+                "type": sensor_info["type"],
+                "location": sensor_info["location"],
+                "unit": sensor_info["unit"]
+            }
+            if "capture" in sensor_info:
+                data.update(sensor_info["capture"].summary())
+                links["events"] = {"href": f"/sensors/{sensor_id}/events"}
+
+            return create_response(data, links)
+
+        @self.app.route('/sensors/<sensor_id>/events')
+        async def sensor_events(request, sensor_id):
+            """Get edges captured by IRQ for a digital sensor"""
+            if sensor_id not in self.config.sensors:
+                return create_response(
+                    {"error": f"Invalid sensor: {sensor_id}"},
+                    {"all_sensors": {"href": "/sensors"}}
+                )
+
+            sensor_info = self.config.sensors[sensor_id]
+            if "capture" not in sensor_info:
+                return create_response(
+                    {"error": f"Sensor {sensor_id} is not a digital sensor"},
+                    {
+                        "sensor_value": {"href": f"/sensors/{sensor_id}/value"},
+                        "all_sensors": {"href": "/sensors"}
+                    }
+                )
+
+            capture = sensor_info["capture"]
+            data = capture.summary()
+            data["id"] = sensor_id
+            data["state"] = sensor_info["pin"].value()
+            data["events"] = [{"ticks_ms": t, "value": v} for t, v in capture.events()]
+
+            return create_response(data, {
+                "self": {"href": f"/sensors/{sensor_id}/events"},
+                "sensor_value": {"href": f"/sensors/{sensor_id}/value"},
+                "all_sensors": {"href": "/sensors"}
+            })
 
         @self.app.route('/sensors/<sensor_id>/config', methods=['GET'])
         async def sensor_config_get(request, sensor_id):
@@ -282,6 +333,7 @@ class Routes:
                 "type": sensor_info["type"],
                 "unit": sensor_info["unit"],
                 "config": sensor_info["config"],
+                "acquisition": sensor_info["sampler"].settings() if "sampler" in sensor_info else None,
                 "example_conversion": {
                     "raw": 32768,
                     "converted": apply_calibration(32768, sensor_info["config"])
@@ -323,15 +375,7 @@ class Routes:
                 new_config = json.loads(request.body)
 
                 # Validate configuration
-                if new_config["type"] not in ["linear", "polynomial"]:
-                    raise ValueError("Invalid configuration type")
-
-                if new_config["type"] == "linear":
-                    if "m" not in new_config["params"] or "b" not in new_config["params"]:
-                        raise ValueError("Linear calibration requires 'm' and 'b' parameters")
-                elif new_config["type"] == "polynomial":
-                    if "coefficients" not in new_config["params"]:
-                        raise ValueError("Polynomial calibration requires 'coefficients' parameter")
+                validate_calibration(new_config)
 
                 # Update configuration
                 self.config.sensors[sensor_id]["config"] = new_config
@@ -446,23 +490,12 @@ class Routes:
                     {"all_motors": {"href": "/motors"}}
                 )
 
-            motor_on = self.config.motors[motor_id]["pin_on"]
-            motor_dir = self.config.motors[motor_id]["pin_dir"]
-            if direction == "cw":
-                motor_dir.value(0)
-                motor_on.value(1)
-            else:
-                motor_dir.value(1)
-                motor_on.value(0)
-
-            if seconds_int > 0:
-                await asyncio.sleep(seconds_int)
-                await motor_off(request, motor_id)
+            state = self.actuators.motor_on(motor_id, direction, seconds_int)
 
             return create_response(
                 {
                     "id": motor_id,
-                    "state": motor_on.value(),
+                    "state": state,
                     "type": self.config.motors[motor_id]["type"],
                     "location": self.config.motors[motor_id]["location"]
                 },
@@ -482,15 +515,12 @@ class Routes:
                     {"all_motors": {"href": "/motors"}}
                 )
 
-            motor_on = self.config.motors[motor_id]["pin_on"]
-            motor_dir = self.config.motors[motor_id]["pin_dir"]
-            motor_on.value(0)
-            motor_dir.value(0)
+            state = self.actuators.motor_off(motor_id)
 
             return create_response(
                 {
                     "id": motor_id,
-                    "state": motor_on.value(),
+                    "state": state,
                     "type": self.config.motors[motor_id]["type"],
                     "location": self.config.motors[motor_id]["location"]
                 },
@@ -552,16 +582,7 @@ class Routes:
                         }
                     )
 
-                if len(text) > 32:
-                    text = text[:32]  # truncate to maximum length
-
-                if len(text) > 16:
-                    self.lcd.clear()
-                    self.lcd.write(0, 0, text[:16])  # first line
-                    self.lcd.write(0, 1, text[16:])  # second line
-                else:
-                    self.lcd.clear()
-                    self.lcd.write(0, 0, text)
+                text = self.actuators.lcd_display(text)
 
                 return create_response(
                     {
@@ -592,3 +613,331 @@ class Routes:
                         "info": {"href": "/lcd", "method": "GET"}
                     }
                 )
+
+        @self.app.route('/rules')
+        async def rules_list(request):
+            """Get all automation rules"""
+            rule_data = {}
+            for rule_id, rule in self.config.rules.items():
+                rule_data[rule_id] = dict(rule)
+                rule_data[rule_id]["active"] = self.rules.state(rule_id)
+                rule_data[rule_id]["_links"] = {"self": {"href": f"/rules/{rule_id}"}}
+
+            links = {
+                "self": {"href": "/rules"},
+                "create": {
+                    "href": "/rules",
+                    "method": "POST",
+                    "template": {
+                        "id": "string (optional)",
+                        "sensor": "sensor id",
+                        "condition": {
+                            "type": "threshold | hysteresis | rate",
+                            "op": "> | >= | < | <=",
+                            "value": "number (threshold, rate per second)",
+                            "high": "number (hysteresis)",
+                            "low": "number (hysteresis)"
+                        },
+                        "action": {"type": "led | motor | lcd", "id": "device id",
+                                   "command": "on | off | toggle", "text": "string (lcd)"},
+                        "else_action": "action (optional)"
+                    }
+                }
+            }
+
+            return create_response(rule_data, links)
+
+        @self.app.route('/rules', methods=['POST'])
+        async def rule_create(request):
+            """Create an automation rule"""
+            try:
+                rule = json.loads(request.body)
+                rule_id = str(rule.pop("id", ""))
+                if not rule_id:
+                    rule_id = str(len(self.config.rules) + 1)
+                    while rule_id in self.config.rules:
+                        rule_id = str(int(rule_id) + 1)
+                if rule_id in self.config.rules:
+                    raise ValueError(f"Rule already exists: {rule_id}")
+
+                self.rules.validate_rule(rule)
+                self.config.rules[rule_id] = rule
+                self.rules.compile()
+                self.config.save_config()
+
+                return create_response(
+                    {"id": rule_id, "message": "Rule created successfully"},
+                    {"self": {"href": f"/rules/{rule_id}"}, "all_rules": {"href": "/rules"}}
+                )
+            except Exception as e:
+                return create_response(
+                    {"error": str(e)},
+                    {"all_rules": {"href": "/rules"}}
+                )
+
+        @self.app.route('/rules/<rule_id>', methods=['GET'])
+        async def rule_get(request, rule_id):
+            """Get an automation rule"""
+            if rule_id not in self.config.rules:
+                return create_response(
+                    {"error": f"Invalid rule: {rule_id}"},
+                    {"all_rules": {"href": "/rules"}}
+                )
+
+            rule_data = dict(self.config.rules[rule_id])
+            rule_data["id"] = rule_id
+            rule_data["active"] = self.rules.state(rule_id)
+
+            return create_response(rule_data, {
+                "self": {"href": f"/rules/{rule_id}"},
+                "sensor": {"href": f"/sensors/{rule_data['sensor']}/value"},
+                "update": {"href": f"/rules/{rule_id}", "method": "PUT"},
+                "delete": {"href": f"/rules/{rule_id}", "method": "DELETE"},
+                "all_rules": {"href": "/rules"}
+            })
+
+        @self.app.route('/rules/<rule_id>', methods=['PUT'])
+        async def rule_update(request, rule_id):
+            """Replace an automation rule"""
+            if rule_id not in self.config.rules:
+                return create_response(
+                    {"error": f"Invalid rule: {rule_id}"},
+                    {"all_rules": {"href": "/rules"}}
+                )
+
+            try:
+                rule = json.loads(request.body)
+                rule.pop("id", None)
+                self.rules.validate_rule(rule)
+                self.config.rules[rule_id] = rule
+                self.rules.compile()
+                self.config.save_config()
+
+                return create_response(
+                    {"id": rule_id, "message": "Rule updated successfully"},
+                    {"self": {"href": f"/rules/{rule_id}"}, "all_rules": {"href": "/rules"}}
+                )
+            except Exception as e:
+                return create_response(
+                    {"error": str(e)},
+                    {"self": {"href": f"/rules/{rule_id}"}}
+                )
+
+        @self.app.route('/rules/<rule_id>', methods=['DELETE'])
+        async def rule_delete(request, rule_id):
+            """Delete an automation rule"""
+            if rule_id not in self.config.rules:
+                return create_response(
+                    {"error": f"Invalid rule: {rule_id}"},
+                    {"all_rules": {"href": "/rules"}}
+                )
+
+            del self.config.rules[rule_id]
+            self.rules.compile()
+            self.config.save_config()
+
+            return create_response(
+                {"id": rule_id, "message": "Rule deleted successfully"},
+                {"all_rules": {"href": "/rules"}}
+            )
+
+        @self.app.route('/schedules')
+        async def schedules_list(request):
+            """Get all scheduled actions"""
+            schedule_data = {}
+            for schedule_id, schedule in self.config.schedules.items():
+                schedule_data[schedule_id] = dict(schedule)
+                schedule_data[schedule_id].update(self.scheduler.status(schedule_id))
+                schedule_data[schedule_id]["_links"] = {"self": {"href": f"/schedules/{schedule_id}"}}
+
+            links = {
+                "self": {"href": "/schedules"},
+                "create": {
+                    "href": "/schedules",
+                    "method": "POST",
+                    "template": {
+                        "id": "string (optional)",
+                        "action": {"type": "led | motor | lcd", "id": "device id",
+                                   "command": "on | off | toggle", "seconds": "integer (motor)",
+                                   "text": "string (lcd)"},
+                        "every_s": "integer (repeat interval)",
+                        "start_in_s": "integer (first run delay)",
+                        "at": "HH:MM (daily, needs wall clock)"
+                    }
+                }
+            }
+
+            return create_response(schedule_data, links)
+
+        @self.app.route('/schedules', methods=['POST'])
+        async def schedule_create(request):
+            """Create a scheduled action"""
+            try:
+                schedule = json.loads(request.body)
+                schedule_id = str(schedule.pop("id", ""))
+                if not schedule_id:
+                    schedule_id = str(len(self.config.schedules) + 1)
+                    while schedule_id in self.config.schedules:
+                        schedule_id = str(int(schedule_id) + 1)
+                if schedule_id in self.config.schedules:
+                    raise ValueError(f"Schedule already exists: {schedule_id}")
+
+                self.scheduler.validate_schedule(schedule)
+                self.config.schedules[schedule_id] = schedule
+                self.scheduler.arm(schedule_id)
+                self.config.save_config()
+
+                return create_response(
+                    {"id": schedule_id, "message": "Schedule created successfully"},
+                    {"self": {"href": f"/schedules/{schedule_id}"}, "all_schedules": {"href": "/schedules"}}
+                )
+            except Exception as e:
+                return create_response(
+                    {"error": str(e)},
+                    {"all_schedules": {"href": "/schedules"}}
+                )
+
+        @self.app.route('/schedules/<schedule_id>', methods=['GET'])
+        async def schedule_get(request, schedule_id):
+            """Get a scheduled action"""
+            if schedule_id not in self.config.schedules:
+                return create_response(
+                    {"error": f"Invalid schedule: {schedule_id}"},
+                    {"all_schedules": {"href": "/schedules"}}
+                )
+
+            schedule_data = dict(self.config.schedules[schedule_id])
+            schedule_data["id"] = schedule_id
+            schedule_data.update(self.scheduler.status(schedule_id))
+
+            return create_response(schedule_data, {
+                "self": {"href": f"/schedules/{schedule_id}"},
+                "update": {"href": f"/schedules/{schedule_id}", "method": "PUT"},
+                "delete": {"href": f"/schedules/{schedule_id}", "method": "DELETE"},
+                "all_schedules": {"href": "/schedules"}
+            })
+
+        @self.app.route('/schedules/<schedule_id>', methods=['PUT'])
+        async def schedule_update(request, schedule_id):
+            """Replace a scheduled action"""
+            if schedule_id not in self.config.schedules:
+                return create_response(
+                    {"error": f"Invalid schedule: {schedule_id}"},
+                    {"all_schedules": {"href": "/schedules"}}
+                )
+
+            try:
+                schedule = json.loads(request.body)
+                schedule.pop("id", None)
+                self.scheduler.validate_schedule(schedule)
+                self.config.schedules[schedule_id] = schedule
+                self.scheduler.arm(schedule_id)
+                self.config.save_config()
+
+                return create_response(
+                    {"id": schedule_id, "message": "Schedule updated successfully"},
+                    {"self": {"href": f"/schedules/{schedule_id}"}, "all_schedules": {"href": "/schedules"}}
+                )
+            except Exception as e:
+                return create_response(
+                    {"error": str(e)},
+                    {"self": {"href": f"/schedules/{schedule_id}"}}
+                )
+
+        @self.app.route('/schedules/<schedule_id>', methods=['DELETE'])
+        async def schedule_delete(request, schedule_id):
+            """Delete a scheduled action"""
+            if schedule_id not in self.config.schedules:
+                return create_response(
+                    {"error": f"Invalid schedule: {schedule_id}"},
+                    {"all_schedules": {"href": "/schedules"}}
+                )
+
+            del self.config.schedules[schedule_id]
+            self.scheduler.disarm(schedule_id)
+            self.config.save_config()
+
+            return create_response(
+                {"id": schedule_id, "message": "Schedule deleted successfully"},
+                {"all_schedules": {"href": "/schedules"}}
+            )
+
+        @self.app.route('/config', methods=['GET'])
+        async def config_get(request):
+            """Get the LED, motor and sensor configuration"""
+            config_data = {kind: self.config.device_configs(kind) for kind in ("leds", "motors", "sensors")}
+            return create_response(config_data, {
+                "self": {"href": "/config"},
+                "update": {
+                    "href": "/config",
+                    "method": "PUT",
+                    "template": {"leds": "object", "motors": "object", "sensors": "object"}
+                }
+            })
+
+        @self.app.route('/config', methods=['PUT'])
+        async def config_update(request):
+            """Reconfigure LEDs, motors and sensors without a restart.
+
+            Takes the same sections as config.json; missing sections are
+            left unchanged. Only changed devices are touched.
+            """
+            try:
+                new_config = json.loads(request.body)
+                if not isinstance(new_config, dict):
+                    raise ValueError("Configuration must be an object")
+                for kind in ("leds", "motors", "sensors"):
+                    if kind not in new_config:
+                        new_config[kind] = self.config.device_configs(kind)
+
+                start = time.ticks_ms()
+                changes = self.config.apply_devices(new_config)
+                elapsed_ms = time.ticks_diff(time.ticks_ms(), start)
+                self.config.save_config()
+
+                return create_response(
+                    {"message": "Configuration applied", "changes": changes, "elapsed_ms": elapsed_ms},
+                    {"self": {"href": "/config"}, "leds": {"href": "/leds"},
+                     "motors": {"href": "/motors"}, "sensors": {"href": "/sensors"}}
+                )
+            except ValueError as e:
+                # Rejected configuration, such as two devices on one GPIO
+                return create_response(
+                    {"error": str(e)},
+                    {"self": {"href": "/config"}},
+                    status_code=400
+                )
+            except Exception as e:
+                return create_response(
+                    {"error": str(e)},
+                    {"self": {"href": "/config"}}
+                )
+
+        @self.app.route('/routes')
+        async def routes_stats(request):
+            """Get request counts and route matching time per route"""
+            links = {"self": {"href": "/routes"}, "root": {"href": "/"}}
+            if self.dispatch is None:
+                return create_response({"error": "Route statistics are not enabled"}, links)
+            return create_response(self.dispatch.report(), links)
+
+        @self.app.route('/status')
+        async def status(request):
+            """Get uptime, heap use and request counters.
+
+            With ?probe=1 the largest free heap block up to probe_limit
+            bytes is measured too, by test allocations; the heap is
+            fragmented when it is much smaller than that limit. The probe
+            is meant for soak tests, not for polling in production.
+            """
+            data = {"uptime_s": time.time() - self.started}
+            data.update(memory_status(probe=request.args.get('probe') == '1'))
+            data["readings"] = self.reader.counts
+            if self.admission:
+                data["admission"] = self.admission.counts
+            return create_response(data, {
+                "self": {"href": "/status"},
+                "probe": {"href": "/status?probe=1"},
+                "routes": {"href": "/routes"},
+                "root": {"href": "/"}
+            })
@@ -0,0 +1,193 @@
+import asyncio
+import time
+from utils import apply_calibration
+
+CONDITION_TYPES = ("threshold", "hysteresis", "rate")
+OPERATORS = (">", ">=", "<", "<=")
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _compare(op, value, limit):
+    if op == ">":
+        return value > limit
+    if op == ">=":
+        return value >= limit
+    if op == "<":
+        return value < limit
+    return value <= limit
+
+class _CompiledRule:
+    """A rule bound to its sensor, with the state needed between samples"""
+    def __init__(self, rule_id, rule):
+        condition = rule["condition"]
+        self.id = rule_id
+        self.rule = rule
+        self.kind = condition["type"]
+        self.op = condition.get("op", ">")
+        self.value = condition.get("value")
+        self.high = condition.get("high")
+        self.low = condition.get("low")
+        self.action = rule["action"]
+        self.else_action = rule.get("else_action")
+        self.active = False
+        self.last_value = None
+        self.last_ms = 0
+
+    def check(self, value, now_ms):
+        """Return whether the condition holds for this sample"""
+        if self.kind == "threshold":
+            return _compare(self.op, value, self.value)
+
+        if self.kind == "hysteresis":
+            # Rising rules switch on above 'high' and off below 'low';
+            # falling rules ('<' operators) do the opposite.
+            rising = self.op in (">", ">=")
+            if self.active:
+                return value > self.low if rising else value < self.high
+            return value >= self.high if rising else value <= self.low
+
+        # rate of change in units per second
+        last_value, last_ms = self.last_value, self.last_ms
+        self.last_value, self.last_ms = value, now_ms
+        elapsed = time.ticks_diff(now_ms, last_ms)
+        if last_value is None or elapsed <= 0:
+            return self.active
+        return _compare(self.op, (value - last_value) * 1000 / elapsed, self.value)
+
+class RulesEngine:
+    """Evaluate sensor rules on the device and trigger actuator actions.
+
+    Rules are compiled into a dispatch list per sensor, so a new sample only
+    visits the rules watching that sensor. Actions fire on transitions: the
+    'action' when a condition becomes true, the optional 'else_action' when it
+    becomes false again.
+
+    Digital sensors also feed every captured edge to their rules (see
+    watch_edges), so pulses shorter than the polling interval still count.
+    """
+    def __init__(self, config_handler, actuators, reader):
+        self.config = config_handler
+        self.actuators = actuators
+        self._dispatch = {}
+        # sensor id -> (EdgeCapture, edges already evaluated)
+        self._edges_seen = {}
+        self.compile()
+        # Every new reading, whoever asked for it, is evaluated once, so the
+        # reader must be the one shared with routes and telemetry
+        self.reader = reader
+        self.reader.listeners.append(self.evaluate)
+
+    def compile(self):
+        """Rebuild the per-sensor dispatch lists from the configured rules.
+
+        Unchanged rules keep their compiled state, so their conditions do
+        not fire again; only added and edited rules start over.
+        """
+        existing = {}
+        for compiled_rules in self._dispatch.values():
+            for compiled in compiled_rules:
+                existing[compiled.id] = compiled
+
+        dispatch = {}
+        for rule_id, rule in self.config.rules.items():
+            if rule.get("enabled", True):
+                compiled = existing.get(rule_id)
+                if compiled is None or compiled.rule != rule:
+                    compiled = _CompiledRule(rule_id, rule)
+                dispatch.setdefault(rule["sensor"], []).append(compiled)
+        self._dispatch = dispatch
+
+    def state(self, rule_id):
+        """Return whether a rule's condition currently holds"""
+        for compiled_rules in self._dispatch.values():
+            for compiled in compiled_rules:
+                if compiled.id == rule_id:
+                    return compiled.active
+        return False
+
+    def evaluate(self, sensor_id, value, now_ms=None):
+        """Feed a calibrated sample to the rules watching this sensor"""
+        compiled_rules = self._dispatch.get(sensor_id)
+        if not compiled_rules:
+            return
+        if now_ms is None:
+            now_ms = time.ticks_ms()
+
+        for compiled in compiled_rules:
+            try:
+                active = compiled.check(value, now_ms)
+                if active == compiled.active:
+                    continue
+                compiled.active = active
+                action = compiled.action if active else compiled.else_action
+                if action:
+                    self.actuators.run(action, value)
+            except Exception as e:
+                print(f"Rule {compiled.id} failed: {str(e)}")
+
+    async def run(self, interval_ms=500):
+        """Make sure every sensor that has rules is read at least every interval"""
+        while True:
+            for sensor_id in list(self._dispatch):
+                if sensor_id not in self.config.sensors:
+                    continue
+                try:
+                    # A reading taken for a client within the interval counts
+                    await self.reader.read(sensor_id, max_age_ms=interval_ms)
+                except Exception as e:
+                    print(f"Rule sampling of sensor {sensor_id} failed: {str(e)}")
+            await asyncio.sleep(interval_ms / 1000)
+
+    def drain_edges(self):
+        """Evaluate the edges captured on digital sensors since the last call"""
+        for sensor_id in self._dispatch:
+            sensor = self.config.sensors.get(sensor_id)
+            capture = sensor and sensor.get("capture")
+            if not capture:
+                continue
+            seen = self._edges_seen.get(sensor_id)
+            if seen is None or seen[0] is not capture:
+                # New or rebuilt sensor: start from its current edges
+                seen = (capture, capture.summary()["edges"])
+            head, edges = capture.events_since(seen[1])
+            self._edges_seen[sensor_id] = (capture, head)
+            for ticks, level in edges:
+                self.evaluate(sensor_id, apply_calibration(level, sensor["config"]), ticks)
+
+    async def watch_edges(self, interval_ms=20):
+        """Drain captured edges into the rules every interval"""
+        while True:
+            try:
+                self.drain_edges()
+            except Exception as e:
+                print(f"Rule edge evaluation failed: {str(e)}")
+            await asyncio.sleep(interval_ms / 1000)
+
+    def validate_rule(self, rule):
+        """Raise ValueError unless the rule is well formed"""
+        if rule.get("sensor") not in self.config.sensors:
+            raise ValueError(f"Invalid sensor: {rule.get('sensor')}")
+
+        condition = rule.get("condition")
+        if not isinstance(condition, dict) or condition.get("type") not in CONDITION_TYPES:
+            raise ValueError(f"Condition type must be one of {', '.join(CONDITION_TYPES)}")
+        if condition.get("op", ">") not in OPERATORS:
+            raise ValueError(f"Invalid operator: {condition['op']}")
+        if condition["type"] == "hysteresis":
+            if "high" not in condition or "low" not in condition:
+                raise ValueError("Hysteresis condition requires 'high' and 'low'")
+            if not _is_number(condition["high"]) or not _is_number(condition["low"]):
+                raise ValueError("Hysteresis 'high' and 'low' must be numbers")
+            if condition["low"] > condition["high"]:
+                raise ValueError("Hysteresis 'low' must not exceed 'high'")
+        elif "value" not in condition:
+            raise ValueError(f"{condition['type']} condition requires 'value'")
+        elif not _is_number(condition["value"]):
+            raise ValueError(f"{condition['type']} condition 'value' must be a number")
+
+        if "action" not in rule:
+            raise ValueError("Rule requires an 'action'")
+        self.actuators.validate_action(rule["action"])
+        if "else_action" in rule:
+            self.actuators.validate_action(rule["else_action"])
@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import time
+
+MAX_SLEEP_MS = 60000  # wake up at least this often to keep the clock wrap-safe
+DAY_S = 86400
+SYNC_RETRY_MS = 300000  # between wall clock sync attempts while 'at' schedules wait
+
+class Scheduler:
+    """Run actuator actions at fixed offsets, intervals or times of day.
+
+    All pending runs sit in one heap of (due_ms, seq, schedule_id, generation)
+    entries served by a single asyncio task. Due times use a monotonic
+    millisecond clock, so intervals need no network time; 'at' schedules
+    additionally need a synchronized wall clock. Updating or deleting a
+    schedule bumps its generation, which turns stale heap entries into no-ops;
+    the heap is rebuilt once they outnumber the live ones.
+
+    With a `sync_time` function, run() retries a failed wall clock sync
+    while 'at' schedules wait for it, and arms them once it succeeds.
+    """
+    def __init__(self, config_handler, actuators, utc_offset_min=0, sync_time=None):
+        self.config = config_handler
+        self.actuators = actuators
+        self.utc_offset_min = utc_offset_min
+        self.sync_time = sync_time
+        self._next_sync_ms = 0
+        self._heap = []
+        self._seq = 0
+        self._generations = {}
+        self._next_run = {}
+        self._last_run = {}
+        self._wake = asyncio.Event()
+        self._last_ticks = time.ticks_ms()
+        self._elapsed_ms = 0
+        for schedule_id in self.config.schedules:
+            self.arm(schedule_id)
+
+    def now_ms(self):
+        """Milliseconds since start; unlike ticks_ms() it never wraps"""
+        ticks = time.ticks_ms()
+        self._elapsed_ms += time.ticks_diff(ticks, self._last_ticks)
+        self._last_ticks = ticks
+        return self._elapsed_ms
+
+    def wall_clock_synced(self):
+        """The RTC starts in 2021 on the Pico; anything later has been set"""
+        return time.localtime()[0] >= 2024
+
+    def _seconds_until(self, at):
+        """Seconds from now until the next 'HH:MM' in local time"""
+        hours, minutes = at.split(":")
+        target = int(hours) * 3600 + int(minutes) * 60
+        t = time.localtime(time.time() + self.utc_offset_min * 60)
+        now = t[3] * 3600 + t[4] * 60 + t[5]
+        return (target - now) % DAY_S or DAY_S
+
+    def arm(self, schedule_id, first=True):
+        """(Re)compute the next run of a schedule and queue it"""
+        generation = self._generations.get(schedule_id, 0) + 1
+        self._generations[schedule_id] = generation
+        self._next_run.pop(schedule_id, None)
+
+        schedule = self.config.schedules.get(schedule_id)
+        if schedule is None or not schedule.get("enabled", True):
+            return
+
+        now = self.now_ms()
+        if "at" in schedule:
+            if not self.wall_clock_synced():
+                print(f"Schedule {schedule_id} waits for wall clock sync")
+                return
+            due = now + self._seconds_until(schedule["at"]) * 1000
+        elif first:
+            due = now + schedule.get("start_in_s", schedule.get("every_s", 0)) * 1000
+        elif "every_s" in schedule:
+            due = now + schedule["every_s"] * 1000
+        else:
+            return
+
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, schedule_id, generation))
+        self._next_run[schedule_id] = due
+        self._compact()
+        self._wake.set()
+
+    def _compact(self):
+        """Drop superseded heap entries once they outnumber the live ones"""
+        if len(self._heap) <= 2 * len(self._next_run):
+            return
+        self._heap = [entry for entry in self._heap
+                      if self._generations.get(entry[2]) == entry[3]]
+        heapq.heapify(self._heap)
+
+    def rearm_all(self):
+        """Queue every schedule again, e.g. after the wall clock was set"""
+        self._heap = []
+        for schedule_id in self.config.schedules:
+            self.arm(schedule_id)
+
+    def disarm(self, schedule_id):
+        """Forget pending runs of a schedule"""
+        self._generations[schedule_id] = self._generations.get(schedule_id, 0) + 1
+        self._next_run.pop(schedule_id, None)
+        self._last_run.pop(schedule_id, None)
+        self._compact()
+
+    def status(self, schedule_id):
+        """Seconds until the next run and since the last run, if any"""
+        now = self.now_ms()
+        next_run = self._next_run.get(schedule_id)
+        last_run = self._last_run.get(schedule_id)
+        return {
+            "next_run_in_s": (next_run - now) // 1000 if next_run is not None else None,
+            "last_run_s_ago": (now - last_run) // 1000 if last_run is not None else None
+        }
+
+    def _fire(self, schedule_id, now):
+        schedule = self.config.schedules[schedule_id]
+        self._next_run.pop(schedule_id, None)
+        self._last_run[schedule_id] = now
+        try:
+            self.actuators.run(schedule["action"])
+        except Exception as e:
+            print(f"Schedule {schedule_id} action failed: {str(e)}")
+
+        if "at" in schedule or "every_s" in schedule:
+            self.arm(schedule_id, first=False)
+        else:
+            # One-shot schedules are done after their single run
+            del self.config.schedules[schedule_id]
+            try:
+                self.config.save_config()
+            except Exception as e:
+                print(f"Saving after schedule {schedule_id} failed: {str(e)}")
+
+    def _waiting_for_clock(self):
+        if self.sync_time is None or self.wall_clock_synced():
+            return False
+        for schedule in self.config.schedules.values():
+            if "at" in schedule and schedule.get("enabled", True):
+                return True
+        return False
+
+    def _retry_sync(self, now):
+        """Try to set the wall clock again; arm everything once it is set"""
+        if now < self._next_sync_ms or not self._waiting_for_clock():
+            return
+        self._next_sync_ms = now + SYNC_RETRY_MS
+        try:
+            synced = self.sync_time()
+        except Exception as e:
+            print(f"Wall clock sync failed: {str(e)}")
+            synced = False
+        if synced:
+            self.rearm_all()
+
+    async def run(self):
+        """Dispatch due schedules forever"""
+        while True:
+            now = self.now_ms()
+            self._retry_sync(now)
+            while self._heap and self._heap[0][0] <= now:
+                _, _, schedule_id, generation = heapq.heappop(self._heap)
+                if self._generations.get(schedule_id) == generation:
+                    self._fire(schedule_id, now)
+
+            delay = MAX_SLEEP_MS
+            if self._heap:
+                delay = min(delay, self._heap[0][0] - now)
+            if self._waiting_for_clock():
+                delay = min(delay, self._next_sync_ms - now)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay / 1000)
+            except asyncio.TimeoutError:
+                pass
+
+    def validate_schedule(self, schedule):
+        """Raise ValueError unless the schedule is well formed"""
+        if "action" not in schedule:
+            raise ValueError("Schedule requires an 'action'")
+        self.actuators.validate_action(schedule["action"])
+
+        if "at" in schedule:
+            if "every_s" in schedule:
+                raise ValueError("Use either 'at' or 'every_s', not both")
+            parts = str(schedule["at"]).split(":")
+            if (len(parts) != 2 or not parts[0].isdigit() or not parts[1].isdigit()
+                    or int(parts[0]) > 23 or int(parts[1]) > 59):
+                raise ValueError("'at' must be a time of day as 'HH:MM'")
+        for field in ("every_s", "start_in_s"):
+            if field in schedule and (not isinstance(schedule[field], int) or schedule[field] < 0):
+                raise ValueError(f"'{field}' must be a non-negative integer")
+        if schedule.get("every_s") == 0:
+            raise ValueError("'every_s' must be positive")
@@ -1,7 +1,16 @@
+import asyncio
 from microdot import Microdot
 from config_handler import ConfigHandler
 from routes import Routes
-from utils import connect_wifi
+from actuators import Actuators
+from rules import RulesEngine
+from readings import SensorReader
+from scheduler import Scheduler
+from telemetry import MqttTelemetry
+from dualcore import CoreWorker
+from admission import AdmissionControl
+from dispatch import RouteDispatch
+from utils import connect_wifi, sync_time
 from lcd1602 import LCD
 
 class IoTServer:
@@ -16,8 +25,66 @@ class IoTServer:
         # Initialize LCD
         self.lcd = LCD()
 
-        # Setup routes
-        self.routes = Routes(self.app, self.config_handler, self.lcd)
+        # Optionally move sampling and LCD writes to the second core;
+        # everything else then uses its shared buffers
+        self.core1 = None
+        display = self.lcd
+        if self.config_handler.server_config.get('dual_core', False):
+            self.core1 = CoreWorker(self.config_handler, self.lcd,
+                                    self.config_handler.server_config.get('core1_interval_ms', 50))
+            display = self.core1.display
+
+        # Initialize automation
+        self.actuators = Actuators(self.config_handler, display)
+        # Shared by routes, rules and telemetry
+        self.reader = SensorReader(self.config_handler)
+        self.rules = RulesEngine(self.config_handler, self.actuators, self.reader)
+        self.scheduler = Scheduler(
+            self.config_handler, self.actuators,
+            utc_offset_min=self.config_handler.server_config.get('utc_offset_min', 0),
+            sync_time=sync_time if self.config_handler.server_config.get('ntp', False) else None)
+
+        # Optional MQTT telemetry next to the HTTP API
+        self.telemetry = None
+        if self.config_handler.mqtt_config.get('enabled', False):
+            self.telemetry = MqttTelemetry(self.config_handler, self.actuators,
+                                           self.config_handler.mqtt_config, self.reader)
+
+        # Admission control in front of all routes
+        self.admission = None
+        admission_config = dict(self.config_handler.server_config.get('admission', {}))
+        if admission_config.pop('enabled', True):
+            self.admission = AdmissionControl(self.app, **admission_config)
+
+        # Setup routes, matched through a segment table unless disabled
+        self.dispatch = RouteDispatch(
+            self.app,
+            table=self.config_handler.server_config.get('route_table', True),
+            hot_routes=self.config_handler.server_config.get('hot_routes'))
+        self.routes = Routes(self.app, self.config_handler, self.actuators, self.reader,
+                             self.rules, self.scheduler, self.dispatch, self.admission)
+        self.dispatch.build()
+
+        # Derived state follows PUT /config
+        self.config_handler.reload_hooks.append(self.reader.invalidate)
+        self.config_handler.reload_hooks.append(lambda changes: self.rules.compile())
+        if self.core1:
+            self.config_handler.reload_hooks.append(self.core1.rebind)
+        if self.telemetry:
+            self.config_handler.reload_hooks.append(self.telemetry.reconfigure)
+
+    async def serve(self, port):
+        """Run background tasks alongside the HTTP server"""
+        if self.core1:
+            self.core1.start()
+        interval_ms = self.config_handler.server_config.get('rules_interval_ms', 500)
+        asyncio.create_task(self.rules.run(interval_ms))
+        asyncio.create_task(self.rules.watch_edges(
+            self.config_handler.server_config.get('edge_interval_ms', 20)))
+        asyncio.create_task(self.scheduler.run())
+        if self.telemetry:
+            asyncio.create_task(self.telemetry.run())
+        await self.app.start_server(port=port, debug=True)
 
     def run(self):
         """Start the server"""
@@ -28,10 +95,15 @@ class IoTServer:
                 self.config_handler.wifi_config["password"]
             )
 
+            # Wall-clock schedules need the time of day; the scheduler
+            # retries if this fails
+            if self.config_handler.server_config.get('ntp', False) and sync_time():
+                self.scheduler.rearm_all()
+
             # Start the server
             port = self.config_handler.server_config.get('port', 80)
             print(f'Starting HATEOAS-enabled IoT server on http://{ip}:{port}')
-            self.app.run(port=port, debug=True)
+            asyncio.run(self.serve(port))
 
         except Exception as e:
             print(f"Server error: {str(e)}")
@@ -40,4 +112,4 @@ class IoTServer:
 # Create boot.py or main.py with this code:
 if __name__ == '__main__':
     server = IoTServer()
-    server.run()
\ No newline at end of file
+    server.run()
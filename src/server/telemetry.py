@@ -0,0 +1,234 @@
+import asyncio
+import json
+import time
+
+class MqttTelemetry:
+    """Publish sensor samples and actuator states over MQTT.
+
+    Topics live under '<topic_prefix>/<device_id>':
+
+        sensors              batches of samples (see _publish_batch)
+        state/<kind>/<id>    retained actuator state, e.g. state/leds/1
+        status               retained 'online', 'offline' as last will
+        cmd/leds/<id>        'on', 'off' or 'toggle'
+        cmd/motors/<id>      'on', 'off' or JSON {"command", "direction", "seconds"}
+        cmd/lcd              text to display
+
+    Commands run through Actuators, like the HTTP routes. The umqtt client
+    is blocking, so calls are kept short: one publish per batch and a
+    non-blocking check_msg() per poll. Before each connection attempt the
+    broker is probed with a non-blocking asyncio connection, so an
+    unreachable broker never stalls the event loop; the client's own
+    connect only runs once the broker answered, with a short socket
+    timeout. A client_factory with umqtt's MQTTClient signature can be
+    passed in to use another client or a fake (see src/sim/fake_mqtt.py).
+    """
+    def __init__(self, config_handler, actuators, mqtt_config, reader, client_factory=None):
+        self.config = config_handler
+        self.actuators = actuators
+        # Shared with routes and rules, so reads coalesce
+        self.reader = reader
+        self.broker = mqtt_config["broker"]
+        self.port = mqtt_config.get("port", 1883)
+        self.user = mqtt_config.get("user")
+        self.password = mqtt_config.get("password")
+        self.device_id = mqtt_config.get("device_id", "geekhouse")
+        self.base = f"{mqtt_config.get('topic_prefix', 'geekhouse')}/{self.device_id}"
+        self.mqtt_config = mqtt_config
+        self.sensor_ids = mqtt_config.get("sensors") or list(config_handler.sensors)
+        self.sample_interval_ms = mqtt_config.get("sample_interval_ms", 1000)
+        self.batch_size = mqtt_config.get("batch_size", 10)
+        self.keepalive_s = mqtt_config.get("keepalive_s", 60)
+        self.poll_ms = mqtt_config.get("poll_ms", 100)
+        self.min_backoff_ms = mqtt_config.get("min_backoff_ms", 1000)
+        self.max_backoff_ms = mqtt_config.get("max_backoff_ms", 60000)
+        self.connect_timeout_ms = mqtt_config.get("connect_timeout_ms", 1000)
+        self.client_factory = client_factory or self._default_factory
+
+        self.client = None
+        self.backoff_ms = self.min_backoff_ms
+        self._retry_ms = None
+        self._last_tx_ms = 0
+        self._last_sample_ms = None
+
+        self._reset_batch()
+
+        # Latest state per actuator, published on the next poll
+        self._states = {}
+        actuators.listeners.append(self._on_state_change)
+
+    @staticmethod
+    def _default_factory(client_id, server, **kwargs):
+        from umqtt.simple import MQTTClient
+        return MQTTClient(client_id, server, **kwargs)
+
+    def connect(self):
+        """Connect, announce the device and subscribe to its command topics"""
+        client = self.client_factory(
+            self.device_id, self.broker, port=self.port, user=self.user,
+            password=self.password, keepalive=self.keepalive_s)
+        client.set_callback(self._on_message)
+        client.set_last_will(f"{self.base}/status", b"offline", retain=True)
+        client.connect(timeout=self.connect_timeout_ms / 1000)
+        client.subscribe(f"{self.base}/cmd/#".encode())
+        client.publish(f"{self.base}/status".encode(), b"online", retain=True)
+        self.client = client
+        self._last_tx_ms = time.ticks_ms()
+        self.backoff_ms = self.min_backoff_ms
+        print(f"MQTT connected to {self.broker}:{self.port} as {self.base}")
+
+    def disconnect(self):
+        if self.client is not None:
+            try:
+                self.client.disconnect()
+            except Exception:
+                pass
+            self.client = None
+
+    def _on_state_change(self, kind, device_id, state):
+        self._states[(kind, device_id)] = state
+
+    def _on_message(self, topic, msg):
+        """Map a command topic onto an actuator action"""
+        parts = topic.decode().split("/")[len(self.base.split("/")):]
+        payload = msg.decode()
+        try:
+            if len(parts) == 3 and parts[1] == "leds":
+                action = {"type": "led", "id": parts[2], "command": payload}
+            elif len(parts) == 3 and parts[1] == "motors":
+                if payload.startswith("{"):
+                    action = json.loads(payload)
+                else:
+                    action = {"command": payload}
+                action.update({"type": "motor", "id": parts[2]})
+            elif parts == ["cmd", "lcd"]:
+                action = {"type": "lcd", "text": payload}
+            else:
+                raise ValueError(f"Unknown command topic: {topic.decode()}")
+            self.actuators.validate_action(action)
+            self.actuators.run(action)
+        except Exception as e:
+            print(f"MQTT command failed: {str(e)}")
+
+    def sample(self, now_ms):
+        """Append one sample of every telemetry sensor to the batch"""
+        if self._batch_t is None:
+            self._batch_t = time.time()
+            self._batch_start_ms = now_ms
+        elif len(self._batch_dt) >= self.batch_size:
+            # Broker unreachable: keep the newest samples
+            self._batch_dt.pop(0)
+            for values in self._batch_values.values():
+                values.pop(0)
+            self._dropped += 1
+
+        self._batch_dt.append(time.ticks_diff(now_ms, self._batch_start_ms))
+        for sensor_id in self.sensor_ids:
+            try:
+                _, value, age_ms = self.reader.read_now(sensor_id, max_age_ms=self.sample_interval_ms // 2)
+                # While a read is in flight the cached value may be older
+                # than this sample; leave a gap rather than repeat it
+                if age_ms > self.sample_interval_ms:
+                    value = None
+            except Exception:
+                value = None
+            self._batch_values[sensor_id].append(value)
+
+    def _publish(self, topic, payload, retain=False):
+        self.client.publish(topic.encode(), payload.encode(), retain=retain)
+        self._last_tx_ms = time.ticks_ms()
+
+    def _publish_batch(self):
+        """Publish the batch as one message:
+
+        {"t": <time of first sample>, "dt_ms": [offsets], "values": {id: [...]},
+         "dropped": <samples lost while offline>}
+        """
+        self._publish(f"{self.base}/sensors", json.dumps({
+            "t": self._batch_t,
+            "dt_ms": self._batch_dt,
+            "values": self._batch_values,
+            "dropped": self._dropped
+        }))
+        self._reset_batch()
+
+    def _reset_batch(self):
+        # Batch in columns: sample offsets plus one value list per sensor
+        self._batch_t = None
+        self._batch_dt = []
+        self._batch_values = {sensor_id: [] for sensor_id in self.sensor_ids}
+        self._dropped = 0
+
+    def reconfigure(self, changes=None):
+        """Follow added and removed sensors; also a reload hook.
+
+        The current batch is published first if connected, as it has the
+        old columns.
+        """
+        sensor_ids = [sensor_id for sensor_id in (self.mqtt_config.get("sensors") or self.config.sensors)
+                      if sensor_id in self.config.sensors]
+        if sensor_ids == self.sensor_ids:
+            return
+        if self.client is not None and self._batch_dt:
+            try:
+                self._publish_batch()
+            except OSError as e:
+                print(f"MQTT connection lost: {str(e)}")
+                self.disconnect()
+        self.sensor_ids = sensor_ids
+        self._reset_batch()
+
+    def _publish_states(self):
+        while self._states:
+            (kind, device_id), state = self._states.popitem()
+            self._publish(f"{self.base}/state/{kind}/{device_id}", json.dumps(state), retain=True)
+
+    async def _probe(self):
+        """Open and close a TCP connection to the broker without blocking"""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.broker, self.port), self.connect_timeout_ms / 1000)
+        writer.close()
+        await writer.wait_closed()
+
+    async def reconnect(self, now_ms):
+        """Connect if due, backing off exponentially after failures"""
+        if self._retry_ms is not None and time.ticks_diff(now_ms, self._retry_ms) < 0:
+            return
+        try:
+            await self._probe()
+            self.connect()
+            self._retry_ms = None
+        except Exception as e:
+            print(f"MQTT connect failed, retrying in {self.backoff_ms} ms: {str(e) or type(e).__name__}")
+            self.disconnect()
+            self._retry_ms = time.ticks_add(now_ms, self.backoff_ms)
+            self.backoff_ms = min(self.backoff_ms * 2, self.max_backoff_ms)
+
+    def poll(self, now_ms):
+        """One step of work: sample, publish what is due and read commands"""
+        if self._last_sample_ms is None or time.ticks_diff(now_ms, self._last_sample_ms) >= self.sample_interval_ms:
+            self._last_sample_ms = now_ms
+            self.sample(now_ms)
+
+        if self.client is None:
+            return
+
+        try:
+            self._publish_states()
+            if len(self._batch_dt) >= self.batch_size:
+                self._publish_batch()
+            elif time.ticks_diff(now_ms, self._last_tx_ms) >= self.keepalive_s * 500:
+                self.client.ping()
+                self._last_tx_ms = now_ms
+            self.client.check_msg()
+        except OSError as e:
+            print(f"MQTT connection lost: {str(e)}")
+            self.disconnect()
+
+    async def run(self):
+        """Sample and publish forever alongside the HTTP server"""
+        while True:
+            if self.client is None:
+                await self.reconnect(time.ticks_ms())
+            self.poll(time.ticks_ms())
+            await asyncio.sleep(self.poll_ms / 1000)
@@ -1,19 +1,43 @@
 from microdot import Response
+import gc
 import json
 import network
 import time
 
-def create_response(data, links=None):
+def create_response(data, links=None, status_code=200, headers=None):
     """Create HATEOAS response with data and links"""
     response = {
         "data": data,
         "_links": links or {}
     }
+    response_headers = {'Content-Type': 'application/json'}
+    if headers:
+        response_headers.update(headers)
     return Response(
         json.dumps(response),
-        headers={'Content-Type': 'application/json'}
+        status_code=status_code,
+        headers=response_headers
     )
 
+def validate_calibration(config):
+    """Raise ValueError unless a sensor calibration can be applied"""
+    if config["type"] not in ["linear", "polynomial"]:
+        raise ValueError("Invalid configuration type")
+    params = config.get("params")
+    if not isinstance(params, dict):
+        raise ValueError("Calibration requires 'params'")
+    if config["type"] == "linear":
+        if "m" not in params or "b" not in params:
+            raise ValueError("Linear calibration requires 'm' and 'b' parameters")
+        numbers = [params["m"], params["b"]]
+    else:
+        if not isinstance(params.get("coefficients"), list):
+            raise ValueError("Polynomial calibration requires 'coefficients' parameter")
+        numbers = params["coefficients"]
+    for number in numbers:
+        if isinstance(number, bool) or not isinstance(number, (int, float)):
+            raise ValueError("Calibration parameters must be numbers")
+
 def apply_calibration(raw_value, config):
     """Apply calibration to raw sensor value"""
     if not config or "type" not in config:
@@ -31,6 +55,56 @@ def apply_calibration(raw_value, config):
         return result
     return raw_value
 
+def read_sensor(sensor_info):
+    """Take one sample of a sensor and return (raw_value, calibrated_value)"""
+    if "capture" in sensor_info:
+        raw_value = sensor_info["pin"].value()
+    else:
+        raw_value = sensor_info["sampler"].read()
+    return raw_value, apply_calibration(raw_value, sensor_info["config"])
+
+# The largest free block probe never allocates more than this, and always
+# leaves PROBE_RESERVE bytes free for everything else
+PROBE_MAX = 32768
+PROBE_RESERVE = 16384
+
+def largest_free_block(limit, step=64):
+    """Size of the largest bytearray of at most `limit` bytes that can be allocated, to within `step` bytes"""
+    low, high = 0, limit
+    while high - low > step:
+        size = (low + high) // 2
+        try:
+            block = bytearray(size)
+            del block
+            low = size
+        except MemoryError:
+            high = size
+    return low
+
+def memory_status(probe=False):
+    """Heap use after a collection; probe=True also finds the largest free block"""
+    if not hasattr(gc, "mem_free"):
+        return {"mem_free": None, "mem_alloc": None}
+    gc.collect()
+    status = {"mem_free": gc.mem_free(), "mem_alloc": gc.mem_alloc()}
+    if probe:
+        # Capped, so a fragmentation check cannot drive the heap to exhaustion
+        limit = max(min(PROBE_MAX, status["mem_free"] - PROBE_RESERVE), 0)
+        status["probe_limit"] = limit
+        status["largest_free_block"] = largest_free_block(limit)
+    return status
+
+def sync_time():
+    """Set the RTC from NTP; returns False if no time server answered"""
+    try:
+        import ntptime
+        ntptime.settime()
+        print('Time synchronized:', time.localtime())
+        return True
+    except Exception as e:
+        print(f"Time sync failed: {str(e)}")
+        return False
+
 def connect_wifi(ssid, password):
     """Connect to WiFi network"""
     wlan = network.WLAN(network.STA_IF)
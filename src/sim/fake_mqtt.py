@@ -0,0 +1,126 @@
+"""In-process stand-in for an MQTT broker and umqtt.simple clients.
+
+``FakeBroker.client_factory`` has the signature of umqtt's ``MQTTClient``,
+so it can be passed to ``MqttTelemetry`` as ``client_factory``:
+
+    broker = FakeBroker()
+    telemetry = MqttTelemetry(config, actuators, mqtt_config, reader,
+                              client_factory=broker.client_factory)
+
+The broker keeps retained messages, delivers published messages to
+matching subscriptions on the next ``check_msg()``, publishes a client's
+last will when its connection is dropped, and can be taken down to make
+connects fail.
+"""
+
+def topic_matches(pattern, topic):
+    """MQTT topic filter match with '+' and '#' wildcards"""
+    pattern = pattern.split("/")
+    topic = topic.split("/")
+    for i, part in enumerate(pattern):
+        if part == "#":
+            return True
+        if i >= len(topic) or (part != "+" and part != topic[i]):
+            return False
+    return len(pattern) == len(topic)
+
+class FakeBroker:
+    def __init__(self):
+        self.up = True
+        self.clients = []
+        self.retained = {}   # topic -> payload
+        self.messages = []   # (topic, payload, retain) in publish order
+
+    def client_factory(self, client_id, server, **kwargs):
+        return FakeMQTTClient(self, client_id, server, **kwargs)
+
+    def publish(self, topic, msg, retain=False):
+        """Publish from outside, e.g. a command from another client"""
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if isinstance(msg, str):
+            msg = msg.encode()
+        self.messages.append((topic.decode(), msg, retain))
+        if retain:
+            self.retained[topic.decode()] = msg
+        for client in self.clients:
+            client._deliver(topic, msg)
+
+    def drop(self, client=None):
+        """Close connections as a lost network would; last wills are sent"""
+        for dropped in [c for c in self.clients if client in (None, c)]:
+            self.clients.remove(dropped)
+            dropped.connected = False
+            if dropped.will:
+                self.publish(*dropped.will)
+
+    def topic(self, topic):
+        """Payloads published to a topic, oldest first"""
+        return [msg for t, msg, _ in self.messages if t == topic]
+
+class FakeMQTTClient:
+    def __init__(self, broker, client_id, server, port=0, user=None, password=None,
+                 keepalive=0, ssl=None):
+        self.broker = broker
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.keepalive = keepalive
+        self.callback = None
+        self.will = None
+        self.subscriptions = []
+        self.inbox = []
+        self.connected = False
+        self.pings = 0
+
+    def set_callback(self, f):
+        self.callback = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        self.will = (topic, msg, retain)
+
+    def connect(self, clean_session=True, timeout=None):
+        if not self.broker.up:
+            raise OSError(113, "EHOSTUNREACH")
+        self.connected = True
+        self.broker.clients.append(self)
+        return 0
+
+    def disconnect(self):
+        if self in self.broker.clients:
+            self.broker.clients.remove(self)
+        self.connected = False
+
+    def _check(self):
+        if not self.connected:
+            raise OSError(104, "ECONNRESET")
+
+    def ping(self):
+        self._check()
+        self.pings += 1
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        self._check()
+        self.broker.publish(topic, msg, retain)
+
+    def subscribe(self, topic, qos=0):
+        self._check()
+        topic = topic.decode() if isinstance(topic, bytes) else topic
+        self.subscriptions.append(topic)
+        for retained_topic, msg in self.broker.retained.items():
+            if topic_matches(topic, retained_topic):
+                self.inbox.append((retained_topic.encode(), msg))
+
+    def _deliver(self, topic, msg):
+        if any(topic_matches(s, topic.decode()) for s in self.subscriptions):
+            self.inbox.append((topic, msg))
+
+    def check_msg(self):
+        self._check()
+        while self.inbox:
+            topic, msg = self.inbox.pop(0)
+            if self.callback:
+                self.callback(topic, msg)
+
+    def wait_msg(self):
+        self.check_msg()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Simulated Pico W hardware for running the device server under CPython.
+
+``install()`` registers stand-ins for the MicroPython ``machine`` and
+``network`` modules and adds the MicroPython ``time.ticks_*`` functions,
+so ``src/server`` and ``lib/lcd1602.py`` run unchanged on a development
+machine, including ``_thread`` for dual-core mode:
+
+- ``ADC`` returns a slowly varying signal with noise; ``ADC.levels`` pins a
+  channel to a fixed value
+- ``Pin`` keeps its value and calls its IRQ handler, with the IRQ flags set,
+  when ``drive()`` changes it or ``pulse()`` emits a pulse
+- ``I2C`` accepts writes for the LCD and takes as long as the bus would
+
+Run the server on a local port:
+
+    python src/sim/simhw.py config/config.json --port 8080
+"""
+import argparse
+import math
+import random
+import sys
+import time
+import types
+from pathlib import Path
+
+TICKS_PERIOD = 1 << 30
+
+def ticks_ms():
+    return int(time.monotonic() * 1000) & (TICKS_PERIOD - 1)
+
+def ticks_us():
+    return int(time.monotonic() * 1000000) & (TICKS_PERIOD - 1)
+
+def ticks_diff(end, start):
+    """Signed difference of two ticks values, like MicroPython's"""
+    return ((end - start + TICKS_PERIOD // 2) & (TICKS_PERIOD - 1)) - TICKS_PERIOD // 2
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & (TICKS_PERIOD - 1)
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+def sleep_us(us):
+    time.sleep(us / 1000000)
+
+class Pin:
+    OUT = 1
+    IN = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, id, mode=IN, pull=None):
+        self._id = id
+        self._value = 0
+        self._handler = None
+        self._trigger = 0
+        self._irq = _PinIRQ()
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def toggle(self):
+        self._value ^= 1
+
+    def irq(self, handler=None, trigger=IRQ_RISING | IRQ_FALLING):
+        self._handler = handler
+        self._trigger = trigger
+        return self._irq
+
+    def drive(self, value):
+        """Change an input as external hardware would, firing the IRQ"""
+        value = 1 if value else 0
+        if value == self._value:
+            return
+        self._value = value
+        self._fire(self.IRQ_RISING if value else self.IRQ_FALLING)
+
+    def pulse(self):
+        """A pulse shorter than the IRQ latency: the handler runs once, with
+        both edges flagged and the pin already back at its old level"""
+        self._fire(self.IRQ_RISING | self.IRQ_FALLING)
+
+    def _fire(self, edges):
+        self._irq._flags = edges & self._trigger
+        if self._handler and self._irq._flags:
+            self._handler(self)
+
+class _PinIRQ:
+    def __init__(self):
+        self._flags = 0
+
+    def flags(self):
+        return self._flags
+
+class ADC:
+    # Fixed readings per channel; others follow a noisy slow sine
+    levels = {}
+    noise = 200
+
+    def __init__(self, id):
+        self._id = id
+        self._phase = random.random() * 2 * math.pi
+
+    def read_u16(self):
+        if self._id in ADC.levels:
+            return ADC.levels[self._id]
+        level = 30000 + 10000 * math.sin(time.monotonic() / 60 + self._phase)
+        return max(0, min(65535, int(level + random.uniform(-ADC.noise, ADC.noise))))
+
+class I2C:
+    devices = [0x27]
+
+    def __init__(self, id, sda=None, scl=None, freq=400000):
+        self.freq = freq
+        self.written = 0
+
+    def scan(self):
+        return list(I2C.devices)
+
+    def writeto(self, addr, buf):
+        # Address byte plus data, 9 clocks per byte
+        time.sleep((len(buf) + 1) * 9 / self.freq)
+        self.written += len(buf)
+
+def disable_irq():
+    return 0
+
+def enable_irq(state):
+    pass
+
+class WLAN:
+    def __init__(self, interface=0):
+        self._active = False
+
+    def active(self, active=None):
+        if active is None:
+            return self._active
+        self._active = active
+
+    def connect(self, ssid, password):
+        pass
+
+    def status(self):
+        return 3
+
+    def isconnected(self):
+        return True
+
+    def ifconfig(self):
+        return ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
+
+def install():
+    """Register the simulated modules; call before importing server code"""
+    for name in ("ticks_ms", "ticks_us", "ticks_diff", "ticks_add", "sleep_ms", "sleep_us"):
+        if not hasattr(time, name):
+            setattr(time, name, globals()[name])
+
+    machine = types.ModuleType("machine")
+    for name in ("Pin", "ADC", "I2C", "disable_irq", "enable_irq"):
+        setattr(machine, name, globals()[name])
+    network = types.ModuleType("network")
+    network.STA_IF = 0
+    network.WLAN = WLAN
+    sys.modules.setdefault("machine", machine)
+    sys.modules.setdefault("network", network)
+
+    root = Path(__file__).resolve().parent.parent.parent
+    for path in (root / "src" / "server", root / "lib"):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the device server on simulated hardware')
+    parser.add_argument('config', type=Path, help='Device JSON configuration file')
+    parser.add_argument('--port', type=int, default=8080, help='HTTP port (default: 8080)')
+    args = parser.parse_args()
+
+    install()
+    import asyncio
+    from server import IoTServer
+
+    server = IoTServer(str(args.config))
+    print(f'Simulated IoT server on http://127.0.0.1:{args.port}')
+    asyncio.run(server.serve(args.port))
+
+if __name__ == '__main__':
+    main()
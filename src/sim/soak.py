@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""Memory soak test of the device server.
+
+Runs a compressed workload of API requests for as long as days of normal
+use would produce, and watches the heap for the slow growth and
+fragmentation that only show up after long uptimes.
+
+Against simulated hardware (default), the server runs in this process
+with ``simhw`` and requests go through Microdot's test client. Memory is
+measured with ``tracemalloc``: the live heap after a collection every
+``--sample-every`` requests and, once the soak is done, a per-route
+profile taken with the rules, scheduler and core 1 tasks stopped, so
+nothing but the request allocates: blocks and bytes still allocated after
+each request (from snapshot statistics) and the transient peak:
+
+    python src/sim/soak.py config/config.json --requests 200000
+
+Against a board (``--device``), the same workload goes over HTTP and
+``/status?probe=1`` is polled for ``mem_free``, ``mem_alloc`` and the
+largest free block up to the probe limit:
+
+    python src/sim/soak.py --device http://192.168.1.50 --requests 20000
+
+The test fails (exit status 1) if the heap floor keeps rising, i.e. the
+last quarter of samples never gets as low as the first quarter, by more
+than ``--leak-bytes``, or if fragmentation rises by more than
+``--max-fragmentation-rise``. With fewer than 8 heap samples no trend can
+be told apart, and the run ends inconclusive (exit status 2); lower
+``--sample-every`` or raise ``--requests``. Requests that write the
+configuration to flash are left out with ``--no-writes``.
+"""
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+def workload(config, writes=True):
+    """Weighted (name, weight, method, path, body) requests for a configuration"""
+    led = next(iter(config['leds']), None)
+    sensor_ids = list(config['sensors'])
+    rule_body = {"sensor": sensor_ids[0],
+                 "condition": {"type": "threshold", "op": ">", "value": 1e9},
+                 "action": {"type": "lcd", "text": "soak {value}"}} if sensor_ids else None
+
+    requests = [
+        ("GET /", 2, "GET", "/", None),
+        ("GET /leds", 2, "GET", "/leds", None),
+        ("GET /sensors", 2, "GET", "/sensors", None),
+        ("GET /rules", 1, "GET", "/rules", None),
+        ("GET /schedules", 1, "GET", "/schedules", None),
+        ("GET /status", 1, "GET", "/status", None),
+        ("GET /routes", 1, "GET", "/routes", None),
+        ("POST /lcd", 2, "POST", "/lcd", {"text": "soak test running"}),
+        ("GET /missing", 1, "GET", "/missing", None),
+    ]
+    for sensor_id in sensor_ids:
+        requests.append(("GET /sensors/<id>/value", 20 // len(sensor_ids) or 1,
+                         "GET", f"/sensors/{sensor_id}/value", None))
+        requests.append(("GET /sensors/<id>/value?max_age_ms", 10 // len(sensor_ids) or 1,
+                         "GET", f"/sensors/{sensor_id}/value?max_age_ms=1000", None))
+    if led is not None:
+        requests.append(("POST /leds/<id>/toggle", 15, "POST", f"/leds/{led}/toggle", None))
+        requests.append(("GET /leds/<id>", 3, "GET", f"/leds/{led}", None))
+    if writes and rule_body:
+        # save_config on every call
+        requests.append(("POST /rules", 1, "POST", "/rules", rule_body))
+        requests.append(("PUT /config", 1, "PUT", "/config", None))
+    return requests
+
+class LocalTarget:
+    """The server on simulated hardware, measured with tracemalloc"""
+    def __init__(self, config_path, dual_core=False):
+        src = Path(__file__).resolve().parent
+        sys.path.insert(0, str(src))
+        import simhw
+        simhw.install()
+        import tracemalloc
+        from microdot.test_client import TestClient
+        from server import IoTServer
+
+        # save_config writes the file, so work on a copy
+        self.tmp = tempfile.mkdtemp(prefix='soak-')
+        path = Path(self.tmp) / 'config.json'
+        shutil.copy(config_path, path)
+        if dual_core:
+            config = json.loads(path.read_text())
+            config['server']['dual_core'] = True
+            path.write_text(json.dumps(config))
+
+        self.tracemalloc = tracemalloc
+        self.server = IoTServer(str(path))
+        self.client = TestClient(self.server.app)
+        self.config = json.loads(path.read_text())
+
+    async def start(self):
+        server = self.server
+        if server.core1:
+            server.core1.start()
+        interval_ms = server.config_handler.server_config.get('rules_interval_ms', 500)
+        self.tasks = [asyncio.create_task(server.rules.run(interval_ms)),
+                      asyncio.create_task(server.rules.watch_edges(
+                          server.config_handler.server_config.get('edge_interval_ms', 20))),
+                      asyncio.create_task(server.scheduler.run())]
+        self.tracemalloc.start()
+
+    async def _pause(self):
+        """Stop the background tasks for good; they allocate on their own"""
+        for task in self.tasks:
+            task.cancel()
+        if self.server.core1 and self.server.core1.running:
+            self.server.core1.stop()
+            # Let the thread finish its pass
+            await asyncio.sleep(3 * self.server.core1.interval_ms / 1000)
+
+    async def stop(self):
+        self.tracemalloc.stop()
+        await self._pause()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    async def request(self, method, path, body):
+        if path == '/config' and method == 'PUT':
+            body = {kind: self.server.config_handler.device_configs(kind)
+                    for kind in ('leds', 'motors', 'sensors')}
+        if path == '/rules' and method == 'POST':
+            # Keep the rule count constant
+            for rule_id in [r for r in self.server.config_handler.rules if str(r).isdigit()]:
+                await self.client.delete(f'/rules/{rule_id}')
+        response = await self.client.request(method, path, body=body)
+        return response.status_code
+
+    def _snapshot(self):
+        import gc
+        gc.collect()
+        # Leave out what this script and tracemalloc hold, e.g. the samples
+        return self.tracemalloc.take_snapshot().filter_traces((
+            self.tracemalloc.Filter(False, __file__),
+            self.tracemalloc.Filter(False, self.tracemalloc.__file__)))
+
+    async def sample(self):
+        import gc
+        snapshot = self._snapshot()
+        heap = sum(stat.size for stat in snapshot.statistics('filename'))
+        del snapshot
+        return {"heap": heap,
+                "blocks": sys.getallocatedblocks(),
+                "objects": len(gc.get_objects())}
+
+    async def profile(self, requests, count):
+        """Memory per request of each route, with nothing else running.
+
+        Blocks and bytes still allocated after `count` requests of a route
+        are the positive differences of snapshot statistics per allocation
+        site, so frees elsewhere do not hide them. Measuring a run of
+        requests keeps the interpreter's free lists, which hold on to a
+        bounded number of blocks, from showing up as a per-request cost.
+        """
+        await self._pause()
+        routes = {}
+        for name, _, method, path, body in requests:
+            route = routes.setdefault(name, {"requests": 0, "kept_blocks": 0, "kept_bytes": 0, "peak_bytes": 0})
+            before = self._snapshot()
+            for _ in range(count):
+                traced = self.tracemalloc.get_traced_memory()[0]
+                self.tracemalloc.reset_peak()
+                await self.request(method, path, body)
+                route["peak_bytes"] = max(route["peak_bytes"], self.tracemalloc.get_traced_memory()[1] - traced)
+            after = self._snapshot()
+            for stat in after.compare_to(before, 'lineno'):
+                route["kept_blocks"] += max(stat.count_diff, 0)
+                route["kept_bytes"] += max(stat.size_diff, 0)
+            del before, after
+            route["requests"] += count
+        return routes
+
+class DeviceTarget:
+    """A board running the server, sampled through GET /status"""
+    def __init__(self, url, timeout=10):
+        import requests
+        self.session = requests.Session()
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.config = {kind: self._get(f'/{kind}').get('data', {})
+                       for kind in ('leds', 'sensors')}
+
+    def _get(self, path):
+        return self.session.get(self.url + path, timeout=self.timeout).json()
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        self.session.close()
+
+    async def request(self, method, path, body):
+        if path == '/config' and method == 'PUT':
+            body = self._get('/config')['data']
+        if path == '/rules' and method == 'POST':
+            for rule_id in [r for r in self._get('/rules')['data'] if str(r).isdigit()]:
+                self.session.delete(f'{self.url}/rules/{rule_id}', timeout=self.timeout)
+        response = self.session.request(method, self.url + path, json=body, timeout=self.timeout)
+        return response.status_code
+
+    async def profile(self, requests, count):
+        """Per-request memory is only measured on simulated hardware"""
+        return {}
+
+    async def sample(self):
+        status = self._get('/status?probe=1')['data']
+        free = status.get('mem_free')
+        limit = status.get('probe_limit')
+        largest = status.get('largest_free_block')
+        sample = {"heap": status.get('mem_alloc'), "mem_free": free, "largest_free_block": largest}
+        if limit and largest is not None:
+            # The probe stops at probe_limit, so a block that large counts as unfragmented
+            sample["fragmentation"] = round(1 - largest / limit, 3)
+        return sample
+
+# Fewer samples than this cannot show a trend
+MIN_SAMPLES = 8
+
+def rising_floor(values):
+    """How far the lowest value of the last quarter is above the highest of the first;
+    None with fewer than MIN_SAMPLES values"""
+    if len(values) < MIN_SAMPLES:
+        return None
+    quarter = len(values) // 4
+    return min(values[-quarter:]) - max(values[:quarter])
+
+def slope(values):
+    """Least-squares change per sample"""
+    n = len(values)
+    if n < 2:
+        return 0
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    num = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+    den = sum((x - mean_x) ** 2 for x in range(n))
+    return num / den
+
+async def soak(target, requests, count, sample_every, warmup, seed, profile_requests=100):
+    rng = random.Random(seed)
+    names = [r[0] for r in requests]
+    weights = [r[1] for r in requests]
+    routes = {}
+    samples = []
+    statuses = {}
+
+    await target.start()
+    try:
+        start = time.monotonic()
+        for i in range(warmup + count):
+            name, _, method, path, body = requests[rng.choices(range(len(names)), weights)[0]]
+            t = time.perf_counter()
+            status = await target.request(method, path, body)
+            elapsed_ms = (time.perf_counter() - t) * 1000
+            statuses[status] = statuses.get(status, 0) + 1
+            # Let background tasks run as they would between requests
+            await asyncio.sleep(0)
+
+            if i < warmup:
+                continue
+            route = routes.setdefault(name, {"requests": 0, "ms": 0.0, "max_ms": 0.0})
+            route["requests"] += 1
+            route["ms"] += elapsed_ms
+            route["max_ms"] = max(route["max_ms"], elapsed_ms)
+
+            done = i - warmup + 1
+            if done % sample_every == 0 or done == count:
+                sample = await target.sample()
+                sample["requests"] = done
+                sample["elapsed_s"] = round(time.monotonic() - start, 1)
+                samples.append(sample)
+                print(f"{done:>9} requests  " + "  ".join(
+                    f"{k}={v}" for k, v in sample.items() if k not in ("requests",)), flush=True)
+
+        memory = {}
+        if profile_requests:
+            print(f"Profiling {profile_requests} requests per route with background tasks stopped", flush=True)
+            memory = await target.profile(requests, profile_requests)
+        for name, profile in memory.items():
+            routes.setdefault(name, {"requests": 0, "ms": 0.0, "max_ms": 0.0})["memory"] = profile
+    finally:
+        await target.stop()
+    return routes, samples, statuses
+
+def report(routes, samples, statuses, leak_bytes, max_fragmentation_rise):
+    """Print per-route costs and trends; returns (problems found, warnings)"""
+    print(f"\nStatus codes: {statuses}")
+    measured = any("memory" in route for route in routes.values())
+    header = f"\n{'route':<38}{'requests':>9}{'avg ms':>9}{'max ms':>9}"
+    if measured:
+        header += f"{'kept blk/req':>14}{'kept B/req':>12}{'peak B':>9}"
+    print(header)
+
+    def cost(item):
+        memory = item[1].get("memory")
+        return (-(memory["kept_blocks"] / memory["requests"]) if memory else 0, -item[1]["requests"])
+
+    for name, route in sorted(routes.items(), key=cost):
+        n = route["requests"]
+        line = f"{name:<38}{n:>9}{route['ms'] / n if n else 0:>9.2f}{route['max_ms']:>9.1f}"
+        memory = route.get("memory")
+        if memory:
+            m = memory["requests"]
+            line += f"{memory['kept_blocks'] / m:>14.2f}{memory['kept_bytes'] / m:>12.1f}{memory['peak_bytes']:>9}"
+        print(line)
+
+    problems = []
+    warnings = []
+    heap = [s["heap"] for s in samples if s.get("heap") is not None]
+    rise = rising_floor(heap)
+    if rise is None:
+        warnings.append(f"only {len(heap)} heap samples, {MIN_SAMPLES} needed to detect growth; "
+                        f"lower --sample-every or raise --requests")
+    else:
+        print(f"\nHeap: {heap[0]} -> {heap[-1]} bytes, {slope(heap):+.1f} per sample, floor rise {rise}")
+        if rise > leak_bytes:
+            problems.append(f"heap floor rose by {rise} bytes (limit {leak_bytes})")
+    fragmentation = [s["fragmentation"] for s in samples if "fragmentation" in s]
+    rise = rising_floor(fragmentation)
+    if rise is not None:
+        print(f"Fragmentation: {fragmentation[0]} -> {fragmentation[-1]}, floor rise {rise:.3f}")
+        if rise > max_fragmentation_rise:
+            problems.append(f"fragmentation floor rose by {rise:.3f} (limit {max_fragmentation_rise})")
+    elif fragmentation:
+        warnings.append(f"only {len(fragmentation)} fragmentation samples, {MIN_SAMPLES} needed")
+    return problems, warnings
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory soak test of the device server')
+    parser.add_argument('config', type=Path, nargs='?', help='Device JSON configuration (simulated hardware)')
+    parser.add_argument('--device', help='Base URL of a board to test instead, e.g. http://192.168.1.50')
+    parser.add_argument('--requests', type=int, default=100000, help='Requests to send (default: 100000)')
+    parser.add_argument('--warmup', type=int, default=1000, help='Requests before measuring (default: 1000)')
+    parser.add_argument('--sample-every', type=int, default=5000, help='Requests between heap samples (default: 5000)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed of the request mix')
+    parser.add_argument('--no-writes', action='store_true', help='Leave out requests that save the configuration')
+    parser.add_argument('--profile-requests', type=int, default=100,
+                        help='Requests per route in the memory profile, 0 to skip (default: 100)')
+    parser.add_argument('--dual-core', action='store_true', help='Run the simulated server in dual-core mode')
+    parser.add_argument('--leak-bytes', type=int, default=4096, help='Allowed rise of the heap floor (default: 4096)')
+    parser.add_argument('--max-fragmentation-rise', type=float, default=0.1,
+                        help='Allowed rise of 1 - largest free block / probe limit (default: 0.1)')
+    parser.add_argument('--json', type=Path, help='Write samples and per-route results to this file')
+    args = parser.parse_args()
+
+    if args.device:
+        target = DeviceTarget(args.device)
+    elif args.config:
+        target = LocalTarget(args.config, args.dual_core)
+    else:
+        parser.error('a configuration file or --device is required')
+
+    requests = workload(target.config, writes=not args.no_writes)
+    routes, samples, statuses = asyncio.run(
+        soak(target, requests, args.requests, args.sample_every, args.warmup, args.seed,
+             args.profile_requests))
+    problems, warnings = report(routes, samples, statuses, args.leak_bytes, args.max_fragmentation_rise)
+
+    if args.json:
+        args.json.write_text(json.dumps({"routes": routes, "samples": samples, "statuses": statuses,
+                                         "problems": problems, "warnings": warnings}, indent=2))
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    for warning in warnings:
+        print(f"WARNING: {warning}")
+    if problems:
+        sys.exit(1)
+    if warnings:
+        print("Inconclusive: not enough samples")
+        sys.exit(2)
+    print("No memory growth detected")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Request admission and load shedding, on simulated hardware.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "sim"))
+sys.path.insert(0, str(ROOT / "deploy"))
+
+import simhw
+simhw.install()
+
+from microdot import Microdot
+from microdot.test_client import TestClient
+from toml_to_json import convert_config
+from config_handler import ConfigHandler
+from actuators import Actuators
+from admission import AdmissionControl
+from readings import SensorReader
+from routes import Routes
+
+class FakeLcd:
+    def clear(self):
+        pass
+
+    def write(self, x, y, text):
+        pass
+
+class AdmissionTest(unittest.IsolatedAsyncioTestCase):
+    """One request slot and a queue of two; GET /hold keeps its slot until released"""
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config_file = Path(self.tmp.name) / "config.json"
+        convert_config(ROOT / "config" / "config_example.toml", config_file)
+        self.config = ConfigHandler(str(config_file))
+        self.config.load_config()
+        self.actuators = Actuators(self.config, FakeLcd())
+        app = Microdot()
+        self.admission = AdmissionControl(app, max_active=1, max_queue=2, queue_timeout_ms=1000)
+        Routes(app, self.config, self.actuators, SensorReader(self.config), admission=self.admission)
+        self.release = asyncio.Event()
+
+        @app.route('/hold')
+        async def hold(request):
+            await self.release.wait()
+            return "held"
+
+        @app.route('/boom')
+        async def boom(request):
+            raise RuntimeError("handler failed")
+
+        self.client = TestClient(app)
+        self.finished = []
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def send(self, method, path):
+        response = await self.client.request(method, path)
+        self.finished.append((path, response.status_code))
+        return response
+
+    async def hold_slot(self):
+        task = asyncio.create_task(self.send("GET", "/hold"))
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.admission.active, 1)
+        return task
+
+    async def test_waiters_are_served_by_priority(self):
+        held = await self.hold_slot()
+        bulk = asyncio.create_task(self.send("GET", "/"))
+        await asyncio.sleep(0.01)
+        actuator = asyncio.create_task(self.send("POST", "/leds/1/on"))
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.admission.counts["queued"], 2)
+
+        self.release.set()
+        await asyncio.gather(held, bulk, actuator)
+        # The LED command arrived last but was served before the discovery document
+        self.assertEqual(self.finished, [("/hold", 200), ("/leds/1/on", 200), ("/", 200)])
+
+    async def test_full_queue_evicts_lower_priority_waiter(self):
+        held = await self.hold_slot()
+        bulk = asyncio.create_task(self.send("GET", "/"))
+        normal = asyncio.create_task(self.send("GET", "/leds/1"))
+        await asyncio.sleep(0.01)
+        actuator = asyncio.create_task(self.send("POST", "/leds/1/toggle"))
+        await asyncio.sleep(0.01)
+
+        evicted = await bulk
+        self.assertEqual(evicted.status_code, 503)
+        self.assertEqual(evicted.headers["Retry-After"], str(self.admission.retry_after_s))
+        self.assertIn("evicted", evicted.json["data"]["error"])
+        self.assertEqual(self.admission.counts["evicted"], 1)
+
+        # A request no more urgent than every waiter is rejected itself
+        rejected = await self.send("GET", "/rules")
+        self.assertEqual(rejected.status_code, 503)
+        self.assertEqual(self.admission.counts["rejected"], 1)
+
+        self.release.set()
+        await asyncio.gather(held, normal, actuator)
+        self.assertEqual(self.finished[-2:], [("/leds/1/toggle", 200), ("/leds/1", 200)])
+
+    async def test_low_memory_rejects_all_but_actuator_commands(self):
+        self.admission._free_heap = lambda: self.admission.min_free_heap - 1
+        response = await self.send("GET", "/sensors")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+        self.assertIn("low memory", response.json["data"]["error"])
+        self.assertEqual(self.admission.counts["low_memory"], 1)
+
+        response = await self.send("POST", "/leds/1/on")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.admission.active, 0)
+
+    async def test_failing_handler_frees_its_slot(self):
+        response = await self.send("GET", "/boom")
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.admission.active, 0)
+
+        # The slot is usable again, and a waiter behind a failing handler gets it
+        held = await self.hold_slot()
+        waiter = asyncio.create_task(self.send("GET", "/boom"))
+        await asyncio.sleep(0.01)
+        self.release.set()
+        await asyncio.gather(held, waiter)
+        self.assertEqual(self.admission.active, 0)
+        self.assertEqual((await self.send("GET", "/leds/1")).status_code, 200)
+
+class TimedMotorTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config_file = Path(self.tmp.name) / "config.json"
+        convert_config(ROOT / "config" / "config_example.toml", config_file)
+        config = json.loads(config_file.read_text())
+        config["motors"] = {"1": {"pin_on": 20, "pin_dir": 21, "type": "dc", "location": "roof"}}
+        config_file.write_text(json.dumps(config))
+
+        self.config = ConfigHandler(str(config_file))
+        self.config.load_config()
+        self.actuators = Actuators(self.config, FakeLcd())
+        app = Microdot()
+        # One handler at a time and no queue: a held slot rejects the next request
+        self.admission = AdmissionControl(app, max_active=1, max_queue=0)
+        Routes(app, self.config, self.actuators, SensorReader(self.config),
+               admission=self.admission)
+        self.client = TestClient(app)
+
+    async def asyncTearDown(self):
+        self.actuators.motor_off("1")
+        self.tmp.cleanup()
+
+    async def test_timed_run_does_not_hold_a_request_slot(self):
+        responses = await asyncio.wait_for(asyncio.gather(
+            self.client.post("/motors/1/on?seconds=30"),
+            self.client.post("/motors/1/on?seconds=30"),
+            self.client.get("/motors/1")), 2)
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200])
+        self.assertEqual(self.admission.counts["rejected"], 0)
+        self.assertEqual(self.config.motors["1"]["pin_on"].value(), 1)
+
+    async def test_timed_run_stops(self):
+        await self.client.post("/motors/1/on?seconds=1")
+        self.assertEqual(self.config.motors["1"]["pin_on"].value(), 1)
+        await asyncio.sleep(1.2)
+        self.assertEqual(self.config.motors["1"]["pin_on"].value(), 0)
+
+    async def test_new_command_cancels_pending_stop(self):
+        await self.client.post("/motors/1/on?seconds=1")
+        await self.client.post("/motors/1/on")
+        await asyncio.sleep(1.2)
+        self.assertEqual(self.config.motors["1"]["pin_on"].value(), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Device reconfiguration through PUT /config, on simulated hardware.
+
+    python -m unittest discover tests
+"""
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "sim"))
+sys.path.insert(0, str(ROOT / "deploy"))
+
+import simhw
+simhw.install()
+
+from microdot import Microdot
+from microdot.test_client import TestClient
+from toml_to_json import convert_config, validate_pins
+from config_handler import ConfigHandler
+from actuators import Actuators
+from readings import SensorReader
+from routes import Routes
+
+class FakeLcd:
+    def clear(self):
+        pass
+
+    def write(self, x, y, text):
+        pass
+
+class ConfigUpdateTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config_file = Path(self.tmp.name) / "config.json"
+        convert_config(ROOT / "config" / "config_example.toml", config_file)
+        self.config = ConfigHandler(str(config_file))
+        self.config.load_config()
+        self.actuators = Actuators(self.config, FakeLcd())
+        app = Microdot()
+        Routes(app, self.config, self.actuators, SensorReader(self.config))
+        self.client = TestClient(app)
+        self.devices = (await self.client.get("/config")).json["data"]
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def put(self, devices):
+        return await self.client.put("/config", body=json.dumps(devices))
+
+    async def test_duplicate_pin_is_rejected(self):
+        led = self.config.leds["1"]["pin"]
+        self.devices["motors"]["1"] = {"pin_on": 20, "pin_dir": 2, "type": "dc", "location": "roof"}
+        response = await self.put(self.devices)
+        self.assertEqual(response.status_code, 400)
+        error = response.json["data"]["error"]
+        self.assertIn("motors '1' pin_dir", error)
+        self.assertIn("leds '1' pin", error)
+
+        # Nothing was touched
+        self.assertEqual(self.config.motors, {})
+        self.assertIs(self.config.leds["1"]["pin"], led)
+
+    async def test_adc_channel_and_gpio_are_the_same_pin(self):
+        # ADC channel 1 is GPIO 27
+        self.devices["leds"]["2"]["pin"] = 27
+        response = await self.put(self.devices)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("sensors '1' pin", response.json["data"]["error"])
+        self.assertIn("leds '2' pin", response.json["data"]["error"])
+
+    async def test_moving_a_device_to_a_free_pin(self):
+        self.devices["leds"]["1"]["pin"] = 5
+        response = await self.put(self.devices)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["data"]["changes"]["updated"]["leds"], ["1"])
+        self.assertEqual(self.config.leds["1"]["pin_no"], 5)
+
+    def test_converter_rejects_duplicate_pins(self):
+        config = {"leds": {"1": {"pin": 15}},
+                  "sensors": {"5": {"pin": 15, "adc": False}, "2": {"pin": 0, "adc": True},
+                              "3": {"pin": 26, "adc": True}, "4": {"pin": 4, "adc": True}}}
+        with self.assertRaises(ValueError) as raised:
+            validate_pins(config)
+        self.assertIn("Sensor '5' pin", str(raised.exception))
+        self.assertIn("LED '1' pin", str(raised.exception))
+
+        # ADC sensors may share an input; channel 4 is not a GPIO
+        config["leds"]["1"]["pin"] = 4
+        validate_pins(config)
+
+if __name__ == "__main__":
+    unittest.main()
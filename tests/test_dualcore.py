@@ -0,0 +1,109 @@
+"""Dual-core LCD output, with core 1 run as a thread by the `_thread` module.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "sim"))
+sys.path.insert(0, str(ROOT / "deploy"))
+
+import simhw
+simhw.install()
+
+from microdot import Microdot
+from microdot.test_client import TestClient
+from toml_to_json import convert_config
+from config_handler import ConfigHandler
+from actuators import Actuators
+from dualcore import CoreWorker
+from lcd1602 import LCD
+from readings import SensorReader
+from routes import Routes
+
+# Slow enough that drawing a full frame takes well over 100 ms
+BUS_FREQ = 20000
+
+class RecordingLcd(LCD):
+    """The real LCD driver on the simulated bus, remembering each drawn line"""
+    def __init__(self):
+        super().__init__()
+        self.bus.freq = BUS_FREQ
+        self.lines = {}
+
+    def write(self, x, y, str):
+        super().write(x, y, str)
+        self.lines[y] = str
+
+class CoreWorkerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config_file = Path(self.tmp.name) / "config.json"
+        convert_config(ROOT / "config" / "config_example.toml", config_file)
+        self.config = ConfigHandler(str(config_file))
+        self.config.load_config()
+        self.lcd = RecordingLcd()
+        self.worker = CoreWorker(self.config, self.lcd, interval_ms=10)
+        self.actuators = Actuators(self.config, self.worker.display)
+        app = Microdot()
+        Routes(app, self.config, self.actuators, SensorReader(self.config))
+        self.client = TestClient(app)
+        self.worker.start()
+
+    async def asyncTearDown(self):
+        self.worker.stop()
+        # Let the thread see the flag and leave its loop
+        passes = self.worker.passes
+        await asyncio.sleep(0.3)
+        self.assertLessEqual(self.worker.passes, passes + 1)
+        self.tmp.cleanup()
+
+    async def drained(self, timeout=2):
+        """Wait until core 1 has drawn the last frame"""
+        passes = self.worker.passes
+        deadline = time.monotonic() + timeout
+        while self.worker.display._dirty or self.worker.passes <= passes:
+            self.assertLess(time.monotonic(), deadline, "LCD frame was not drawn")
+            await asyncio.sleep(0.01)
+
+    async def test_lcd_write_does_not_block_requests(self):
+        # Drawing directly holds the caller for the whole bus transfer
+        start = time.monotonic()
+        self.lcd.write(0, 0, "x" * 16)
+        direct = time.monotonic() - start
+        self.assertGreater(direct, 0.05)
+
+        start = time.monotonic()
+        response = await self.client.post("/lcd", body={"text": "Hello from core 0, bye"})
+        elapsed = time.monotonic() - start
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed, direct / 2)
+
+        # Other requests are served while core 1 is still on the bus
+        response = await self.client.get("/leds/1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(self.lcd.lines.get(1), "0, bye".ljust(16))
+
+        await self.drained()
+        self.assertEqual(self.lcd.lines, {0: "Hello from core ", 1: "0, bye".ljust(16)})
+
+    async def test_queued_frame_is_drawn(self):
+        await self.client.post("/lcd", body={"text": "first"})
+        await self.client.post("/lcd", body={"text": "0123456789abcdefsecond line"})
+        await self.drained()
+        # Only the latest frame matters; it is drawn in full, padded to 16 columns
+        self.assertEqual(self.lcd.lines, {0: "0123456789abcdef", 1: "second line".ljust(16)})
+        self.assertFalse(self.worker.display.take(self.worker._frame))
+
+        # Without new text core 1 leaves the bus alone
+        written = self.lcd.bus.written
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.lcd.bus.written, written)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Gateway polling against a scripted board session.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "gateway"))
+
+from gateway import Device, DeviceBusy
+
+class FakeResponse:
+    def __init__(self, status_code, document, headers=None):
+        self.status_code = status_code
+        self.document = document
+        self.headers = headers or {}
+        self.text = ""
+        self.reason = "Error"
+
+    def json(self):
+        return self.document
+
+class FakeSession:
+    """Answers like a board with one sensor until told to shed load or drop"""
+    def __init__(self):
+        self.busy = False
+        self.down = False
+        self.raw_value = 100
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        path = url.split("8080", 1)[1]
+        self.requests.append(path)
+        if self.down:
+            raise requests.ConnectionError("connection refused")
+        if self.busy:
+            return FakeResponse(503, {"data": {"error": "Server busy"}, "_links": {}}, {"Retry-After": "0.2"})
+        if path == "/":
+            return FakeResponse(200, {"data": {}, "_links": {"sensors": {"href": "/sensors"}}})
+        if path == "/sensors":
+            return FakeResponse(200, {"data": {"1": {"type": "light", "location": "roof", "unit": "lux",
+                                                     "_links": {"read": {"href": "/sensors/1/value"}}}},
+                                      "_links": {}})
+        return FakeResponse(200, {"data": {"raw_value": self.raw_value, "calibrated_value": self.raw_value / 10},
+                                  "_links": {}})
+
+class DevicePollTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.device = Device("house1", "http://board:8080", poll_interval_s=0.05, min_request_interval_ms=0)
+        self.session = FakeSession()
+        self.device.session = self.session
+
+    async def test_poll_reads_sensors(self):
+        await self.device.poll()
+        self.assertEqual(self.device.state["sensors"]["1"]["raw_value"], 100)
+
+    async def test_busy_board_keeps_last_state(self):
+        await self.device.poll()
+        self.session.busy = True
+        self.session.raw_value = 200
+        with self.assertRaises(DeviceBusy) as raised:
+            await self.device.poll()
+        self.assertEqual(raised.exception.retry_after_s, 0.2)
+        self.assertEqual(self.device.state["sensors"]["1"]["raw_value"], 100)
+        self.assertEqual(self.device.links, {"sensors": "/sensors"})
+
+    async def test_run_waits_for_retry_after_and_stays_online(self):
+        await self.device.poll()
+        self.session.busy = True
+        task = asyncio.create_task(self.device.run())
+        await asyncio.sleep(0.1)
+        polls = len(self.session.requests)
+        self.assertTrue(self.device.online)
+        self.assertIn("503", self.device.error)
+
+        # Within Retry-After nothing is sent, even with a poll interval of 50 ms
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(self.session.requests), polls)
+
+        self.session.busy = False
+        await asyncio.sleep(0.3)
+        task.cancel()
+        self.assertIsNone(self.device.error)
+        self.assertEqual(self.device.state["sensors"]["1"]["raw_value"], 100)
+
+    async def test_connection_failure_marks_offline(self):
+        self.session.down = True
+        task = asyncio.create_task(self.device.run())
+        await asyncio.sleep(0.02)
+        task.cancel()
+        self.assertFalse(self.device.online)
+        self.assertEqual(self.device.links, {})
+
+if __name__ == "__main__":
+    unittest.main()
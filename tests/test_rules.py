@@ -0,0 +1,103 @@
+"""Rule validation and evaluation, on simulated hardware.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "sim"))
+sys.path.insert(0, str(ROOT / "deploy"))
+
+import simhw
+simhw.install()
+
+from microdot import Microdot
+from microdot.test_client import TestClient
+from toml_to_json import convert_config
+from config_handler import ConfigHandler
+from actuators import Actuators
+from readings import SensorReader
+from rules import RulesEngine
+from routes import Routes
+
+class FakeLcd:
+    def clear(self):
+        pass
+
+    def write(self, x, y, text):
+        pass
+
+class RulesTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config_file = Path(self.tmp.name) / "config.json"
+        convert_config(ROOT / "config" / "config_example.toml", config_file)
+        self.config = ConfigHandler(str(config_file))
+        self.config.load_config()
+        self.actuators = Actuators(self.config, FakeLcd())
+        self.reader = SensorReader(self.config)
+        self.rules = RulesEngine(self.config, self.actuators, self.reader)
+        app = Microdot()
+        Routes(app, self.config, self.actuators, self.reader, self.rules)
+        self.client = TestClient(app)
+        self.digital = next(sensor_id for sensor_id, sensor in self.config.sensors.items()
+                            if "capture" in sensor)
+        self.led = self.config.leds["1"]["pin"]
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    def rule(self, condition, command="on"):
+        return {"sensor": self.digital, "condition": condition,
+                "action": {"type": "led", "id": "1", "command": command}}
+
+    async def test_non_numeric_conditions_are_rejected(self):
+        for condition in ({"type": "threshold", "op": ">", "value": "abc"},
+                          {"type": "rate", "value": True},
+                          {"type": "hysteresis", "high": "1", "low": 0},
+                          {"type": "hysteresis", "high": 1, "low": 2}):
+            response = await self.client.post("/rules", body=self.rule(condition))
+            self.assertIn("error", response.json["data"], condition)
+        self.assertNotIn("3", self.config.rules)
+
+    async def test_broken_rule_does_not_break_sensor_reads(self):
+        self.config.rules["broken"] = self.rule({"type": "threshold", "op": ">", "value": "abc"})
+        self.rules.compile()
+        response = await self.client.get(f"/sensors/{self.digital}/value")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("raw_value", response.json["data"])
+
+    async def test_failing_listener_does_not_fail_reads(self):
+        def broken(sensor_id, value):
+            raise TypeError("broken listener")
+
+        self.reader.listeners.insert(0, broken)
+        response = await self.client.get(f"/sensors/{self.digital}/value")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.reader.counts["acquisitions"], 1)
+
+    async def test_short_pulse_reaches_the_rules(self):
+        self.config.rules["pulse"] = self.rule({"type": "threshold", "op": ">", "value": 0.5}, "toggle")
+        self.rules.compile()
+        self.rules.drain_edges()
+        before = self.led.value()
+
+        # Shorter than any polling interval: only the IRQ capture sees it
+        self.config.sensors[self.digital]["pin"].pulse()
+        self.assertEqual(self.config.sensors[self.digital]["pin"].value(), 0)
+        self.rules.drain_edges()
+        self.assertNotEqual(self.led.value(), before)
+        self.assertTrue(self.rules.state("pulse"))
+
+        # The falling edge is recorded once the debounce window has passed
+        capture = self.config.sensors[self.digital]["capture"]
+        await asyncio.sleep(capture.debounce_ms / 1000 + 0.01)
+        self.rules.drain_edges()
+        self.assertFalse(self.rules.state("pulse"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+"""MqttTelemetry against the in-process fake broker, on simulated hardware.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "sim"))
+sys.path.insert(0, str(ROOT / "deploy"))
+
+import simhw
+simhw.install()
+
+from fake_mqtt import FakeBroker
+from toml_to_json import convert_config
+from config_handler import ConfigHandler
+from actuators import Actuators
+from readings import SensorReader
+from telemetry import MqttTelemetry
+
+class FakeLcd:
+    def clear(self):
+        pass
+
+    def write(self, x, y, text):
+        pass
+
+class TelemetryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config_file = Path(self.tmp.name) / "config.json"
+        convert_config(ROOT / "config" / "config_example.toml", config_file)
+        self.config = ConfigHandler(str(config_file))
+        self.config.load_config()
+        self.actuators = Actuators(self.config, FakeLcd())
+
+        # Something must accept the reachability probe on the broker port
+        self.listener = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = self.listener.sockets[0].getsockname()[1]
+
+        self.broker = FakeBroker()
+        self.mqtt_config = {"broker": "127.0.0.1", "port": port, "device_id": "house1",
+                            "topic_prefix": "test", "sensors": ["1", "2"], "batch_size": 3,
+                            "sample_interval_ms": 1, "min_backoff_ms": 100, "max_backoff_ms": 400}
+        self.telemetry = MqttTelemetry(self.config, self.actuators, self.mqtt_config,
+                                       SensorReader(self.config),
+                                       client_factory=self.broker.client_factory)
+
+    async def asyncTearDown(self):
+        self.telemetry.disconnect()
+        self.listener.close()
+        await self.listener.wait_closed()
+        self.tmp.cleanup()
+
+    async def poll(self, times=1):
+        for _ in range(times):
+            await asyncio.sleep(0.002)
+            self.telemetry.poll(time.ticks_ms())
+
+    async def test_connect_announces_and_subscribes(self):
+        await self.telemetry.reconnect(time.ticks_ms())
+        self.assertIsNotNone(self.telemetry.client)
+        self.assertEqual(self.broker.retained["test/house1/status"], b"online")
+        self.assertEqual(self.telemetry.client.subscriptions, ["test/house1/cmd/#"])
+
+    async def test_samples_are_published_in_batches(self):
+        await self.telemetry.reconnect(time.ticks_ms())
+        await self.poll(3)
+        batches = self.broker.topic("test/house1/sensors")
+        self.assertEqual(len(batches), 1)
+        batch = json.loads(batches[0])
+        self.assertEqual(len(batch["dt_ms"]), 3)
+        self.assertEqual(sorted(batch["values"]), ["1", "2"])
+        self.assertEqual(batch["dropped"], 0)
+
+    async def test_commands_run_and_state_is_retained(self):
+        await self.telemetry.reconnect(time.ticks_ms())
+        self.broker.publish("test/house1/cmd/leds/1", "on")
+        await self.poll()
+        self.assertEqual(self.config.leds["1"]["pin"].value(), 1)
+        await self.poll()
+        self.assertEqual(self.broker.retained["test/house1/state/leds/1"], b"1")
+
+    async def test_unknown_command_is_ignored(self):
+        await self.telemetry.reconnect(time.ticks_ms())
+        self.broker.publish("test/house1/cmd/leds/99", "on")
+        await self.poll(2)
+        self.assertIsNotNone(self.telemetry.client)
+
+    async def test_reconnects_after_lost_connection(self):
+        await self.telemetry.reconnect(time.ticks_ms())
+        self.broker.drop()
+        self.assertEqual(self.broker.retained["test/house1/status"], b"offline")
+
+        await self.poll(3)
+        self.assertIsNone(self.telemetry.client)
+
+        # Samples taken while offline are published after reconnecting
+        self.telemetry._retry_ms = None
+        await self.telemetry.reconnect(time.ticks_ms())
+        self.assertEqual(self.broker.retained["test/house1/status"], b"online")
+        await self.poll()
+        self.assertEqual(len(self.broker.topic("test/house1/sensors")), 1)
+
+    async def test_backoff_when_broker_refuses(self):
+        self.broker.up = False
+        now = time.ticks_ms()
+        await self.telemetry.reconnect(now)
+        self.assertIsNone(self.telemetry.client)
+        self.assertEqual(self.telemetry.backoff_ms, 200)
+
+        # Not retried before the backoff has passed
+        self.broker.up = True
+        await self.telemetry.reconnect(now)
+        self.assertIsNone(self.telemetry.client)
+        await self.telemetry.reconnect(time.ticks_add(now, 100))
+        self.assertIsNotNone(self.telemetry.client)
+        self.assertEqual(self.telemetry.backoff_ms, 100)
+
+    async def test_stale_value_during_a_read_is_left_out(self):
+        reader = self.telemetry.reader
+        # Another task is reading sensor 1; its last reading is a second old
+        reader._cache["1"] = (100, 1.0, time.ticks_add(time.ticks_ms(), -1000))
+        reader._inflight["1"] = asyncio.Event()
+        self.telemetry.sample(time.ticks_ms())
+        self.assertEqual(self.telemetry._batch_values["1"], [None])
+        self.assertIsNotNone(self.telemetry._batch_values["2"][0])
+
+    async def test_unreachable_broker_does_not_block_the_loop(self):
+        async def hanging_connection(host, port):
+            # Like a SYN to a host that never answers
+            await asyncio.sleep(3600)
+
+        open_connection = asyncio.open_connection
+        asyncio.open_connection = hanging_connection
+        self.addCleanup(setattr, asyncio, "open_connection", open_connection)
+        self.telemetry.connect_timeout_ms = 300
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        start = time.monotonic()
+        await self.telemetry.reconnect(time.ticks_ms())
+        elapsed = time.monotonic() - start
+        task.cancel()
+
+        self.assertIsNone(self.telemetry.client)
+        self.assertLess(elapsed, 1)
+        # The loop kept running while the connection attempt was pending
+        self.assertGreater(ticks, 5)
+
+if __name__ == "__main__":
+    unittest.main()